@@ -0,0 +1,315 @@
+import asyncio
+import ssl
+import sys
+import time
+import traceback
+from collections import defaultdict
+from urllib import parse
+
+from fetcher import BodyReader, BodyTooLarge, CHUNK_SIZE, is_html
+from throttle import is_transient
+
+
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 5
+# How often an idle engine checks a held scheduler (see HostScheduler.hold) for new URLs
+IDLE_POLL_SECONDS = 0.2
+
+
+class FetchError(Exception):
+    pass
+
+
+class _Connection:
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def usable(self):
+        return not self.reader.at_eof() and not self.writer.is_closing()
+
+    def close(self):
+        self.writer.close()
+
+
+class HostConnectionPool:
+    """
+    Keep-alive connections grouped by (scheme, host, port).
+
+    At most per_host connections are open to one origin at a time; a released
+    connection that the server did not close is reused by the next request,
+    so repeated fetches from the same site skip the TCP and TLS handshakes.
+    """
+
+    def __init__(self, per_host=8, connect_timeout=15.0):
+        self.per_host = per_host
+        self.connect_timeout = connect_timeout
+        self.ssl_context = ssl.create_default_context()
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self._idle = defaultdict(list)
+        self._slots = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+
+    async def acquire(self, key):
+        await self._slots[key].acquire()
+        idle = self._idle[key]
+        while idle:
+            conn = idle.pop()
+            if conn.usable():
+                self.connections_reused += 1
+                return conn, True
+            conn.close()
+        try:
+            conn = await self._open(key)
+        except BaseException:
+            self._slots[key].release()
+            raise
+        return conn, False
+
+    def release(self, key, conn, reusable):
+        if reusable and conn.usable():
+            self._idle[key].append(conn)
+        else:
+            conn.close()
+        self._slots[key].release()
+
+    async def _open(self, key):
+        scheme, host, port = key
+        use_ssl = self.ssl_context if scheme == 'https' else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=use_ssl, server_hostname=host if use_ssl else None),
+            self.connect_timeout
+        )
+        self.connections_opened += 1
+        return _Connection(reader, writer)
+
+    def close(self):
+        for idle in self._idle.values():
+            for conn in idle:
+                conn.close()
+        self._idle.clear()
+
+
+class AsyncFetcher:
+    """
+    Minimal HTTP/1.1 GET client on top of HostConnectionPool.
+
+    Bodies are decompressed while they stream in and capped at max_bytes.
+    A successful response that is not HTML is dropped right after its
+    headers: its body comes back as None and the connection is closed
+    rather than drained.
+    """
+
+    def __init__(self, pool, timeout=30.0, max_bytes=None):
+        self.pool = pool
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+
+    async def fetch(self, url, headers):
+        """Returns (final_url, status, headers, body), following redirects."""
+        for _ in range(MAX_REDIRECTS + 1):
+            status, response_headers, body = await asyncio.wait_for(self._get(url, headers), self.timeout)
+            location = response_headers.get('location')
+            if status in REDIRECT_STATUSES and location:
+                url = parse.urljoin(url, location)
+                continue
+            return url, status, response_headers, body
+        raise FetchError(f"Too many redirects for {url}")
+
+    async def _get(self, url, headers):
+        parts = parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise FetchError(f"Unsupported URL: {url}")
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname.lower(), port)
+        path = parse.quote(parts.path or '/', safe="/%:@!$&'()*+,;=~-._")
+        if parts.query:
+            path += '?' + parts.query
+
+        lines = [f'GET {path} HTTP/1.1', f'Host: {parts.netloc.rsplit("@", 1)[-1]}']
+        for name, value in headers.items():
+            if name.lower() not in ('host', 'connection'):
+                lines.append(f'{name}: {value}')
+        lines.append('Connection: keep-alive')
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', errors='replace')
+
+        # A pooled connection may have been closed by the server while idle;
+        # in that case retry once on a fresh connection
+        for attempt in range(2):
+            conn, reused = await self.pool.acquire(key)
+            reusable = False
+            try:
+                conn.writer.write(request)
+                await conn.writer.drain()
+                status, response_headers, body, reusable = await self._read_response(conn.reader)
+                return status, response_headers, body
+            except (ConnectionError, asyncio.IncompleteReadError, FetchError):
+                if not reused or attempt:
+                    raise
+            finally:
+                self.pool.release(key, conn, reusable)
+
+    async def _read_response(self, reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise FetchError("Connection closed before response")
+        try:
+            version, status, *_ = status_line.decode('latin-1').split(None, 2)
+            status = int(status)
+        except ValueError:
+            raise FetchError(f"Malformed status line: {status_line!r}")
+
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            value = value.strip()
+            if name in response_headers:
+                response_headers[name] += ', ' + value
+            else:
+                response_headers[name] = value
+
+        keep_alive = version == 'HTTP/1.1' and 'close' not in response_headers.get('connection', '').lower()
+        if status in (204, 304) or 100 <= status < 200:
+            return status, response_headers, b'', keep_alive
+        if 200 <= status < 300 and not is_html(response_headers.get('content-type')):
+            return status, response_headers, None, False
+
+        length = response_headers.get('content-length')
+        if self.max_bytes and length and length.isdigit() and int(length) > self.max_bytes:
+            raise BodyTooLarge(f"Content-Length {length} exceeds {self.max_bytes} bytes")
+        body = BodyReader(response_headers.get('content-encoding'), self.max_bytes)
+
+        if 'chunked' in response_headers.get('transfer-encoding', '').lower():
+            while True:
+                size_line = await reader.readline()
+                size = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+                if size == 0:
+                    # Skip trailers up to the terminating blank line
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                body.feed(await reader.readexactly(size))
+                await reader.readline()
+            return status, response_headers, body.finish(), keep_alive
+
+        if length is not None:
+            remaining = int(length)
+            while remaining:
+                chunk = await reader.readexactly(min(remaining, CHUNK_SIZE))
+                remaining -= len(chunk)
+                body.feed(chunk)
+            return status, response_headers, body.finish(), keep_alive
+
+        # No framing: the body ends when the server closes the connection
+        while True:
+            chunk = await reader.read(CHUNK_SIZE)
+            if not chunk:
+                return status, response_headers, body.finish(), False
+            body.feed(chunk)
+
+
+class AsyncCrawler:
+    """
+    Runs the whole fetch loop on one asyncio event loop.
+
+    Up to max_in_flight pages are fetched concurrently over pooled keep-alive
+    connections. Downloaded HTML goes through Spider.process_page, the same
+    extraction and storage path the thread engine uses.
+    """
+
+    def __init__(self, spider, max_in_flight=100, connections_per_host=8, timeout=30.0, max_page_bytes=None):
+        self.spider = spider
+        self.max_in_flight = max_in_flight
+        self.pool = HostConnectionPool(per_host=connections_per_host)
+        self.fetcher = AsyncFetcher(self.pool, timeout=timeout, max_bytes=max_page_bytes)
+
+    def run(self):
+        asyncio.run(self._run())
+
+    async def _run(self):
+        scheduler = self.spider.scheduler
+        in_flight = {}
+        print(f"{scheduler.pending()} links in the queue. Starting asyncio engine...")
+        try:
+            while True:
+                wait = None
+                while len(in_flight) < self.max_in_flight:
+                    # Only URLs whose host is past its politeness delay come out
+                    url, wait = scheduler.poll()
+                    if url is None:
+                        break
+                    in_flight[asyncio.create_task(self._crawl(url))] = url
+                if not in_flight:
+                    if wait is None:
+                        # Nothing queued; a held scheduler may still receive URLs
+                        if scheduler.done():
+                            break
+                        wait = IDLE_POLL_SECONDS
+                    await asyncio.sleep(wait)
+                    continue
+                done, _ = await asyncio.wait(in_flight, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    # Links found by the page are already in the scheduler
+                    scheduler.task_done(in_flight.pop(task))
+        finally:
+            self.pool.close()
+        print(f"Connections opened: {self.pool.connections_opened} | reused: {self.pool.connections_reused}")
+
+    async def _crawl(self, page_url):
+        if page_url in self.spider.crawled and page_url not in self.spider.revisits:
+            return
+        metrics = self.spider.metrics
+        robots = self.spider.robots
+        allowed = robots.allowed(page_url)
+        if allowed is None:
+            # This host's robots.txt is still loading; wait for it off the event loop
+            allowed = await asyncio.get_running_loop().run_in_executor(None, robots.wait_allowed, page_url)
+        if not allowed:
+            self.spider.robots_skip(page_url)
+            return
+        if not self.spider.take_budget():
+            return
+        if self.spider.log_pages:
+            print('asyncio now crawling ' + page_url)
+        links = set()
+        status = None
+        started = time.perf_counter()
+        try:
+            request_headers = self.spider.request_headers()
+            request_headers.update(self.spider.conditional_headers(page_url))
+            with metrics.timer('fetch'):
+                _, status, headers, body = await self.fetcher.fetch(page_url, request_headers)
+            metrics.count_status(status)
+            if status >= 400:
+                elapsed = time.perf_counter() - started
+                if self.spider.fetch_failed(page_url, elapsed, status, headers.get('retry-after')):
+                    # Queued again with a backoff; not crawled yet
+                    return
+                raise FetchError(f"HTTP Error {status}")
+            self.spider.fetch_succeeded(page_url, time.perf_counter() - started, status)
+            # Parsing is CPU work, keep it off the event loop
+            loop = asyncio.get_running_loop()
+            links = await loop.run_in_executor(None, self.spider.handle_response, page_url, status, headers, body)
+        except BodyTooLarge as e:
+            metrics.incr('too_large')
+            print(f"Skipping {page_url}: {e}", file=sys.stderr)
+        except Exception as e:
+            if status is None:
+                metrics.incr('fetch_errors')
+                if is_transient(e) and self.spider.fetch_failed(page_url, time.perf_counter() - started):
+                    return
+            print(f"Error gathering links from {page_url}: {str(e)}", file=sys.stderr)
+            if self.spider.log_pages:
+                traceback.print_exc()
+
+        # Journal writes, fsync and compaction would stall every connection if run on the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self._record, page_url, links)
+
+    def _record(self, page_url, links):
+        self.spider.add_links_to_queue(links, self.spider.scheduler.depth(page_url) + 1)
+        self.spider.frontier.mark_crawled(page_url)
@@ -0,0 +1,247 @@
+"""
+End-to-end crawl throughput against a local synthetic website.
+
+    python benchmarks/bench_crawl.py --pages 1000 --engine asyncio --json before.json
+
+Starts benchmarks/synthetic_site.py in a separate process, runs the Spider
+through main.run() with a stub summarizer (summary_mode on, no API calls)
+and reports pages/s, p50/p99 per-page latency, peak RSS of the crawling
+process and the database write rate. With --sitemap and --max-pages it
+also reports how many of the pages the sitemaps mark fresh were stored
+within the page budget. --flaky-ratio and --host-capacity make the site
+answer 503s and 429s, to see the crawl back off and retry. Runs are
+offline and repeatable, so the --json output of two runs can be compared
+to spot regressions.
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from urllib.request import urlopen
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS))
+
+from synthetic_site import SiteSpec, install_resolver, start_site
+
+
+class StubSummarizer:
+    """Stands in for summerizer.py: answers instantly and never leaves the machine."""
+
+    @staticmethod
+    def setup_summarizer(config):
+        pass
+
+    @staticmethod
+    def get_rate_limits():
+        return 1_000_000, 1_000_000_000
+
+    @staticmethod
+    def get_model_name():
+        return 'benchmark-stub'
+
+    @staticmethod
+    def generate_summary(text):
+        return ' '.join(text.split()[:40])
+
+
+def crawl_config(args, project_dir, homepage):
+    return {
+        'project_name': project_dir,
+        'homepage_url': homepage,
+        'database_filename': 'bench.db',
+        'engine': args.engine,
+        'number_of_threads': args.threads,
+        'max_in_flight': args.max_in_flight,
+        'min_delay_seconds': 0,
+        'max_delay_seconds': 0,
+        'request_timeout_seconds': 30,
+        'user_agents': ['Mozilla/5.0 (compatible; CrawlerBenchmark/1.0)'],
+        'exclude_tags': ['nav', 'script', 'style', 'header', 'footer', 'figure'],
+        'exclude_classes': ['site-footer'],
+        'parser_backend': args.parser_backend,
+        'parse_processes': args.parse_processes,
+        'summary_mode': not args.no_summary,
+        'summary_drain_on_exit': True,
+        'summary_cache': False,
+        'recrawl_mode': False,
+        'summarizer_backend': 'extractive' if args.summarizer == 'extractive' else None,
+        'max_pages': args.max_pages,
+        'frontier_memory_urls': args.frontier_memory_urls,
+        'max_host_concurrency': args.max_host_concurrency,
+        # Retry-After: 1 from the site sets the pace; keep backoffs short
+        'retry_backoff_seconds': 0.5,
+    }
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def time_pages(engine, samples):
+    # Wraps the per-page entry point of the engine under test
+    from spider import Spider
+
+    if engine == 'asyncio':
+        from async_engine import AsyncCrawler
+        crawl = AsyncCrawler._crawl
+
+        async def timed_crawl(self, page_url):
+            start = time.perf_counter()
+            try:
+                return await crawl(self, page_url)
+            finally:
+                samples.append(time.perf_counter() - start)
+        AsyncCrawler._crawl = timed_crawl
+    else:
+        crawl_page = Spider.crawl_page
+
+        def timed_crawl_page(thread_name, page_url):
+            start = time.perf_counter()
+            try:
+                return crawl_page(thread_name, page_url)
+            finally:
+                samples.append(time.perf_counter() - start)
+        Spider.crawl_page = staticmethod(timed_crawl_page)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--fanout', type=int, default=8)
+    parser.add_argument('--page-kb', type=float, default=20, help='Approximate HTML size of each page')
+    parser.add_argument('--hosts', type=int, default=4, help='Host names the pages are spread over')
+    parser.add_argument('--slow-ratio', type=float, default=0.02)
+    parser.add_argument('--slow-ms', type=int, default=200)
+    parser.add_argument('--error-ratio', type=float, default=0.02)
+    parser.add_argument('--disallow-ratio', type=float, default=0.05, help='Share of links under /private/')
+    parser.add_argument('--crawl-delay', type=float, default=None, help='Crawl-delay in robots.txt')
+    parser.add_argument('--no-gzip', action='store_true')
+    parser.add_argument('--sitemap', action='store_true', help='Serve gzipped sitemaps listing fresh pages')
+    parser.add_argument('--fresh-ratio', type=float, default=0.1, help='Share of pages the sitemaps mark fresh')
+    parser.add_argument('--max-pages', type=int, default=0, help='Page budget of the crawl (0 = no limit)')
+    parser.add_argument('--frontier-memory-urls', type=int, default=0, help='Queued URLs kept in memory')
+    parser.add_argument('--flaky-ratio', type=float, default=0.0,
+                        help='Share of pages answering 503 (Retry-After: 1) on their first request')
+    parser.add_argument('--host-capacity', type=int, default=0,
+                        help='Requests a host serves at once before answering 429 (0 = no limit)')
+    parser.add_argument('--max-host-concurrency', type=int, default=4, help='Upper bound of the per-host AIMD limit')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--engine', choices=['threads', 'asyncio'], default='threads')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--max-in-flight', type=int, default=100)
+    parser.add_argument('--parse-processes', type=int, default=0)
+    parser.add_argument('--parser-backend', default='auto')
+    parser.add_argument('--no-summary', action='store_true', help='Run without the summary pipeline')
+    parser.add_argument('--summarizer', choices=['stub', 'extractive'], default='stub',
+                        help='stub answers instantly; extractive runs the local TextRank backend')
+    parser.add_argument('--json', metavar='PATH', help='Also write the results to a JSON file')
+    parser.add_argument('--keep', action='store_true', help='Keep the project directory and database')
+    parser.add_argument('--verbose', action='store_true', help="Show the crawler's own output")
+    args = parser.parse_args()
+
+    spec = SiteSpec(
+        pages=args.pages, fanout=args.fanout, page_bytes=int(args.page_kb * 1000), hosts=args.hosts,
+        slow_ratio=args.slow_ratio, slow_ms=args.slow_ms, error_ratio=args.error_ratio,
+        disallow_ratio=args.disallow_ratio, crawl_delay=args.crawl_delay, gzip=not args.no_gzip,
+        sitemap=args.sitemap, fresh_ratio=args.fresh_ratio, flaky_ratio=args.flaky_ratio,
+        host_capacity=args.host_capacity, seed=args.seed
+    )
+    site, homepage = start_site(spec)
+    install_resolver()
+
+    import main as crawler
+    from spider import Spider
+
+    work_dir = tempfile.mkdtemp(prefix='crawl-bench-')
+    project_dir = os.path.join(work_dir, 'bench')
+    samples = []
+    time_pages(args.engine, samples)
+    Spider.summarizer = StubSummarizer if args.summarizer == 'stub' else None
+    config = crawl_config(args, project_dir, homepage)
+    print(f"Crawling {args.pages} synthetic pages over {args.hosts} hosts from {homepage} "
+          f"with the {args.engine} engine...")
+    try:
+        start = time.perf_counter()
+        if args.verbose:
+            crawler.run(config)
+        else:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+                    contextlib.redirect_stderr(devnull):
+                crawler.run(config)
+        elapsed = time.perf_counter() - start
+        rows_written = Spider.db_writer.rows_written
+        pages_written = Spider.db_writer.pages_written
+        rows_lost = Spider.db_writer.rows_lost
+        retries = Spider.metrics.snapshot()[0]['retries']
+
+        with urlopen(homepage.split('/p/')[0] + '/__stats') as response:
+            served = json.loads(response.read())
+        conn = sqlite3.connect(Spider.db_file)
+        try:
+            stored = conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            summarized = conn.execute("SELECT COUNT(*) FROM pages WHERE summary_status = 'done'").fetchone()[0]
+            stored_urls = [row[0] for row in conn.execute("SELECT url FROM pages")]
+        finally:
+            conn.close()
+    finally:
+        site.terminate()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    fresh = [index for index in range(args.pages) if spec.is_fresh(index) and spec.kind(index) != 'error']
+    fresh_stored = sum(1 for url in stored_urls if spec.is_fresh(int(url.rsplit('/', 1)[1])))
+    results = {
+        'engine': args.engine,
+        'pages': args.pages,
+        'hosts': args.hosts,
+        'seconds': round(elapsed, 3),
+        'fetched': len(samples),
+        'stored': stored,
+        'summarized': summarized,
+        'fresh_stored': fresh_stored,
+        'fresh_total': len(fresh),
+        'served_by_status': served['status'],
+        'retries': retries,
+        'pages_per_second': round(len(samples) / elapsed, 2),
+        'latency_p50_ms': round(percentile(samples, 0.50) * 1e3, 2),
+        'latency_p99_ms': round(percentile(samples, 0.99) * 1e3, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'db_rows_written': rows_written,
+        'db_rows_lost': rows_lost,
+        'db_pages_written': pages_written,
+        # Page rows only; summary and quota updates are statements too but store no page
+        'db_pages_per_second': round(pages_written / elapsed, 2),
+    }
+    print(f"{results['fetched']} pages fetched in {elapsed:.2f}s ({results['pages_per_second']} pages/s), "
+          f"{stored} stored, {summarized} summarized, server statuses {served['status']}, {retries} retries")
+    if args.sitemap:
+        print(f"{fresh_stored} of {len(fresh)} fresh pages stored")
+    print(f"per-page latency p50 {results['latency_p50_ms']} ms, p99 {results['latency_p99_ms']} ms")
+    print(f"peak RSS {results['peak_rss_mb']} MiB, database {pages_written} page rows "
+          f"({results['db_pages_per_second']} pages/s), {rows_written} statements, {rows_lost} lost")
+    if args.keep:
+        print(f"Project directory kept at {project_dir}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+Accuracy and per-page time of date extraction on a labeled HTML corpus.
+
+    python benchmarks/bench_dates.py --repeat 200 --verbose
+
+Compares date_extractor.extract_date with the previous implementation,
+kept below as legacy_extract_date: BeautifulSoup find/find_all passes for
+<time>, the date classes and <meta> tags, five regexes over the whole
+text, then up to eleven strptime formats per candidate. Each page is
+parsed once up front (a BeautifulSoup tree for legacy, a ParsedPage for
+current), so the first figures time date extraction alone; the "with
+parse" figures add each implementation's parse of the page. legacy needs
+beautifulsoup4 installed.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from date_extractor import extract_date, parse_date_string
+from page_parser import parse_page
+
+CORPUS = os.path.join(ROOT, 'benchmarks', 'data', 'date_corpus.jsonl')
+EXCLUDE_TAGS = ['nav', 'script', 'style', 'header', 'footer', 'figure']
+
+
+def legacy_parse_date_string(date_string):
+    formats = [
+        "%Y-%m-%dT%H:%M:%S%z",
+        "%Y-%m-%d",
+        "%B %d, %Y",
+        "%d %B %Y",
+        "%m/%d/%Y",
+        "%d/%m/%Y",
+        "%Y/%m/%d",
+        "%b %d, %Y",
+        "%A, %B %d, %Y",
+        "%B %d, %Y %H:%M:%S",
+        "%m/%d/%Y %H:%M:%S",
+    ]
+    for fmt in formats:
+        try:
+            if '%z' in fmt and ('+' not in date_string and '-' not in date_string[-6:]):
+                return datetime.strptime(date_string.strip(), fmt.replace('%z', ''))
+            return datetime.strptime(date_string.strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def legacy_extract_date(soup, text):
+    time_tag = soup.find('time')
+    if time_tag:
+        date_str = time_tag.get('datetime') or time_tag.get_text(strip=True)
+        if date_str:
+            return date_str, 1
+    for elem in soup.find_all(class_=['date', 'post-date', 'published', 'entry-date', 'article-date']):
+        parsed_dt = legacy_parse_date_string(elem.get_text(strip=True))
+        if parsed_dt:
+            return parsed_dt.isoformat(), 2
+    meta_date_tags = soup.find_all('meta', attrs={
+        'property': ['article:published_time', 'og:pubdate'],
+        'name': ['date', 'pubdate', 'DC.date.issued', 'last_updated']
+    })
+    for tag in meta_date_tags:
+        date_str = tag.get('content')
+        if date_str:
+            parsed_dt = legacy_parse_date_string(date_str)
+            if parsed_dt:
+                return parsed_dt.isoformat(), 3
+    date_patterns = [
+        r'\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{1,2},\s+\d{4}\b',
+        r'\b\d{1,2}/\d{1,2}/\d{2,4}\b',
+        r'\b\d{4}-\d{2}-\d{2}\b',
+        r'\b\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4}\b',
+        r'\b(?:Published|Posted|Last updated):\s*(\d{1,2}/\d{1,2}/\d{2,4}|\d{4}-\d{2}-\d{2}|(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{1,2},\s+\d{4})\b'
+    ]
+    for pattern in date_patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            found_date_text = match.group(1) if len(match.groups()) > 0 else match.group(0)
+            parsed_dt = legacy_parse_date_string(found_date_text)
+            if parsed_dt:
+                return parsed_dt.isoformat(), 4
+    return None, "No Strategy"
+
+
+def legacy_parse(html):
+    """The old spider's parse: a BeautifulSoup tree, excluded tags decomposed, then the page text."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in EXCLUDE_TAGS:
+        for element in soup.find_all(tag):
+            element.decompose()
+    return soup, soup.get_text(separator=' ', strip=True)
+
+
+def current_parse(html):
+    return parse_page(html, 'https://example.com/article', exclude_tags=EXCLUDE_TAGS)
+
+
+def as_day(value):
+    # Strategy 1 stores the raw <time> value, so compare calendar days
+    if value is None:
+        return None
+    parsed_dt = parse_date_string(value)
+    return parsed_dt.date().isoformat() if parsed_dt else value
+
+
+def measure(name, parse, extract, cases, repeat, verbose):
+    parsed = [parse(case['html']) for case in cases]
+    correct = 0
+    for case, document in zip(cases, parsed):
+        found, strategy = extract(document)
+        if as_day(found) == case['expected']:
+            correct += 1
+        elif verbose:
+            print(f"  {name}: {case['name']}: expected {case['expected']}, got {found} (strategy {strategy})")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for document in parsed:
+            extract(document)
+    per_page = (time.perf_counter() - start) / (repeat * len(cases))
+
+    # The parse is much slower than date extraction, so it gets fewer rounds
+    parse_repeat = max(1, repeat // 10)
+    start = time.perf_counter()
+    for _ in range(parse_repeat):
+        for case in cases:
+            extract(parse(case['html']))
+    with_parse = (time.perf_counter() - start) / (parse_repeat * len(cases))
+    print(f"{name:<10} accuracy {correct}/{len(cases)} ({correct / len(cases):.0%})  {per_page * 1e6:>8.1f} us/page"
+          f"  {with_parse * 1e6:>8.1f} us/page with parse")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--verbose', action='store_true', help='List the pages each implementation gets wrong')
+    args = parser.parse_args()
+
+    with open(CORPUS, 'r', encoding='utf-8') as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    print(f"{len(cases)} labeled pages, {sum(1 for c in cases if c['expected'])} with a date")
+    try:
+        import bs4  # noqa: F401
+    except ImportError:
+        print("legacy     skipped, beautifulsoup4 is not installed")
+    else:
+        measure('legacy', legacy_parse, lambda document: legacy_extract_date(*document), cases, args.repeat,
+                args.verbose)
+    measure('current', current_parse, extract_date, cases, args.repeat, args.verbose)
+
+
+if __name__ == '__main__':
+    main()
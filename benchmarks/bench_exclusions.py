@@ -0,0 +1,121 @@
+"""
+Cost of the exclude_tags / exclude_classes decision on large pages.
+
+    python benchmarks/bench_exclusions.py --elements 20000 --rules 60
+
+Compares the compiled ExclusionMatcher with the previous per-element check
+(every exclude_classes entry split into a set for each page, then tested
+one by one against each element), and reports full parse_page time.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from html.parser import HTMLParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exclusions import ExclusionMatcher
+from page_parser import parse_page
+
+EXCLUDE_TAGS = ['nav', 'script', 'style', 'header', 'footer', 'figure']
+TAGS = ['div', 'span', 'p', 'a', 'li', 'ul', 'section', 'article', 'nav', 'footer', 'figure']
+
+
+def make_rules(count, rng):
+    # Mostly single BEM-style classes, some multi-word entries like the ones in config.yml
+    rules = []
+    for i in range(count):
+        block = f"block{i}__element"
+        rules.append(block if rng.random() < 0.7 else f"{block} {block}--mod{i % 5}")
+    return rules
+
+
+def make_page(elements, rules, rng):
+    vocabulary = [f"content-{i}" for i in range(300)] + [c for rule in rules for c in rule.split()]
+    parts = ['<html><head><title>Large page</title></head><body>']
+    depth = 0
+    for i in range(elements):
+        tag = rng.choice(TAGS)
+        classes = ' '.join(rng.sample(vocabulary, rng.randint(0, 3)))
+        parts.append(f'<{tag} class="{classes}">text {i} ')
+        depth += 1
+        if depth > 4 or rng.random() < 0.5:
+            parts.append(f'</{tag}>')
+            depth -= 1
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+class _StartTags(HTMLParser):
+
+    def __init__(self):
+        super().__init__()
+        self.elements = []
+
+    def handle_starttag(self, tag, attrs):
+        self.elements.append((tag, dict(attrs)))
+
+
+def legacy_decisions(elements, exclude_tags, exclude_classes):
+    exclude_tags = set(exclude_tags)
+    exclude_classes = [frozenset(name.split()) for name in exclude_classes if name.split()]
+    decisions = []
+    for tag, attrs in elements:
+        excluded = tag in exclude_tags
+        class_attr = attrs.get('class')
+        if not excluded and class_attr and exclude_classes:
+            classes = set(class_attr.split())
+            excluded = any(names <= classes for names in exclude_classes)
+        decisions.append(excluded)
+    return decisions
+
+
+def compiled_decisions(elements, matcher):
+    return [matcher.matches(tag, attrs) for tag, attrs in elements]
+
+
+def best_of(repeat, function):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--elements', type=int, default=20_000)
+    parser.add_argument('--rules', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules = make_rules(args.rules, rng)
+    html = make_page(args.elements, rules, rng)
+    collector = _StartTags()
+    collector.feed(html)
+    elements = collector.elements
+    matcher = ExclusionMatcher(EXCLUDE_TAGS, rules)
+    print(f"{len(elements):,} elements, {len(html) / 2**20:.1f} MiB of HTML, "
+          f"{len(EXCLUDE_TAGS)} excluded tags, {len(rules)} class rules")
+
+    legacy_seconds, expected = best_of(args.repeat, lambda: legacy_decisions(elements, EXCLUDE_TAGS, rules))
+    compiled_seconds, decisions = best_of(args.repeat, lambda: compiled_decisions(elements, matcher))
+    if decisions != expected:
+        print("ERROR: compiled matcher disagrees with the legacy check")
+        return 1
+    print(f"legacy check      {legacy_seconds * 1e3:>8.2f} ms/page  {legacy_seconds / len(elements) * 1e9:>6.0f} ns/element")
+    print(f"ExclusionMatcher  {compiled_seconds * 1e3:>8.2f} ms/page  {compiled_seconds / len(elements) * 1e9:>6.0f} ns/element")
+    print(f"excluded elements {sum(decisions):,}")
+
+    parse_seconds, _ = best_of(args.repeat, lambda: parse_page(html, 'https://example.com/', exclusions=matcher))
+    print(f"parse_page (html.parser, with matcher) {parse_seconds * 1e3:.1f} ms/page")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+"""
+Memory and lookup rate of the visited structures against plain sets of URLs.
+
+    python benchmarks/bench_visited.py --urls 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from visited import BloomFilter, FingerprintSet
+
+
+def make_urls(count, seed):
+    rng = random.Random(seed)
+    sections = ['news', 'blog', 'archive', 'tag', 'category', 'author', 'page']
+    return [
+        f"https://www.example.com/{rng.choice(sections)}/{rng.randrange(10**6)}/"
+        f"article-{i}-{rng.randrange(10**9):09d}?ref={rng.randrange(1000)}"
+        for i in range(count)
+    ]
+
+
+def measure(name, factory, urls, misses):
+    # Build from copies so the strings count against the set that keeps them
+    tracemalloc.start()
+    start = time.perf_counter()
+    visited = factory()
+    for url in urls:
+        visited.add(''.join(url))
+    build_seconds = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    probes = urls[:len(misses)] + misses
+    start = time.perf_counter()
+    found = sum(1 for url in probes if url in visited)
+    lookup_seconds = time.perf_counter() - start
+
+    false_positives = found - min(len(urls), len(misses))
+    print(f"{name:<22} {memory / 2**20:>9.1f} MiB {memory / len(urls):>8.1f} B/url "
+          f"{len(urls) / build_seconds:>12,.0f} adds/s {len(probes) / lookup_seconds:>12,.0f} lookups/s "
+          f"{false_positives:>6} false positives")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--urls', type=int, default=500_000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    urls = make_urls(args.urls, args.seed)
+    misses = [url + '&miss=1' for url in urls[:min(len(urls), 200_000)]]
+    print(f"{args.urls:,} URLs, average length {sum(map(len, urls)) / len(urls):.0f} characters")
+    measure('set (current)', set, urls, misses)
+    measure('FingerprintSet', FingerprintSet, urls, misses)
+    measure('BloomFilter p=0.001', lambda: BloomFilter(args.urls, 0.001), urls, misses)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""
+A deterministic synthetic website served from memory, for offline benchmarks.
+
+    python benchmarks/synthetic_site.py --pages 2000 --hosts 4 --port 8800
+
+Page i lives at http://h{i % hosts}.synthetic.test:{port}/p/{i} and links to
+page i + 1 (so every page is reachable from the homepage) plus fanout - 1
+pseudo-random pages. A share of the pages answer slowly or with an error,
+a share answer 503 (Retry-After: 1) the first time they are requested,
+and a share of the links point under /private/, which robots.txt disallows.
+With host_capacity set, a host answers 429 to requests beyond that many
+at once, like an overloaded server.
+With sitemap on, robots.txt lists a gzipped sitemap index per host whose
+sitemap marks a share of the pages fresh (recent lastmod, high priority).
+Every host name under synthetic.test resolves to 127.0.0.1 once
+install_resolver() has run in the crawling process, so pages spread over
+several hosts without DNS or network access.
+"""
+import argparse
+import gzip
+import json
+import multiprocessing
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SITE_DOMAIN = 'synthetic.test'
+
+WORDS = [
+    ''.join(random.Random(i).choice('abcdefghijklmnopqrstuvwxyz') for _ in range(3 + i % 7))
+    for i in range(4000)
+]
+
+
+class SiteSpec:
+    """Shape of the generated site. The same spec and seed always produce the same pages."""
+
+    def __init__(self, pages=500, fanout=8, page_bytes=20_000, hosts=4, slow_ratio=0.02, slow_ms=200,
+                 error_ratio=0.02, disallow_ratio=0.05, crawl_delay=None, gzip=True, sitemap=False,
+                 fresh_ratio=0.1, flaky_ratio=0.0, host_capacity=0, seed=1):
+        self.pages = pages
+        self.fanout = fanout
+        self.page_bytes = page_bytes
+        self.hosts = hosts
+        self.slow_ratio = slow_ratio
+        self.slow_ms = slow_ms
+        self.error_ratio = error_ratio
+        self.disallow_ratio = disallow_ratio
+        self.crawl_delay = crawl_delay
+        self.gzip = gzip
+        self.sitemap = sitemap
+        self.fresh_ratio = fresh_ratio
+        self.flaky_ratio = flaky_ratio
+        self.host_capacity = host_capacity
+        self.seed = seed
+
+    def kind(self, index):
+        """'slow', 'error', 'flaky' (503 once, then 'ok') or 'ok' for page index; the homepage is always 'ok'."""
+        if index == 0:
+            return 'ok'
+        roll = random.Random(self.seed * 7_919 + index).random()
+        if roll < self.error_ratio:
+            return 'error'
+        if roll < self.error_ratio + self.slow_ratio:
+            return 'slow'
+        if roll < self.error_ratio + self.slow_ratio + self.flaky_ratio:
+            return 'flaky'
+        return 'ok'
+
+    def is_fresh(self, index):
+        """Pages the sitemap marks as recently changed and important."""
+        return index > 0 and random.Random(self.seed * 104_729 + index).random() < self.fresh_ratio
+
+    def host(self, index, port):
+        return f"h{index % self.hosts}.{SITE_DOMAIN}:{port}"
+
+    def page_url(self, index, port):
+        return f"http://{self.host(index, port)}/p/{index}"
+
+    def robots_txt(self, host):
+        lines = ['User-agent: *', 'Disallow: /private/']
+        if self.crawl_delay is not None:
+            lines.append(f'Crawl-delay: {self.crawl_delay}')
+        if self.sitemap:
+            lines.append(f'Sitemap: http://{host}/sitemap_index.xml.gz')
+        return '\n'.join(lines) + '\n'
+
+    def sitemap_index(self, host):
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+                f'<sitemap><loc>http://{host}/sitemap-pages.xml</loc></sitemap></sitemapindex>')
+
+    def sitemap_xml(self, host_index, port):
+        recent = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() - 3600))
+        entries = []
+        for index in range(host_index, self.pages, self.hosts):
+            if self.is_fresh(index):
+                entries.append(f'<url><loc>{self.page_url(index, port)}</loc>'
+                               f'<lastmod>{recent}</lastmod><priority>0.9</priority></url>')
+            else:
+                entries.append(f'<url><loc>{self.page_url(index, port)}</loc>'
+                               '<lastmod>2020-01-01</lastmod><priority>0.3</priority></url>')
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">' + ''.join(entries) + '</urlset>')
+
+    def render(self, index, port):
+        rng = random.Random(self.seed * 1_000_003 + index)
+        links = [(index + 1) % self.pages] + [rng.randrange(self.pages) for _ in range(self.fanout - 1)]
+        anchors = []
+        for target in links:
+            if rng.random() < self.disallow_ratio:
+                anchors.append(f'<a href="http://{self.host(target, port)}/private/{target}">private {target}</a>')
+            else:
+                anchors.append(f'<a href="{self.page_url(target, port)}">page {target}</a>')
+        day = 1 + index % 28
+        month = 1 + index % 12
+        head = (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>Synthetic page {index}</title>'
+                f'<meta property="article:published_time" content="2024-{month:02d}-{day:02d}T08:00:00Z"></head>'
+                f'<body><nav>{" ".join(anchors)}</nav><article><h1>Synthetic page {index}</h1>'
+                f'<time datetime="2024-{month:02d}-{day:02d}">2024-{month:02d}-{day:02d}</time>')
+        tail = '</article><footer class="site-footer">Synthetic footer</footer></body></html>'
+        # Words drawn per page keep near-duplicate detection from folding pages together
+        paragraphs = []
+        size = len(head) + len(tail)
+        while size < self.page_bytes:
+            paragraph = '<p>' + ' '.join(rng.choices(WORDS, k=60)) + '</p>'
+            paragraphs.append(paragraph)
+            size += len(paragraph)
+        return head + ''.join(paragraphs) + tail
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, so the asyncio engine's connection pool is exercised
+    protocol_version = 'HTTP/1.1'
+    spec = None
+    port = None
+    stats = None
+    stats_lock = threading.Lock()
+    # Host -> requests in progress, and the flaky pages that already failed once
+    active = {}
+    failed_once = set()
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/robots.txt':
+            return self._send(200, self.spec.robots_txt(self.headers.get('Host')), 'text/plain')
+        if self.spec.sitemap and path == '/sitemap_index.xml.gz':
+            return self._send(200, self.spec.sitemap_index(self.headers.get('Host')), 'application/gzip',
+                              compress=True)
+        if self.spec.sitemap and path == '/sitemap-pages.xml':
+            host_index = int(self.headers.get('Host').split('.', 1)[0][1:])
+            return self._send(200, self.spec.sitemap_xml(host_index, self.port), 'application/xml')
+        if path == '/__stats':
+            with self.stats_lock:
+                body = json.dumps(self.stats)
+            return self._send(200, body, 'application/json', count=False)
+        parts = path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] not in ('p', 'private') or not parts[1].isdigit() \
+                or int(parts[1]) >= self.spec.pages:
+            return self._send(404, '<html><body>Not found</body></html>')
+        index = int(parts[1])
+        kind = self.spec.kind(index)
+        if kind == 'error':
+            return self._send(500, '<html><body>Internal error</body></html>')
+        host = self.headers.get('Host')
+        with self.stats_lock:
+            if kind == 'flaky' and index not in self.failed_once:
+                self.failed_once.add(index)
+                kind = 'unavailable'
+            self.active[host] = self.active.get(host, 0) + 1
+            overloaded = self.spec.host_capacity and self.active[host] > self.spec.host_capacity
+        if kind == 'slow' and not overloaded:
+            time.sleep(self.spec.slow_ms / 1000)
+        # Released before answering, so the client's next request never finds its previous one still counted
+        with self.stats_lock:
+            self.active[host] -= 1
+        if overloaded:
+            return self._send(429, '<html><body>Too many requests</body></html>', retry_after=1)
+        if kind == 'unavailable':
+            return self._send(503, '<html><body>Unavailable</body></html>', retry_after=1)
+        self._send(200, self.spec.render(index, self.port))
+
+    def _send(self, status, text, content_type='text/html; charset=utf-8', count=True, compress=False,
+              retry_after=None):
+        body = text.encode('utf-8')
+        encoding = None
+        if compress:
+            # A .gz file, not a Content-Encoding
+            body = gzip.compress(body)
+        elif self.spec.gzip and 'gzip' in (self.headers.get('Accept-Encoding') or ''):
+            body = gzip.compress(body, compresslevel=1)
+            encoding = 'gzip'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        if retry_after is not None:
+            self.send_header('Retry-After', str(retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+        if count:
+            with self.stats_lock:
+                self.stats['requests'] += 1
+                self.stats['bytes'] += len(body)
+                self.stats['status'][str(status)] = self.stats['status'].get(str(status), 0) + 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(spec, port=0, ready=None):
+    """Serves the site until the process ends. Sends the bound port through ready, if given."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+    server.daemon_threads = True
+    _Handler.spec = spec
+    _Handler.port = server.server_address[1]
+    _Handler.stats = {'requests': 0, 'bytes': 0, 'status': {}}
+    if ready is not None:
+        ready.send(_Handler.port)
+    server.serve_forever()
+
+
+def start_site(spec):
+    """
+    Starts the site in its own process, so serving pages does not compete
+    with the crawler for the GIL or count towards its memory.
+    Returns (process, homepage_url).
+    """
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=serve, args=(spec, 0, sender), daemon=True)
+    process.start()
+    port = receiver.recv()
+    return process, spec.page_url(0, port)
+
+
+def install_resolver():
+    """Resolves every *.synthetic.test host name to 127.0.0.1 in this process."""
+    real_getaddrinfo = socket.getaddrinfo
+
+    def getaddrinfo(host, *args, **kwargs):
+        if isinstance(host, str) and host.split(':')[0].endswith('.' + SITE_DOMAIN):
+            host = '127.0.0.1'
+        return real_getaddrinfo(host, *args, **kwargs)
+
+    socket.getaddrinfo = getaddrinfo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--fanout', type=int, default=8)
+    parser.add_argument('--page-kb', type=float, default=20)
+    parser.add_argument('--hosts', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8800)
+    args = parser.parse_args()
+    spec = SiteSpec(pages=args.pages, fanout=args.fanout, page_bytes=int(args.page_kb * 1000), hosts=args.hosts)
+    print(f"Serving {args.pages} pages at {spec.page_url(0, args.port)} "
+          f"(host names under {SITE_DOMAIN} need to resolve to 127.0.0.1)")
+    serve(spec, args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import fnmatch
+import re
+import threading
+from urllib.parse import urlsplit, urlunsplit, unquote
+
+from visited import FingerprintSet
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+# Tracking and session parameters that never change what a page shows
+DEFAULT_DROP_PARAMS = [
+    'utm_*', 'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', '_ga', '_hsenc', '_hsmi',
+    'phpsessid', 'jsessionid', 'sid', 'sessionid',
+]
+
+_PERCENT = re.compile(r'%([0-9A-Fa-f]{2})')
+_UNRESERVED = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+
+
+def _normalize_percent(component):
+    # %7e -> ~ and %2f -> %2F; reserved characters stay encoded
+    def replace(match):
+        char = chr(int(match.group(1), 16))
+        return char if char in _UNRESERVED else '%' + match.group(1).upper()
+    return _PERCENT.sub(replace, component)
+
+
+def _remove_dot_segments(path):
+    output = []
+    for segment in path.split('/'):
+        if segment == '..':
+            if len(output) > 1:
+                output.pop()
+        elif segment != '.':
+            output.append(segment)
+    # Keep the trailing slash of "/a/." and "/a/.."
+    if path.endswith(('/.', '/..')):
+        output.append('')
+    return '/'.join(output)
+
+
+class UrlCanonicalizer:
+    """
+    Rewrites URLs to one spelling per page so the frontier does not hold
+    (and the crawler does not fetch) the same page under several names.
+
+    Scheme and host are lowercased, default ports and fragments dropped,
+    dot segments and percent escapes normalized, tracking parameters
+    removed and the remaining query parameters sorted by name. Parameter
+    patterns are fnmatch globs, matched case-insensitively.
+    """
+
+    def __init__(self, drop_params=None, sort_query=True, strip_fragment=True):
+        patterns = DEFAULT_DROP_PARAMS if drop_params is None else drop_params
+        self.drop_exact = {p.lower() for p in patterns if not any(c in p for c in '*?[')}
+        self.drop_globs = [p.lower() for p in patterns if any(c in p for c in '*?[')]
+        self.sort_query = sort_query
+        self.strip_fragment = strip_fragment
+        # Counters for the end of run report
+        self.rewritten = 0
+        self.saved = 0
+        self._spellings = FingerprintSet()
+        self._lock = threading.Lock()
+
+    def canonicalize(self, url):
+        try:
+            parts = urlsplit(url.strip())
+            port = parts.port
+        except ValueError:
+            return url
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not parts.hostname:
+            return url
+
+        host = parts.hostname.rstrip('.')
+        if ':' in host:
+            host = f'[{host}]'
+        netloc = host
+        if port is not None and port != DEFAULT_PORTS[scheme]:
+            netloc += f':{port}'
+        if parts.username is not None:
+            userinfo = parts.username + (f':{parts.password}' if parts.password is not None else '')
+            netloc = userinfo + '@' + netloc
+
+        path = _remove_dot_segments(_normalize_percent(parts.path)) or '/'
+        query = self._canonical_query(parts.query)
+        fragment = '' if self.strip_fragment else parts.fragment
+        canonical = urlunsplit((scheme, netloc, path, query, fragment))
+        if canonical != url:
+            with self._lock:
+                self.rewritten += 1
+        return canonical
+
+    def record_saved(self, variants, added):
+        """
+        variants maps each queued canonical URL to the spellings it was found
+        under. Every distinct other spelling would have been fetched on its own
+        without canonicalization, except the one that a newly added canonical
+        URL stands in for.
+        """
+        added = set(added)
+        with self._lock:
+            for url, spellings in variants.items():
+                new = [raw for raw in set(spellings) if raw != url and self._spellings.add(raw)]
+                stand_in = url in added and url not in spellings
+                self.saved += max(0, len(new) - stand_in)
+
+    def _canonical_query(self, query):
+        if not query:
+            return ''
+        params = []
+        for pair in query.split('&'):
+            if not pair:
+                continue
+            name = unquote(pair.partition('=')[0]).lower()
+            if name in self.drop_exact or any(fnmatch.fnmatchcase(name, glob) for glob in self.drop_globs):
+                continue
+            params.append(_normalize_percent(pair))
+        if self.sort_query:
+            # Stable, so repeated parameters keep their relative order
+            params.sort(key=lambda pair: pair.partition('=')[0])
+        return '&'.join(params)
+
+
+def canonicalizer_from_config(config):
+    """Returns the UrlCanonicalizer configured in config.yml, or None when it is turned off."""
+    if not config.get('canonicalize_urls', True):
+        return None
+    return UrlCanonicalizer(
+        drop_params=config.get('canonical_drop_params'),
+        sort_query=config.get('canonical_sort_query', True),
+        strip_fragment=config.get('canonical_strip_fragment', True)
+    )
@@ -0,0 +1,336 @@
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+import zlib
+
+from dedup import create_alias_table
+
+
+# A revisit that found new content replaces the stored row
+INSERT_PAGE_SQL = '''
+    INSERT INTO pages (url, title, text, date, date_strategy, summary, summary_status,
+                       etag, last_modified, content_hash, fetched_at, next_visit_at, change_interval,
+                       text_hash, simhash)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(url) DO UPDATE SET
+        title = excluded.title, text = excluded.text, date = excluded.date,
+        date_strategy = excluded.date_strategy, summary = excluded.summary,
+        summary_status = excluded.summary_status, etag = excluded.etag,
+        last_modified = excluded.last_modified, content_hash = excluded.content_hash,
+        fetched_at = excluded.fetched_at, next_visit_at = excluded.next_visit_at,
+        change_interval = excluded.change_interval, text_hash = excluded.text_hash,
+        simhash = excluded.simhash
+'''
+
+# Columns added after the original schema, created on existing databases at startup
+PAGE_COLUMNS = {
+    'summary_status': 'TEXT', # NULL (not requested), 'pending', 'done' or 'error'
+    # Incremental recrawl state (see recrawl.py)
+    'etag': 'TEXT',
+    'last_modified': 'TEXT',
+    'content_hash': 'TEXT',
+    'fetched_at': 'REAL',
+    'next_visit_at': 'REAL',
+    'change_interval': 'REAL',
+    # Duplicate detection fingerprints (see dedup.py)
+    'text_hash': 'TEXT',
+    'simhash': 'INTEGER',
+}
+
+# Plain-text view of pages for readers. {text} is page_text(text) in a database that may
+# hold compressed text and plain text otherwise, so only those need page_text() registered.
+CREATE_TEXT_VIEW_SQL = '''
+    CREATE VIEW IF NOT EXISTS pages_text AS
+    SELECT id, url, title, {text} AS text, date, date_strategy, summary, summary_status
+    FROM pages
+'''
+
+# External-content FTS5 index over pages_text, kept in sync by triggers on pages
+# ({new_text} and {old_text} are filled in the same way)
+SEARCH_INDEX_SQL = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+        title, text, summary, content='pages_text', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS pages_fts_insert AFTER INSERT ON pages BEGIN
+        INSERT INTO pages_fts (rowid, title, text, summary)
+        VALUES (new.id, new.title, {new_text}, new.summary);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS pages_fts_delete AFTER DELETE ON pages BEGIN
+        INSERT INTO pages_fts (pages_fts, rowid, title, text, summary)
+        VALUES ('delete', old.id, old.title, {old_text}, old.summary);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS pages_fts_update AFTER UPDATE OF title, text, summary ON pages BEGIN
+        INSERT INTO pages_fts (pages_fts, rowid, title, text, summary)
+        VALUES ('delete', old.id, old.title, {old_text}, old.summary);
+        INSERT INTO pages_fts (rowid, title, text, summary)
+        VALUES (new.id, new.title, {new_text}, new.summary);
+    END
+    ''',
+]
+SEARCH_TRIGGERS = ('pages_fts_insert', 'pages_fts_delete', 'pages_fts_update')
+
+# Queue markers understood by the writer thread
+_FLUSH = object()
+_STOP = object()
+
+
+def connect_database(db_file_path, timeout=30.0):
+    """
+    Opens a connection with the pragmas every crawler connection should use.
+    WAL lets readers keep working while the writer thread commits.
+    """
+    conn = sqlite3.connect(db_file_path, timeout=timeout, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    # The search index triggers and the pages_text view need it on every connection
+    conn.create_function('page_text', 1, unpack_text, deterministic=True)
+    return conn
+
+
+def pack_text(text, compress=False):
+    """With compress, text is stored as a zlib BLOB; page_text() tells the two apart by type."""
+    if not compress or text is None:
+        return text
+    return zlib.compress(text.encode('utf-8'), 6)
+
+
+def unpack_text(value):
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+def text_sql(column, compressed):
+    return f'page_text({column})' if compressed else column
+
+
+def create_database_table(conn, full_text_index=True, compress_text=False):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT UNIQUE,
+            title TEXT,
+            text TEXT,
+            date TEXT,
+            date_strategy TEXT,
+            summary TEXT
+        )
+    ''')
+    ensure_columns(conn, 'pages', PAGE_COLUMNS)
+    conn.execute('CREATE INDEX IF NOT EXISTS pages_next_visit_at ON pages (next_visit_at)')
+    # Incremental exports find pages fetched since a date through it
+    conn.execute('CREATE INDEX IF NOT EXISTS pages_fetched_at ON pages (fetched_at)')
+    # Summary workers look for pending rows through it without scanning the page text
+    conn.execute("CREATE INDEX IF NOT EXISTS pages_summary_pending ON pages (id) WHERE summary_status = 'pending'")
+    create_alias_table(conn)
+    compressed = stores_compressed_text(conn, compress_text)
+    view = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'pages_text'").fetchone()
+    if view and ('page_text(' in view[0]) != compressed:
+        # Switched between plain and compressed text: the view and triggers are rebuilt to match
+        conn.execute('DROP VIEW pages_text')
+        for trigger in SEARCH_TRIGGERS:
+            conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    conn.execute(CREATE_TEXT_VIEW_SQL.format(text=text_sql('text', compressed)))
+    if full_text_index:
+        create_search_index(conn, compressed)
+    conn.commit()
+
+
+def stores_compressed_text(conn, compress_text):
+    """
+    True if the pages table may hold compressed text: compress_text is on, or
+    it was on in an earlier run and compressed rows are still stored.
+    """
+    if compress_text:
+        return True
+    view = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'pages_text'").fetchone()
+    if not view or 'page_text(' not in view[0]:
+        return False
+    # Scanned only when compress_text was just turned off; afterwards the view is plain
+    return conn.execute("SELECT 1 FROM pages WHERE typeof(text) = 'blob' LIMIT 1").fetchone() is not None
+
+
+def create_search_index(conn, compressed=False):
+    try:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'pages_fts'").fetchone()
+        for sql in SEARCH_INDEX_SQL:
+            conn.execute(sql.format(new_text=text_sql('new.text', compressed),
+                                    old_text=text_sql('old.text', compressed)))
+    except sqlite3.OperationalError as e:
+        print(f"Full-text index disabled, this SQLite build lacks FTS5: {e}", file=sys.stderr)
+        return
+    if not exists:
+        # Index the rows stored before the index existed
+        conn.execute("INSERT INTO pages_fts (pages_fts) VALUES ('rebuild')")
+
+
+def ensure_columns(conn, table, columns):
+    existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    for name, column_type in columns.items():
+        if name not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+
+
+class DatabaseWriter(threading.Thread):
+    """
+    Single thread that owns the write connection to the project database.
+
+    Other threads hand statements to execute() and return immediately. The
+    writer groups them into one transaction per batch, which is committed when
+    batch_size statements are pending or flush_interval seconds have passed.
+    Consecutive statements with the same SQL go through executemany().
+    """
+
+    def __init__(self, db_file_path, batch_size=500, flush_interval=1.0, compress_text=False, full_text_index=True,
+                 metrics=None):
+        super().__init__(name='DatabaseWriter', daemon=True)
+        self.db_file_path = db_file_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compress_text = compress_text
+        self.full_text_index = full_text_index
+        self.rows_written = 0 # Statements committed, including summary and quota updates
+        self.pages_written = 0 # INSERT_PAGE_SQL rows among them
+        self.rows_lost = 0 # Statements that failed on their own and were dropped
+        # Optional metrics.Metrics; each committed batch is one 'db_write' observation
+        self.metrics = metrics
+        self._queue = queue.Queue()
+        self._ready = threading.Event()
+        self._conn = None
+
+    def start(self):
+        super().start()
+        # Make sure the schema exists before any worker submits rows
+        self._ready.wait()
+
+    def execute(self, sql, params=()):
+        self._queue.put((sql, params))
+
+    def insert_page(self, data):
+        self.execute(INSERT_PAGE_SQL, (
+            data['url'],
+            data['title'],
+            pack_text(data['text'], self.compress_text),
+            data['date'],
+            data['date_strategy'],
+            data.get('summary'),
+            data.get('summary_status'),
+            data.get('etag'),
+            data.get('last_modified'),
+            data.get('content_hash'),
+            data.get('fetched_at'),
+            data.get('next_visit_at'),
+            data.get('change_interval'),
+            data.get('text_hash'),
+            data.get('simhash')
+        ))
+
+    # Blocks until everything submitted so far is committed
+    def flush(self):
+        if not self.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        done.wait()
+
+    # Commits whatever is pending and stops the thread
+    def close(self):
+        if self.is_alive():
+            self._queue.put((_STOP, None))
+            self.join()
+
+    def run(self):
+        try:
+            self._conn = connect_database(self.db_file_path)
+            create_database_table(self._conn, self.full_text_index, self.compress_text)
+        except sqlite3.Error as e:
+            print(f"Database error during table creation: {e}", file=sys.stderr)
+            traceback.print_exc()
+            self._ready.set()
+            return
+        self._ready.set()
+
+        try:
+            running = True
+            while running:
+                batch = []
+                waiters = []
+                deadline = None
+                while len(batch) < self.batch_size:
+                    try:
+                        if deadline is None:
+                            # With nothing pending there is no deadline to honor
+                            item = self._queue.get()
+                        else:
+                            item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    sql, params = item
+                    if sql is _FLUSH:
+                        waiters.append(params)
+                        break
+                    if sql is _STOP:
+                        running = False
+                        break
+                    batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+
+                self._write_batch(batch)
+                for done in waiters:
+                    done.set()
+        finally:
+            self._conn.close()
+
+    def _write_batch(self, batch):
+        if not batch:
+            return
+        began = time.perf_counter()
+        failed = False
+        try:
+            with self._conn:
+                start = 0
+                while start < len(batch):
+                    sql = batch[start][0]
+                    end = start
+                    while end < len(batch) and batch[end][0] == sql:
+                        end += 1
+                    self._conn.executemany(sql, [params for _, params in batch[start:end]])
+                    start = end
+            self._count(batch)
+        except sqlite3.Error as e:
+            print(f"Database error while writing {len(batch)} statements, retrying them one at a time: {e}",
+                  file=sys.stderr)
+            failed = True
+        if failed:
+            # The batch was rolled back; only the statements that fail on their own are lost
+            for item in batch:
+                self._write_one(item)
+        if self.metrics:
+            self.metrics.observe('db_write', time.perf_counter() - began)
+
+    def _write_one(self, item):
+        sql, params = item
+        try:
+            with self._conn:
+                self._conn.execute(sql, params)
+        except sqlite3.Error as e:
+            self.rows_lost += 1
+            print(f"Database error, statement dropped: {e}", file=sys.stderr)
+            traceback.print_exc()
+            return
+        self._count([item])
+
+    def _count(self, items):
+        self.rows_written += len(items)
+        self.pages_written += sum(1 for sql, _ in items if sql is INSERT_PAGE_SQL)
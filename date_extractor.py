@@ -0,0 +1,157 @@
+import re
+from datetime import datetime, timedelta, timezone
+
+
+# Only the start of the page text is searched by strategy 4; publication
+# dates sit next to the title far more often than in the footer
+DEFAULT_TEXT_WINDOW = 5000
+
+MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'sept': 9, 'oct': 10, 'nov': 11, 'dec': 12,
+}
+_MONTH = r'(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*'
+_TIME = r'(?:[T\s]+(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2})(?:\.\d+)?)?)?'
+
+# One pass over the text finds every date shape strategy 4 knows; a labeled
+# date ("Posted: ...") is an alternative of its own so it wins where it starts
+_TEXT_DATE = re.compile(rf'''
+    (?:published|posted|last\ updated):\s*
+        (?P<labeled>\d{{1,2}}/\d{{1,2}}/\d{{2,4}}|\d{{4}}-\d{{2}}-\d{{2}}|{_MONTH}\.?\s+\d{{1,2}},\s+\d{{4}})\b
+    | \b(?P<date>
+        {_MONTH}\.?\s+\d{{1,2}},\s+\d{{4}}
+        | \d{{1,2}}/\d{{1,2}}/\d{{2,4}}
+        | \d{{4}}-\d{{2}}-\d{{2}}
+        | \d{{1,2}}\s+{_MONTH}\s+\d{{4}}
+    )\b
+''', re.IGNORECASE | re.VERBOSE)
+
+# Parsers picked by the shape of the string instead of trying formats in turn
+_ISO = re.compile(
+    r'(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})' + _TIME +
+    r'\s*(?P<tz>Z|[+-]\d{2}:?\d{2})?$', re.IGNORECASE)
+_NUMERIC = re.compile(r'(?P<a>\d{1,4})/(?P<b>\d{1,2})/(?P<c>\d{1,4})' + _TIME + '$')
+_NAMED = re.compile(
+    r'(?:(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*,?\s+)?'
+    r'(?:(?P<month1>[a-z]+)\.?\s+(?P<day1>\d{1,2})(?:st|nd|rd|th)?,?\s+(?P<year1>\d{4})'
+    r'|(?P<day2>\d{1,2})(?:st|nd|rd|th)?\s+(?P<month2>[a-z]+)\.?,?\s+(?P<year2>\d{4}))' + _TIME + '$',
+    re.IGNORECASE)
+
+
+def parse_date_string(date_string):
+    """
+    Parses a date string into a datetime object, or returns None.
+
+    Accepts ISO 8601 dates and timestamps, numeric m/d/Y (d/m/Y when the
+    first number cannot be a month, Y/m/d when it has four digits) and
+    named-month dates such as "January 5, 2021", "Tue, Jan 5, 2021" or
+    "5 January 2021", each optionally followed by a time.
+    """
+    text = date_string.strip()
+    if not text:
+        return None
+    try:
+        if text[0].isdigit():
+            if len(text) >= 10 and text[4] == '-':
+                return _from_iso(_ISO.match(text))
+            if '/' in text[:5]:
+                return _from_numeric(_NUMERIC.match(text))
+        return _from_named(_NAMED.match(text))
+    except ValueError:
+        # Right shape, impossible values (e.g. February 30)
+        return None
+
+
+def _time_parts(match):
+    if match.group('hour') is None:
+        return 0, 0, 0
+    return int(match.group('hour')), int(match.group('minute')), int(match.group('second') or 0)
+
+
+def _from_iso(match):
+    if match is None:
+        return None
+    tzinfo = None
+    tz = match.group('tz')
+    if tz:
+        if tz.upper() == 'Z':
+            tzinfo = timezone.utc
+        else:
+            sign = -1 if tz[0] == '-' else 1
+            digits = tz[1:].replace(':', '')
+            tzinfo = timezone(sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:])))
+    return datetime(int(match.group('year')), int(match.group('month')), int(match.group('day')),
+                    *_time_parts(match), tzinfo=tzinfo)
+
+
+def _from_numeric(match):
+    if match is None:
+        return None
+    a, b, c = match.group('a'), match.group('b'), match.group('c')
+    if len(a) == 4:
+        year, month, day = int(a), int(b), int(c)
+    elif len(a) <= 2 and len(c) in (2, 4):
+        month, day = int(a), int(b)
+        if month > 12:
+            month, day = day, month
+        year = int(c)
+        if len(c) == 2:
+            year += 2000 if year < 70 else 1900
+    else:
+        return None
+    return datetime(year, month, day, *_time_parts(match))
+
+
+def _from_named(match):
+    if match is None:
+        return None
+    if match.group('month1'):
+        month_name, day, year = match.group('month1'), match.group('day1'), match.group('year1')
+    else:
+        month_name, day, year = match.group('month2'), match.group('day2'), match.group('year2')
+    month = MONTHS.get(month_name[:4].lower()) or MONTHS.get(month_name[:3].lower())
+    if month is None:
+        return None
+    return datetime(int(year), month, int(day), *_time_parts(match))
+
+
+def find_text_date(text):
+    """First date in text that parses, or None."""
+    for match in _TEXT_DATE.finditer(text):
+        parsed_dt = parse_date_string(match.group('labeled') or match.group('date'))
+        if parsed_dt:
+            return parsed_dt
+    return None
+
+
+def _parse_candidate(candidate):
+    # Date elements often wrap the date in words ("Posted on Jan 5, 2021")
+    return parse_date_string(candidate) or find_text_date(candidate[:200])
+
+
+def extract_date(page, text_window=DEFAULT_TEXT_WINDOW):
+    """
+    Returns (date, strategy) for a ParsedPage, trying in order: <time>
+    (1), date classes (2), <meta> tags (3) and date patterns in the first
+    text_window characters of the text (4). The candidates for 1-3 were
+    collected by the same tree walk that produced the page.
+    """
+    # An empty <time></time> falls through to the other strategies
+    if page.time_date:
+        return page.time_date, 1
+
+    for found_date_text in page.class_dates:
+        parsed_dt = _parse_candidate(found_date_text)
+        if parsed_dt:
+            return parsed_dt.isoformat(), 2
+
+    for date_str in page.meta_dates:
+        parsed_dt = _parse_candidate(date_str)
+        if parsed_dt:
+            return parsed_dt.isoformat(), 3
+
+    parsed_dt = find_text_date(page.text[:text_window] if text_window else page.text)
+    if parsed_dt:
+        return parsed_dt.isoformat(), 4
+
+    return None, "No Strategy"
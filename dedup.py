@@ -0,0 +1,167 @@
+import hashlib
+import re
+import threading
+
+
+INSERT_ALIAS_SQL = '''
+    INSERT INTO page_aliases (url, canonical_url, kind, distance, found_at) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(url) DO UPDATE SET
+        canonical_url = excluded.canonical_url, kind = excluded.kind,
+        distance = excluded.distance, found_at = excluded.found_at
+'''
+
+_WORD = re.compile(r'\w+')
+
+
+def create_alias_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS page_aliases (
+            url TEXT PRIMARY KEY,
+            canonical_url TEXT,
+            kind TEXT,
+            distance INTEGER,
+            found_at REAL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS page_aliases_canonical_url ON page_aliases (canonical_url)')
+
+
+def text_hash(words):
+    return hashlib.sha1(' '.join(words).encode('utf-8')).hexdigest()
+
+
+def simhash(words, shingle_size=3):
+    """64-bit SimHash over overlapping word shingles."""
+    weights = {}
+    for i in range(max(1, len(words) - shingle_size + 1)):
+        shingle = ' '.join(words[i:i + shingle_size])
+        weights[shingle] = weights.get(shingle, 0) + 1
+
+    # Sum weights per (byte position, byte value) first, then spread them over the
+    # bits: 8 additions per shingle instead of 64
+    byte_weights = [[0] * 256 for _ in range(8)]
+    total = 0
+    for shingle, weight in weights.items():
+        digest = hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest()
+        for position, byte in enumerate(digest):
+            byte_weights[position][byte] += weight
+        total += weight
+
+    value = 0
+    for position, counts in enumerate(byte_weights):
+        set_weights = [0] * 8
+        for byte, weight in enumerate(counts):
+            if weight:
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        set_weights[bit] += weight
+        for bit in range(8):
+            # Majority vote: the bit is set in more than half of the weighted shingles
+            if 2 * set_weights[bit] > total:
+                value |= 1 << (position * 8 + bit)
+    return value
+
+
+def fingerprint_text(text, min_words=20):
+    """(exact hash, SimHash) of a page's text, or None when it is too short to compare."""
+    words = _WORD.findall(text.casefold())
+    if len(words) < min_words:
+        return None
+    return text_hash(words), simhash(words)
+
+
+# SQLite integers are signed 64-bit
+def to_signed(value):
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class SimHashIndex:
+    """
+    Finds stored fingerprints within max_distance bits of a new one.
+
+    The 64 bits are cut into max_distance + 1 blocks. Two fingerprints that
+    differ in at most max_distance bits agree exactly on at least one block,
+    so each block value maps to the fingerprints carrying it and a lookup
+    only compares against those candidates instead of the whole index.
+    """
+
+    def __init__(self, max_distance=3):
+        self.max_distance = max_distance
+        blocks = max_distance + 1
+        self._shifts = [64 * i // blocks for i in range(blocks)]
+        self._masks = [(1 << (64 * (i + 1) // blocks - shift)) - 1 for i, shift in enumerate(self._shifts)]
+        self._tables = [{} for _ in range(blocks)]
+
+    def add(self, value, url):
+        for table, shift, mask in zip(self._tables, self._shifts, self._masks):
+            table.setdefault(value >> shift & mask, []).append((value, url))
+
+    def nearest(self, value, exclude=None):
+        """Returns (url, distance) of the closest fingerprint within range, or None."""
+        best = None
+        for table, shift, mask in zip(self._tables, self._shifts, self._masks):
+            for other, url in table.get(value >> shift & mask, ()):
+                if url == exclude:
+                    continue
+                distance = bin(value ^ other).count('1')
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (url, distance)
+        return best
+
+
+class DuplicateDetector:
+    """
+    Decides whether a page's cleaned text was already stored under another URL.
+
+    An exact hash of the normalized words catches mirrors; a SimHash within
+    max_distance bits catches pages that differ only in boilerplate such as
+    dates, counters or session parameters. Texts shorter than min_words are
+    never treated as duplicates, since empty and near-empty pages all look alike.
+    Fingerprinting is pure CPU work and can run in a parse worker process;
+    only check() touches the shared index.
+    """
+
+    def __init__(self, max_distance=3, min_words=20):
+        self.min_words = min_words
+        self.index = SimHashIndex(max_distance)
+        self.exact = {}
+        self.duplicates = 0
+        self._lock = threading.Lock()
+
+    # Rebuild the index from pages stored by earlier runs
+    def load(self, conn):
+        with self._lock:
+            for url, stored_hash, stored_simhash in conn.execute(
+                    'SELECT url, text_hash, simhash FROM pages WHERE simhash IS NOT NULL'):
+                self.exact.setdefault(stored_hash, url)
+                self.index.add(to_unsigned(stored_simhash), url)
+
+    def fingerprint(self, text):
+        return fingerprint_text(text, self.min_words)
+
+    def check(self, url, fingerprint):
+        """
+        Takes the fingerprint() of a page's text and returns (alias, fields).
+        alias is (canonical_url, kind, distance) when the text duplicates a
+        stored page, else None and the page is indexed; fields holds the
+        text_hash and simhash columns to store with it.
+        """
+        if fingerprint is None:
+            return None, {}
+        exact_hash, value = fingerprint
+        with self._lock:
+            canonical = self.exact.get(exact_hash)
+            if canonical is not None and canonical != url:
+                self.duplicates += 1
+                return (canonical, 'exact', 0), {}
+            match = self.index.nearest(value, exclude=url)
+            if match:
+                self.duplicates += 1
+                return (match[0], 'near', match[1]), {}
+            self.exact.setdefault(exact_hash, url)
+            self.index.add(value, url)
+        return None, {'text_hash': exact_hash, 'simhash': to_signed(value)}
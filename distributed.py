@@ -0,0 +1,365 @@
+import abc
+import argparse
+import glob
+import hashlib
+import importlib
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import yaml
+
+from database import INSERT_PAGE_SQL, connect_database, create_database_table
+from dedup import INSERT_ALIAS_SQL
+from scheduler import host_of
+from visited import FingerprintSet
+
+
+# Host-partitioned crawling: each of N processes (on one machine or several) owns the hosts
+# that hash to its partition and keeps its frontier and database in <project_name>/partition-<i>/.
+# Links to other partitions' hosts travel through a broker; merge folds the partition databases
+# into <project_name>/<database_filename>.
+#
+#   python distributed.py run --processes 4
+#   python distributed.py worker --index 2 --count 4
+#   python distributed.py merge
+
+MERGE_PAGES_SQL = '''
+    SELECT url, title, text, date, date_strategy, summary, summary_status,
+           etag, last_modified, content_hash, fetched_at, next_visit_at, change_interval,
+           text_hash, simhash
+    FROM pages
+'''
+MERGE_ALIASES_SQL = 'SELECT url, canonical_url, kind, distance, found_at FROM page_aliases'
+
+
+def partition_of(url, count):
+    """Partition owning url's host. Stable across processes, unlike hash()."""
+    digest = hashlib.blake2b(host_of(url).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count
+
+
+def partition_dir(project_name, index):
+    return os.path.join(project_name, f'partition-{index}')
+
+
+class Broker(abc.ABC):
+    """
+    What the crawler needs from a message broker. Subclasses (see
+    broker_from_config) may use any transport shared by all partitions.
+
+    receive() must mark the partition busy in the same atomic step that
+    takes its messages, and finished() must read the idle flags and the
+    message count from one consistent snapshot. Otherwise a partition could
+    be seen idle while holding links nobody has crawled yet.
+
+    Links travel as (url, depth, score) entries, so the receiving partition
+    keeps the sender's crawl priority.
+    """
+
+    @abc.abstractmethod
+    def register(self, partition):
+        """Announces a partition as busy."""
+
+    @abc.abstractmethod
+    def publish(self, partition, entries):
+        """Queues (url, depth, score) entries for partition."""
+
+    @abc.abstractmethod
+    def receive(self, partition, limit):
+        """Removes and returns up to limit entries sent to partition."""
+
+    @abc.abstractmethod
+    def set_idle(self, partition, idle):
+        """Records whether partition has nothing queued or in flight."""
+
+    @abc.abstractmethod
+    def finished(self, count):
+        """True once partitions 0..count-1 are all idle and no message is waiting."""
+
+    @abc.abstractmethod
+    def reset(self):
+        """Forgets registered partitions (before a new run); undelivered links are kept."""
+
+    def close(self):
+        pass
+
+
+class SqliteBroker(Broker):
+    """Broker in a SQLite file, for partitions on one machine (or a filesystem with working locks)."""
+
+    def __init__(self, path, timeout=60.0):
+        self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    partition INTEGER,
+                    url TEXT,
+                    depth INTEGER DEFAULT 0,
+                    score REAL DEFAULT 0
+                )
+            ''')
+            # Broker files from before links carried a priority
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(messages)')}
+            for name, column_type in (('depth', 'INTEGER DEFAULT 0'), ('score', 'REAL DEFAULT 0')):
+                if name not in columns:
+                    self._conn.execute(f'ALTER TABLE messages ADD COLUMN {name} {column_type}')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS messages_partition ON messages (partition, id)')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS partitions (
+                    partition INTEGER PRIMARY KEY,
+                    idle INTEGER,
+                    updated REAL
+                )
+            ''')
+
+    def register(self, partition):
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO partitions (partition, idle, updated) VALUES (?, 0, ?)
+                ON CONFLICT(partition) DO UPDATE SET idle = 0, updated = excluded.updated
+            ''', (partition, time.time()))
+
+    def publish(self, partition, entries):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.executemany('INSERT INTO messages (partition, url, depth, score) VALUES (?, ?, ?, ?)',
+                                       [(partition,) + tuple(entry) for entry in entries])
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def receive(self, partition, limit):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(
+                    'SELECT id, url, depth, score FROM messages WHERE partition = ? ORDER BY id LIMIT ?',
+                    (partition, limit)
+                ).fetchall()
+                if rows:
+                    self._conn.execute('DELETE FROM messages WHERE partition = ? AND id <= ?', (partition, rows[-1][0]))
+                    self._conn.execute('UPDATE partitions SET idle = 0, updated = ? WHERE partition = ?',
+                                       (time.time(), partition))
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return [row[1:] for row in rows]
+
+    def set_idle(self, partition, idle):
+        with self._lock:
+            self._conn.execute('UPDATE partitions SET idle = ?, updated = ? WHERE partition = ?',
+                               (int(idle), time.time(), partition))
+
+    def finished(self, count):
+        with self._lock:
+            # One statement, so both counts come from the same snapshot
+            idle, waiting = self._conn.execute('''
+                SELECT (SELECT COUNT(*) FROM partitions WHERE idle = 1 AND partition < ?),
+                       EXISTS (SELECT 1 FROM messages)
+            ''', (count,)).fetchone()
+        return idle == count and not waiting
+
+    def reset(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM partitions')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def broker_from_config(config):
+    """
+    broker: sqlite (the default) uses broker_path, <project_name>/broker.db
+    unless set. Anything else is 'module:ClassName', a Broker subclass
+    constructed with the config dictionary.
+    """
+    name = config.get('broker') or 'sqlite'
+    if name == 'sqlite':
+        path = config.get('broker_path') or os.path.join(config['project_name'], 'broker.db')
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return SqliteBroker(path)
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise ValueError(f"Unknown broker '{name}'. Use 'sqlite' or 'module:ClassName'.")
+    return getattr(importlib.import_module(module_name), class_name)(config)
+
+
+class FrontierExchange(threading.Thread):
+    """
+    Connects one partition's frontier to the broker.
+
+    forward() sends links owned by other partitions (each URL once per
+    process). The thread takes incoming links, hands them to enqueue, and
+    holds the scheduler open while other partitions might still send work:
+    the local crawl only ends once every partition is idle and no message
+    is waiting.
+    """
+
+    def __init__(self, broker, index, count, scheduler, enqueue, poll_interval=0.5, batch_size=1000):
+        super().__init__(name='FrontierExchange', daemon=True)
+        self.broker = broker
+        self.index = index
+        self.count = count
+        self.scheduler = scheduler
+        self.enqueue = enqueue
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.forwarded = FingerprintSet()
+        self.sent = 0
+        self.received = 0
+        self._closed = threading.Event()
+
+    def start(self):
+        self.scheduler.hold()
+        self.broker.register(self.index)
+        super().start()
+
+    def forward(self, entries):
+        batches = {}
+        for entry in entries:
+            if self.forwarded.add(entry[0]):
+                batches.setdefault(partition_of(entry[0], self.count), []).append(entry)
+        for partition, batch in batches.items():
+            self.broker.publish(partition, batch)
+            self.sent += len(batch)
+
+    def run(self):
+        idle = False
+        try:
+            while not self._closed.is_set():
+                entries = self.broker.receive(self.index, self.batch_size)
+                if entries:
+                    # receive() already marked this partition busy
+                    idle = False
+                    self.received += len(entries)
+                    self.enqueue(entries)
+                    continue
+                # Nothing queued or in flight here, and no other hold (a sitemap still being read)
+                local_idle = self.scheduler.pending(exclude_holds=1) == 0
+                if local_idle != idle:
+                    self.broker.set_idle(self.index, local_idle)
+                    idle = local_idle
+                if idle and self.broker.finished(self.count):
+                    break
+                self._closed.wait(self.poll_interval)
+        except Exception as e:
+            print(f"Frontier exchange stopped: {e}", file=sys.stderr)
+        finally:
+            self.scheduler.release()
+
+    def close(self):
+        self._closed.set()
+        if self.is_alive():
+            self.join()
+
+
+def merge_databases(target_path, source_paths, full_text_index=True, batch_size=1000, compress_text=False):
+    """Upserts the pages and aliases of every source database into target_path. Safe to repeat."""
+    conn = connect_database(target_path)
+    create_database_table(conn, full_text_index, compress_text)
+    merged = 0
+    try:
+        for path in source_paths:
+            source = sqlite3.connect(path)
+            try:
+                with conn:
+                    for sql, insert in ((MERGE_PAGES_SQL, INSERT_PAGE_SQL), (MERGE_ALIASES_SQL, INSERT_ALIAS_SQL)):
+                        rows = source.execute(sql)
+                        while True:
+                            batch = rows.fetchmany(batch_size)
+                            if not batch:
+                                break
+                            conn.executemany(insert, batch)
+                            if insert is INSERT_PAGE_SQL:
+                                merged += len(batch)
+            finally:
+                source.close()
+            print(f"Merged {path}")
+    finally:
+        conn.close()
+    return merged
+
+
+def partition_databases(config):
+    project_name = config['project_name']
+    database_filename = config.get('database_filename') or f'{project_name}.db'
+    return sorted(glob.glob(os.path.join(partition_dir(project_name, '*'), database_filename)))
+
+
+def merge_partitions(config):
+    project_name = config['project_name']
+    target = os.path.join(project_name, config.get('database_filename') or f'{project_name}.db')
+    sources = partition_databases(config)
+    merged = merge_databases(target, sources, config.get('full_text_index', True),
+                             compress_text=config.get('compress_text', False))
+    print(f"{merged} pages from {len(sources)} partitions merged into {target}")
+    return target
+
+
+def run_local(config, processes):
+    """Crawls with every partition as a process on this machine, then merges the results."""
+    import main as crawler
+
+    broker = broker_from_config(config)
+    broker.reset()
+    broker.close()
+    context = multiprocessing.get_context('spawn')
+    workers = [
+        context.Process(target=crawler.run, args=(dict(config, partition_index=i, partition_count=processes),),
+                        name=f'partition-{i}')
+        for i in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    failed = [worker.name for worker in workers if worker.exitcode]
+    if failed:
+        print(f"Warning: {', '.join(failed)} exited with an error; merging what was stored.")
+    merge_partitions(config)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Host-partitioned crawling over several processes.')
+    parser.add_argument('--config', default='config.yml')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help='Run every partition on this machine, then merge')
+    run.add_argument('--processes', type=int, default=os.cpu_count() or 2)
+    worker = commands.add_parser('worker', help='Run one partition (start one per partition, on any machine)')
+    worker.add_argument('--index', type=int, required=True)
+    worker.add_argument('--count', type=int, required=True)
+    commands.add_parser('merge', help='Merge the partition databases into the project database')
+    commands.add_parser('reset', help='Forget registered partitions before starting workers by hand')
+    args = parser.parse_args(argv)
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    if args.command == 'run':
+        run_local(config, args.processes)
+    elif args.command == 'worker':
+        import main as crawler
+        crawler.run(dict(config, partition_index=args.index, partition_count=args.count))
+    elif args.command == 'merge':
+        merge_partitions(config)
+    else:
+        broker = broker_from_config(config)
+        broker.reset()
+        broker.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
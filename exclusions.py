@@ -0,0 +1,161 @@
+import re
+
+
+# tag, #id, .class and [attr], [attr=value], [attr~=value], [attr^=value], [attr$=value], [attr*=value]
+_SIMPLE_SELECTOR = re.compile(r'''
+    (?P<tag>[a-zA-Z][\w-]*|\*)?
+    (?P<rest>(?:\#[\w-]+|\.[\w-]+|\[\s*[\w-]+\s*(?:[~^$*]?=\s*(?:"[^"]*"|'[^']*'|[^\]\s]+)\s*)?\])*)$
+''', re.VERBOSE)
+_PART = re.compile(r'''
+    \#(?P<id>[\w-]+)
+    | \.(?P<cls>[\w-]+)
+    | \[\s*(?P<attr>[\w-]+)\s*(?:(?P<op>[~^$*]?=)\s*(?P<value>"[^"]*"|'[^']*'|[^\]\s]+)\s*)?\]
+''', re.VERBOSE)
+
+
+class _Selector:
+
+    def __init__(self, tag, element_id, classes, attributes):
+        self.tag = tag
+        self.element_id = element_id
+        self.classes = classes
+        # (name, operator or None, value)
+        self.attributes = attributes
+
+    def matches(self, tag, attrs, classes):
+        if self.tag and self.tag != tag:
+            return False
+        if self.element_id and attrs.get('id') != self.element_id:
+            return False
+        if self.classes and not self.classes <= classes:
+            return False
+        for name, op, value in self.attributes:
+            actual = attrs.get(name)
+            if actual is None:
+                return False
+            if op is None:
+                continue
+            if op == '=' and actual != value:
+                return False
+            if op == '~=' and value not in actual.split():
+                return False
+            if op == '^=' and not actual.startswith(value):
+                return False
+            if op == '$=' and not actual.endswith(value):
+                return False
+            if op == '*=' and value not in actual:
+                return False
+        return True
+
+
+def parse_selector(selector):
+    """Compiles one simple CSS selector (no combinators) into a _Selector."""
+    text = selector.strip()
+    match = _SIMPLE_SELECTOR.match(text)
+    if not text or not match:
+        raise ValueError(f"Unsupported exclude selector '{selector}': use tag, #id, .class and [attr] parts without spaces")
+    tag = match.group('tag')
+    element_id = None
+    classes = set()
+    attributes = []
+    for part in _PART.finditer(match.group('rest')):
+        if part.group('id'):
+            element_id = part.group('id')
+        elif part.group('cls'):
+            classes.add(part.group('cls'))
+        else:
+            value = part.group('value')
+            if value and value[0] in '"\'':
+                value = value[1:-1]
+            attributes.append((part.group('attr').lower(), part.group('op'), value))
+    return _Selector(None if tag in (None, '*') else tag.lower(), element_id, frozenset(classes), attributes)
+
+
+class ExclusionMatcher:
+    """
+    exclude_tags, exclude_classes and exclude_selectors compiled once.
+
+    Tags and single classes become set lookups. A multi-word class entry
+    ("footer__column footer__column--5") matches elements carrying all of
+    its classes and is indexed under one of them, so an element is only
+    compared against rules that share a class with it. Selectors that are
+    only a tag or only classes fold into those tables; the rest are indexed
+    by tag, id or one of their classes, with a short list for the rest.
+    """
+
+    def __init__(self, exclude_tags=(), exclude_classes=(), exclude_selectors=()):
+        self.tags = {tag.lower() for tag in exclude_tags}
+        self.single_classes = set()
+        self.class_sets = {} # class -> class sets (2+ classes) indexed under it
+        self.selectors_by_tag = {}
+        self.selectors_by_id = {}
+        self.selectors_by_class = {}
+        self.other_selectors = []
+        for entry in exclude_classes:
+            self._add_classes(frozenset(entry.split()))
+        for selector in exclude_selectors:
+            self._add_selector(parse_selector(selector))
+
+    def __bool__(self):
+        return bool(self.tags or self.single_classes or self.class_sets or self.selectors_by_tag
+                    or self.selectors_by_id or self.selectors_by_class or self.other_selectors)
+
+    def _add_classes(self, classes):
+        if not classes:
+            return
+        if len(classes) == 1:
+            self.single_classes.update(classes)
+        else:
+            self.class_sets.setdefault(min(classes), []).append(classes)
+
+    def _add_selector(self, selector):
+        if not selector.element_id and not selector.attributes:
+            if selector.tag and not selector.classes:
+                self.tags.add(selector.tag)
+                return
+            if selector.classes and not selector.tag:
+                self._add_classes(selector.classes)
+                return
+        if selector.tag:
+            self.selectors_by_tag.setdefault(selector.tag, []).append(selector)
+        elif selector.element_id:
+            self.selectors_by_id.setdefault(selector.element_id, []).append(selector)
+        elif selector.classes:
+            self.selectors_by_class.setdefault(min(selector.classes), []).append(selector)
+        else:
+            self.other_selectors.append(selector)
+
+    def matches(self, tag, attrs):
+        """attrs is any mapping with .get(): a dict, lxml attrib or selectolax attributes."""
+        if tag in self.tags:
+            return True
+        class_attr = attrs.get('class')
+        names = class_attr.split() if class_attr else ()
+        if names:
+            single_classes = self.single_classes
+            for name in names:
+                if name in single_classes:
+                    return True
+        classes = None
+        if names and self.class_sets:
+            classes = frozenset(names)
+            for name in names:
+                for required in self.class_sets.get(name, ()):
+                    if required <= classes:
+                        return True
+        if not (self.selectors_by_tag or self.selectors_by_id or self.selectors_by_class or self.other_selectors):
+            return False
+
+        classes = classes if classes is not None else frozenset(names)
+        candidates = self.selectors_by_tag.get(tag, [])
+        if self.selectors_by_id:
+            candidates = candidates + self.selectors_by_id.get(attrs.get('id'), [])
+        if self.selectors_by_class:
+            for name in classes:
+                candidates = candidates + self.selectors_by_class.get(name, [])
+        if self.other_selectors:
+            candidates = candidates + self.other_selectors
+        for selector in candidates:
+            if selector.matches(tag, attrs, classes):
+                return True
+        return False
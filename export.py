@@ -0,0 +1,269 @@
+import argparse
+import csv
+import gzip
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from database import connect_database
+from search import default_database
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+
+# Exported columns; text goes through page_text() so compressed rows come out as plain text
+COLUMNS = {
+    'id': 'id',
+    'url': 'url',
+    'title': 'title',
+    'text': 'page_text(text)',
+    'date': 'date',
+    'date_strategy': 'date_strategy',
+    'summary': 'summary',
+    'summary_status': 'summary_status',
+    'fetched_at': 'fetched_at',
+    'content_hash': 'content_hash',
+}
+COLUMN_INDEX = {name: i for i, name in enumerate(COLUMNS)}
+FORMATS = ('jsonl', 'csv', 'parquet')
+# Rows fetched this long before the previous export started are exported again, since
+# the writer thread may have committed them after that export had read the table
+STATE_MARGIN_SECONDS = 300
+
+
+def _arrow_schema():
+    types = {'id': pyarrow.int64(), 'fetched_at': pyarrow.float64()}
+    return pyarrow.schema([(name, types.get(name, pyarrow.string())) for name in COLUMNS])
+
+
+def _open_text(path, compress):
+    if compress:
+        return gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=6)
+    return open(path, 'w', encoding='utf-8', newline='')
+
+
+class _JsonlWriter:
+
+    def __init__(self, path, compress=False):
+        self.file = _open_text(path, compress)
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class _CsvWriter:
+
+    def __init__(self, path, compress=False):
+        self.file = _open_text(path, compress)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+
+    def __init__(self, path, compress=False):
+        # Parquet pages are compressed anyway
+        self.schema = _arrow_schema()
+        self.writer = parquet.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, rows):
+        # One row group per chunk, so memory stays at one chunk
+        columns = list(zip(*rows))
+        self.writer.write_batch(pyarrow.record_batch(
+            [pyarrow.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema
+        ))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {'jsonl': _JsonlWriter, 'csv': _CsvWriter, 'parquet': _ParquetWriter}
+
+
+def export_range(db_file, path, file_format='jsonl', first_id=0, last_id=None, since=None, chunk_size=5000):
+    """
+    Writes the pages with first_id < id <= last_id (and, with since, only those
+    with id > since[0] or fetched_at >= since[1]) to path. Returns the row count.
+
+    Rows are read in chunks (keyset pagination), so memory does not grow with
+    the table and no read transaction stays open across the export. New rows
+    are read by id from since[0] on; older rows fetched again since since[1]
+    are found through the fetched_at index, so neither reads the whole table.
+    The file is written under a temporary name and renamed when complete.
+    """
+    since_id, since_date = since if since else (None, None)
+    columns = ', '.join(COLUMNS.values())
+    id_bound = '' if last_id is None else f' AND id <= {int(last_id)}'
+    by_id = f"SELECT {columns} FROM pages WHERE id > ?{id_bound} ORDER BY id LIMIT {int(chunk_size)}"
+    conn = connect_database(db_file)
+
+    tmp_path = path + '.tmp'
+    exported = 0
+    try:
+        writer = WRITERS[file_format](tmp_path, path.endswith('.gz'))
+        try:
+            if since_date is not None and since_date != float('inf'):
+                # Rows up to since_id that were fetched (or revisited) since the date, in fetched_at order.
+                # +id keeps SQLite from walking the id range instead of the fetched_at index.
+                by_date = (f"SELECT {columns} FROM pages WHERE (fetched_at, id) > (?, ?) AND +id > ? AND +id <= ? "
+                           f"ORDER BY fetched_at, id LIMIT {int(chunk_size)}")
+                bound = sys.maxsize if last_id is None else last_id
+                if since_id is not None:
+                    bound = min(bound, since_id)
+                cursor = (since_date, -1)
+                while True:
+                    rows = conn.execute(by_date, cursor + (first_id, bound)).fetchall()
+                    if not rows:
+                        break
+                    writer.write(rows)
+                    exported += len(rows)
+                    cursor = (rows[-1][COLUMN_INDEX['fetched_at']], rows[-1][0])
+            # Rows stored after since_id, read by id
+            cursor_id = first_id if since_id is None else max(first_id, since_id)
+            while True:
+                rows = conn.execute(by_id, (cursor_id,)).fetchall()
+                if not rows:
+                    break
+                writer.write(rows)
+                exported += len(rows)
+                cursor_id = rows[-1][0]
+        finally:
+            writer.close()
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    return exported
+
+
+def shard_path(path, index, count):
+    """pages.jsonl.gz -> pages-00001-of-00004.jsonl.gz"""
+    directory, name = os.path.split(path)
+    stem, dot, extension = name.partition('.')
+    return os.path.join(directory, f'{stem}-{index:05d}-of-{count:05d}{dot}{extension}')
+
+
+def export_pages(db_file, path, file_format='jsonl', shards=1, since=None, chunk_size=5000):
+    """
+    Exports the pages table to path, or to shards files written by as many
+    processes, each covering an equal slice of the id range.
+    Returns (rows exported, [paths written]).
+    """
+    if file_format == 'parquet' and pyarrow is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    conn = connect_database(db_file)
+    try:
+        if since:
+            # Databases written before the index existed get it here
+            conn.execute('CREATE INDEX IF NOT EXISTS pages_fetched_at ON pages (fetched_at)')
+        low, high = conn.execute('SELECT MIN(id), MAX(id) FROM pages').fetchone()
+    finally:
+        conn.close()
+    if low is None or shards <= 1:
+        return export_range(db_file, path, file_format, 0, None, since, chunk_size), [path]
+
+    bounds = [low - 1 + (high - low + 1) * i // shards for i in range(shards + 1)]
+    # Rows inserted while exporting belong to the last shard
+    bounds[-1] = None
+    paths = [shard_path(path, i, shards) for i in range(shards)]
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=shards, mp_context=context) as pool:
+        futures = [
+            pool.submit(export_range, db_file, paths[i], file_format, bounds[i], bounds[i + 1], since, chunk_size)
+            for i in range(shards)
+        ]
+        exported = sum(future.result() for future in futures)
+    return exported, paths
+
+
+def read_state(path):
+    """(last id, export start time) of the previous run recorded in path, or None."""
+    if not path or not os.path.isfile(path):
+        return None
+    with open(path, 'r') as f:
+        state = json.load(f)
+    return state['last_id'], state['exported_at'] - STATE_MARGIN_SECONDS
+
+
+def write_state(path, db_file, started):
+    conn = connect_database(db_file)
+    try:
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM pages').fetchone()[0]
+    finally:
+        conn.close()
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'last_id': last_id, 'exported_at': started}, f)
+    os.replace(tmp_path, path)
+
+
+def parse_since_date(value):
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export crawled pages to JSONL, CSV or Parquet.')
+    parser.add_argument('output', help='Output file; .gz compresses JSONL and CSV')
+    parser.add_argument('--format', choices=FORMATS, help='Default: taken from the output file name, else jsonl')
+    parser.add_argument('--db', help='Database file (default: the one configured in config.yml)')
+    parser.add_argument('--since-id', type=int, help='Only pages stored after this row id')
+    parser.add_argument('--since-date', help='Only pages fetched (or revisited) since, e.g. 2024-06-01 or 2024-06-01T12:00')
+    parser.add_argument('--state', help='JSON file remembering the previous export; only newer pages are exported')
+    parser.add_argument('--shards', type=int, default=1, help='Write this many files in parallel processes')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Rows read and written at a time')
+    args = parser.parse_args(argv)
+
+    file_format = args.format
+    if file_format is None:
+        name = args.output[:-3] if args.output.endswith('.gz') else args.output
+        file_format = next((f for f in FORMATS if name.endswith('.' + f)), 'jsonl')
+    db_file = args.db or default_database()
+    if not os.path.isfile(db_file):
+        print(f"Error: database '{db_file}' not found.")
+        return 1
+
+    # Either bound alone is a plain filter; both (or --state) export rows matching either
+    since = read_state(args.state)
+    if args.since_id is not None or args.since_date:
+        since = (args.since_id if args.since_id is not None else sys.maxsize,
+                 parse_since_date(args.since_date) if args.since_date else float('inf'))
+    started = time.time()
+    try:
+        exported, paths = export_pages(db_file, args.output, file_format, args.shards, since, args.chunk_size)
+    except Exception as e:
+        print(f"Export failed: {e}", file=sys.stderr)
+        return 1
+    if args.state:
+        write_state(args.state, db_file, started)
+    elapsed = time.time() - started
+    print(f"{exported} pages exported to {', '.join(paths)} in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
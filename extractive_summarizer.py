@@ -0,0 +1,102 @@
+import math
+import re
+
+# Local summarizer backend with the same functions as summerizer.py. It picks the most
+# central sentences of a page (TextRank over TF-IDF sentence similarity), needs no API
+# key and no network.
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_WORD = re.compile(r'\w+', re.UNICODE)
+STOPWORDS = frozenset('''
+    a about after all also an and any are as at be because been but by can could did do does for from had has
+    have he her his how i if in into is it its just more most no not of on one only or other our out over she
+    so some such than that the their them then there these they this those to up was we were what when which
+    who will with would you your
+'''.split())
+DAMPING = 0.85
+ITERATIONS = 30
+FALLBACK_WORDS = 60
+
+_sentences = 3
+_max_sentences = 80
+_min_words = 5
+
+
+def setup_summarizer(config: dict):
+    global _sentences, _max_sentences, _min_words
+    _sentences = config.get('extractive_summary_sentences', 3)
+    _max_sentences = config.get('extractive_max_sentences', 80)
+    _min_words = config.get('extractive_min_words', 5)
+
+
+def get_rate_limits():
+    """No API behind it: no per-minute or daily limit."""
+    return 0, 0
+
+
+def get_model_name():
+    # Part of the summary cache key, so changing the settings does not reuse old summaries
+    return f'extractive-textrank-{_sentences}-{_max_sentences}'
+
+
+def generate_summary(input_text: str) -> str:
+    return summarize(input_text)
+
+
+def summarize(text, sentences=None):
+    sentences = sentences or _sentences
+    candidates = [s.strip() for s in _SENTENCE_END.split(text or '') if len(s.split()) >= _min_words]
+    candidates = candidates[:_max_sentences]
+    if len(candidates) <= sentences:
+        # Too short (or unpunctuated) to choose from: the opening words stand in
+        return ' '.join((text or '').split()[:FALLBACK_WORDS])
+    ranks = _textrank(_vectors(candidates))
+    best = sorted(range(len(candidates)), key=lambda i: (-ranks[i], i))[:sentences]
+    return ' '.join(candidates[i] for i in sorted(best))
+
+
+def _vectors(sentences):
+    # Unit-length TF-IDF vectors as {term: weight}, sentences playing the part of documents
+    terms = [[w for w in _WORD.findall(s.lower()) if len(w) > 2 and w not in STOPWORDS] for s in sentences]
+    document_frequency = {}
+    for words in terms:
+        for word in set(words):
+            document_frequency[word] = document_frequency.get(word, 0) + 1
+    count = len(sentences)
+    vectors = []
+    for words in terms:
+        vector = {}
+        for word in words:
+            vector[word] = vector.get(word, 0.0) + 1.0
+        for word in vector:
+            vector[word] *= math.log(count / document_frequency[word]) + 1.0
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        vectors.append({word: weight / norm for word, weight in vector.items()})
+    return vectors
+
+
+def _textrank(vectors):
+    count = len(vectors)
+    # Cosine similarities accumulated through an inverted index: only pairs sharing a term are visited
+    postings = {}
+    for i, vector in enumerate(vectors):
+        for word, weight in vector.items():
+            postings.setdefault(word, []).append((i, weight))
+    edges = [dict() for _ in range(count)]
+    for entries in postings.values():
+        for a in range(len(entries)):
+            i, weight_i = entries[a]
+            for b in range(a + 1, len(entries)):
+                j, weight_j = entries[b]
+                weight = weight_i * weight_j
+                edges[i][j] = edges[i].get(j, 0.0) + weight
+                edges[j][i] = edges[j].get(i, 0.0) + weight
+    totals = [sum(edge.values()) for edge in edges]
+
+    ranks = [1.0 / count] * count
+    for _ in range(ITERATIONS):
+        ranks = [
+            (1 - DAMPING) / count + DAMPING * sum(ranks[j] * weight / totals[j] for j, weight in edges[i].items())
+            for i in range(count)
+        ]
+    return ranks
@@ -0,0 +1,145 @@
+import codecs
+import posixpath
+import re
+import zlib
+from urllib.parse import urlsplit
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+
+ACCEPT_ENCODING = 'gzip, deflate, br' if brotli else 'gzip, deflate'
+HTML_TYPES = {'text/html', 'application/xhtml+xml'}
+# Never worth a request: the crawler only extracts HTML
+BINARY_EXTENSIONS = {
+    '.7z', '.apk', '.avi', '.bin', '.bmp', '.bz2', '.css', '.csv', '.dmg', '.doc', '.docx',
+    '.eot', '.epub', '.exe', '.flac', '.gif', '.gz', '.ico', '.iso', '.jar', '.jpeg', '.jpg',
+    '.js', '.json', '.m4a', '.m4v', '.mkv', '.mov', '.mp3', '.mp4', '.mpeg', '.mpg', '.msi',
+    '.odt', '.ogg', '.otf', '.pdf', '.png', '.ppt', '.pptx', '.rar', '.rss', '.svg', '.tar',
+    '.tgz', '.tif', '.tiff', '.ttf', '.wav', '.webm', '.webp', '.woff', '.woff2', '.xls',
+    '.xlsx', '.xml', '.xz', '.zip',
+}
+CHUNK_SIZE = 64 * 1024
+
+_META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9_.:-]+)', re.IGNORECASE)
+_BOMS = ((codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def is_binary_url(url):
+    path = urlsplit(url).path.lower()
+    return posixpath.splitext(path)[1] in BINARY_EXTENSIONS
+
+
+def is_html(content_type):
+    """A missing Content-Type is given the benefit of the doubt."""
+    if not content_type:
+        return True
+    return content_type.split(';', 1)[0].strip().lower() in HTML_TYPES
+
+
+class BodyReader:
+    """
+    Collects a response body chunk by chunk, undoing its Content-Encoding on
+    the fly. Raises BodyTooLarge as soon as the decoded size passes
+    max_bytes, so oversized pages and compression bombs are cut off early.
+    """
+
+    def __init__(self, content_encoding=None, max_bytes=None):
+        self.max_bytes = max_bytes
+        self.wire_bytes = 0
+        self.size = 0
+        self._chunks = []
+        encoding = (content_encoding or '').strip().lower()
+        if encoding in ('gzip', 'x-gzip'):
+            self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            self._decoder = None # zlib-wrapped or raw, decided by the first chunk
+        elif encoding == 'br':
+            if brotli is None:
+                raise ValueError("Response is brotli encoded but no brotli module is installed")
+            self._decoder = brotli.Decompressor()
+        elif encoding in ('', 'identity'):
+            self._decoder = False
+        else:
+            raise ValueError(f"Unsupported Content-Encoding: {content_encoding}")
+        self._deflate = encoding == 'deflate'
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        self.wire_bytes += len(chunk)
+        if self._deflate and self._decoder is None:
+            # Servers disagree on whether "deflate" carries the zlib header
+            self._decoder = zlib.decompressobj()
+            try:
+                data = self._decoder.decompress(chunk)
+            except zlib.error:
+                self._decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+                data = self._decoder.decompress(chunk)
+        elif self._decoder is False:
+            data = chunk
+        elif hasattr(self._decoder, 'process'):
+            data = self._decoder.process(chunk)
+        else:
+            data = self._decoder.decompress(chunk)
+        self._add(data)
+
+    def finish(self):
+        if self._decoder and hasattr(self._decoder, 'flush'):
+            self._add(self._decoder.flush())
+        return b''.join(self._chunks)
+
+    def _add(self, data):
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise BodyTooLarge(f"Body exceeds {self.max_bytes} bytes")
+        self._chunks.append(data)
+
+
+def read_body(response, max_bytes=None):
+    """Streams a urllib response through a BodyReader."""
+    length = response.headers.get('Content-Length')
+    if max_bytes and length and length.isdigit() and int(length) > max_bytes:
+        raise BodyTooLarge(f"Content-Length {length} exceeds {max_bytes} bytes")
+    body = BodyReader(response.headers.get('Content-Encoding'), max_bytes)
+    while True:
+        chunk = response.read(CHUNK_SIZE)
+        if not chunk:
+            return body.finish()
+        body.feed(chunk)
+
+
+def detect_charset(content_type, body):
+    """Charset from a BOM, the Content-Type header or a <meta> tag, else UTF-8."""
+    for bom, name in _BOMS:
+        if body.startswith(bom):
+            return name
+    candidates = []
+    if content_type:
+        for param in content_type.split(';')[1:]:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'charset':
+                candidates.append(value.strip().strip('"\''))
+    match = _META_CHARSET.search(body[:4096])
+    if match:
+        candidates.append(match.group(1).decode('ascii'))
+    for candidate in candidates:
+        try:
+            return codecs.lookup(candidate).name
+        except LookupError:
+            continue
+    return 'utf-8'
+
+
+def decode_html(body, content_type=None):
+    # Undecodable bytes become U+FFFD instead of losing the page
+    return body.decode(detect_charset(content_type, body), errors='replace')
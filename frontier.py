@@ -0,0 +1,214 @@
+import os
+import threading
+
+from visited import FingerprintSet
+
+
+# Journal record markers: one record per line, "<marker>\t<url>"; queued records
+# add "\t<depth>\t<score>", as do the lines of queue.txt
+QUEUED = 'Q'
+CRAWLED = 'C'
+
+
+class FrontierStore:
+    """
+    Append-only persistence for the crawl frontier.
+
+    queue.txt and crawled.txt are snapshots. Every newly queued URL and every
+    crawled mark is appended to frontier.journal instead of rewriting both
+    snapshots after each page. Once the journal holds more records than the
+    live queue (and at least compact_every records) it is folded back into the
+    snapshots, so the amortized cost per page stays constant.
+
+    Crawled and seen (queued or crawled) URLs are kept in compact visited
+    structures (see visited.py) rather than sets of strings. The crawled one
+    is saved to visited.bin on compaction together with the crawled.txt
+    offset it covers, so a restart only re-reads the tail of crawled.txt.
+    Queued URLs are not kept in memory at all: the scheduler holds them, and
+    compaction streams queue.txt and the journal into the new queue.txt.
+    """
+
+    def __init__(self, project_name, compact_every=1000, fsync=False, visited_factory=FingerprintSet):
+        self.queue_file = os.path.join(project_name, 'queue.txt')
+        self.crawled_file = os.path.join(project_name, 'crawled.txt')
+        self.journal_file = os.path.join(project_name, 'frontier.journal')
+        self.visited_file = os.path.join(project_name, 'visited.bin')
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.visited_factory = visited_factory
+        self.lock = threading.RLock()
+        self.queued = 0 # URLs queued and not crawled yet
+        self.crawled = visited_factory()
+        self.seen = visited_factory()
+        self._journal = None
+        self._journal_records = 0
+        # Crawled marks that are only in the journal, appended to crawled.txt on compaction
+        self._crawled_since_compact = []
+
+    # Load the snapshots and replay the journal on top of them
+    def load(self):
+        with self.lock:
+            self.crawled = self._load_crawled()
+            self._crawled_since_compact = []
+            self._journal_records = 0
+
+            for marker, url, _, _ in self._journal_entries():
+                if marker == CRAWLED and self.crawled.add(url):
+                    self._crawled_since_compact.append(url)
+                self._journal_records += 1
+
+            self.seen = self.crawled.copy()
+            # Drop any torn tail so new records start on a clean line; leaves a fresh journal open
+            self.compact()
+            for url, _, _ in self.pending():
+                self.seen.add(url)
+            return self.crawled
+
+    # Add (url, depth, score) entries to the queue, returns the ones that were actually new
+    def add_links(self, entries):
+        added = []
+        with self.lock:
+            for entry in entries:
+                if self.seen.add(entry[0]):
+                    added.append(entry)
+            if added:
+                for url, depth, score in added:
+                    self._journal.write(f'{QUEUED}\t{url}\t{depth}\t{score:.6g}\n')
+                self._sync(self._journal)
+                self._journal_records += len(added)
+                self.queued += len(added)
+        return added
+
+    # Move a URL from the queue to the crawled set, returns False if it was already crawled
+    def mark_crawled(self, url):
+        with self.lock:
+            was_queued = not self.seen.add(url)
+            if not self.crawled.add(url):
+                return False
+            if was_queued and self.queued:
+                self.queued -= 1
+            self._crawled_since_compact.append(url)
+            self._journal.write(CRAWLED + '\t' + url + '\n')
+            self._sync(self._journal)
+            self._journal_records += 1
+            self.maybe_compact()
+            return True
+
+    def pending(self):
+        """
+        Yields (url, depth, score) for every queued URL not crawled yet, read
+        from queue.txt, which load() and compact() leave up to date.
+        """
+        if not os.path.isfile(self.queue_file):
+            return
+        with open(self.queue_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = _parse_queued(line.rstrip('\n').split('\t'))
+                if entry and entry[0] not in self.crawled:
+                    yield entry
+
+    def maybe_compact(self):
+        with self.lock:
+            # Compaction rewrites the queue and dumps the crawled table, so wait until
+            # the journal is large relative to both to keep the per-page cost constant
+            if self._journal_records >= max(self.compact_every, self.queued, len(self.crawled) // 16):
+                self.compact()
+
+    # Fold the journal into the snapshots and truncate it
+    def compact(self):
+        with self.lock:
+            # crawled.txt only ever grows, so it is appended rather than rewritten
+            if self._crawled_since_compact:
+                with open(self.crawled_file, 'a', encoding='utf-8') as f:
+                    for url in self._crawled_since_compact:
+                        f.write(url + '\n')
+                    self._sync(f)
+            if os.path.isfile(self.crawled_file):
+                self.crawled.save(self.visited_file, meta=os.path.getsize(self.crawled_file))
+
+            # Old queue.txt plus the journal's queued records, minus what was crawled since
+            if self._journal:
+                self._sync(self._journal)
+            # Exact even when visited_set is a Bloom filter, so no queued URL is dropped
+            written = FingerprintSet()
+            tmp_file = self.queue_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                queued = self.pending()
+                journal = ((url, depth, score) for marker, url, depth, score in self._journal_entries()
+                           if marker == QUEUED and url not in self.crawled)
+                for source in (queued, journal):
+                    for url, depth, score in source:
+                        # A crash between the replace below and the journal truncation repeats records
+                        if written.add(url):
+                            f.write(f'{url}\t{depth}\t{score:.6g}\n')
+                self._sync(f)
+            os.replace(tmp_file, self.queue_file)
+            self.queued = len(written)
+
+            # Replaying records already in the snapshots is harmless, so a crash
+            # before this point only costs a redundant replay
+            if self._journal:
+                self._journal.close()
+            self._journal = open(self.journal_file, 'w', encoding='utf-8')
+            self._sync(self._journal)
+            self._journal_records = 0
+            self._crawled_since_compact = []
+
+    def close(self):
+        with self.lock:
+            if self._journal is None:
+                return
+            self.compact()
+            self._journal.close()
+            self._journal = None
+
+    # visited.bin plus whatever was appended to crawled.txt after it was saved
+    def _load_crawled(self):
+        offset = 0
+        try:
+            crawled, offset = type(self.visited_factory()).load(self.visited_file)
+        except ValueError:
+            crawled = self.visited_factory()
+        if not os.path.isfile(self.crawled_file):
+            return crawled
+        if offset > os.path.getsize(self.crawled_file):
+            # crawled.txt was replaced behind our back, rebuild from scratch
+            crawled, offset = self.visited_factory(), 0
+        with open(self.crawled_file, 'r', encoding='utf-8') as f:
+            f.seek(offset)
+            for line in f:
+                line = line.rstrip('\n')
+                if line:
+                    crawled.add(line)
+        return crawled
+
+    # (marker, url, depth, score) for every complete journal record
+    def _journal_entries(self):
+        if not os.path.isfile(self.journal_file):
+            return
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                # A line without a newline is a record torn by a crash
+                if not line.endswith('\n'):
+                    break
+                fields = line[:-1].split('\t')
+                entry = _parse_queued(fields[1:])
+                if entry:
+                    yield (fields[0],) + entry
+
+    def _sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+
+# (url, depth, score) from "url[\tdepth\tscore]"; older files have the URL only
+def _parse_queued(fields):
+    if not fields or not fields[0]:
+        return None
+    try:
+        depth = int(fields[1]) if len(fields) > 1 else 0
+        score = float(fields[2]) if len(fields) > 2 else 0.0
+    except ValueError:
+        depth, score = 0, 0.0
+    return fields[0], depth, score
@@ -1,5 +1,4 @@
 import threading
-from queue import Queue
 import yaml # Import the yaml library
 
 
@@ -10,75 +9,95 @@ from general import * # Assuming file_to_set is here
 # --- Configuration Loading ---
 CONFIG_FILE = 'config.yml'
 
-if not os.path.exists(CONFIG_FILE):
-    print(f"Error: Configuration file '{CONFIG_FILE}' not found.")
-    print("Please create a config.yml file in the same directory as main.py.")
-    exit(1)
-
-try:
-    with open(CONFIG_FILE, 'r') as f:
-        config = yaml.safe_load(f)
-except yaml.YAMLError as e:
-    print(f"Error parsing configuration file '{CONFIG_FILE}': {e}")
-    exit(1)
-except Exception as e:
-    print(f"An unexpected error occurred while reading '{CONFIG_FILE}': {e}")
-    exit(1)
-
-# Use .get() with a default for robustness, especially for optional settings
-PROJECT_NAME = config.get('project_name')
-HOMEPAGE = config.get('homepage_url')
-DOMAIN_NAME = get_domain_name(HOMEPAGE) if HOMEPAGE else None # Ensure HOMEPAGE exists
-NUMBER_OF_THREADS = config.get('number_of_threads', 8) # Default to 8 threads if not specified in config
-
-# Validate essential config values
-if not all([PROJECT_NAME, HOMEPAGE, DOMAIN_NAME]):
-    print("Error: Missing essential configuration values (project_name, homepage_url, domain_name) in config.yml.")
-    exit(1)
-
-# File paths derived from project name
-QUEUE_FILE = os.path.join(PROJECT_NAME, 'queue.txt')
-CRAWLED_FILE = os.path.join(PROJECT_NAME, 'crawled.txt')
-
-# --- Crawler Initialization ---
-queue = Queue()
-# Pass the full config dictionary to the Spider
-Spider(PROJECT_NAME, HOMEPAGE, DOMAIN_NAME, config)
-
-# --- Worker Functions (remain largely the same) ---
-def create_workers():
-    """Creates worker threads that will process URLs from the queue."""
-    for _ in range(NUMBER_OF_THREADS):
+
+def load_config(path=CONFIG_FILE):
+    """Reads config.yml, exiting with a message if it is missing or invalid."""
+    if not os.path.exists(path):
+        print(f"Error: Configuration file '{path}' not found.")
+        print("Please create a config.yml file in the same directory as main.py.")
+        exit(1)
+
+    try:
+        with open(path, 'r') as f:
+            return yaml.safe_load(f)
+    except yaml.YAMLError as e:
+        print(f"Error parsing configuration file '{path}': {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An unexpected error occurred while reading '{path}': {e}")
+        exit(1)
+
+# --- Worker Functions ---
+def create_workers(number_of_threads):
+    """Creates worker threads that will process URLs from the scheduler."""
+    threads = []
+    for _ in range(number_of_threads):
         t = threading.Thread(target=work)
         t.daemon = True  # Allows the main program to exit even if threads are running
         t.start()
+        threads.append(t)
+    return threads
 
 def work():
-    """Worker function: gets a URL from the queue, crawls it, and marks the job as done."""
+    """Worker function: crawls URLs as their host becomes ready until the frontier is exhausted."""
     while True:
-        url = queue.get()
-        Spider.crawl_page(threading.current_thread().name, url)
-        queue.task_done()
-
-def create_jobs():
-    """Puts links from the queue file into the thread queue."""
-    for link in file_to_set(QUEUE_FILE):
-        queue.put(link)
-    queue.join() # Blocks until all items in the queue have been processed
-    crawl() # After jobs are done, check if there's more to crawl
-
-def crawl():
-    """Checks the queue file and initiates new jobs if there are links."""
-    queued_links = file_to_set(QUEUE_FILE)
-    if len(queued_links) > 0:
-        print(f"{len(queued_links)} links in the queue. Starting jobs...")
-        create_jobs()
-    else:
-        print("Queue is empty. Crawling finished or nothing to crawl.")
+        url = Spider.scheduler.get()
+        if url is None: # Nothing queued and nothing in flight: the crawl is over
+            break
+        try:
+            Spider.crawl_page(threading.current_thread().name, url)
+        finally:
+            Spider.scheduler.task_done(url)
+
+def crawl(number_of_threads):
+    """Runs the workers on the continuous frontier until it is exhausted."""
+    print(f"{Spider.scheduler.pending()} links in the queue. Starting workers...")
+    for t in create_workers(number_of_threads):
+        t.join()
+    print("Queue is empty. Crawling finished or nothing to crawl.")
+
+
+def crawl_async(config):
+    """Runs the asyncio engine instead of worker threads."""
+    from async_engine import AsyncCrawler
+    AsyncCrawler(
+        Spider,
+        max_in_flight=config.get('max_in_flight', 100),
+        connections_per_host=config.get('connections_per_host', 8),
+        timeout=config.get('request_timeout_seconds', 30),
+        max_page_bytes=Spider.max_page_bytes()
+    ).run()
 
 
 # --- Start the Crawler ---
-print(f"Starting crawler for project: {PROJECT_NAME}")
-create_workers()
-crawl()
-print("Main program finished.")
+def run(config):
+    """Crawls the site described by a loaded config dictionary, then shuts the Spider down."""
+    # Use .get() with a default for robustness, especially for optional settings
+    project_name = config.get('project_name')
+    homepage = config.get('homepage_url')
+    domain_name = get_domain_name(homepage) if homepage else None # Ensure homepage exists
+    number_of_threads = config.get('number_of_threads', 8) # Default to 8 threads if not specified in config
+    engine = config.get('engine', 'threads') # 'threads' or 'asyncio'
+
+    # Validate essential config values
+    if not all([project_name, homepage, domain_name]):
+        print("Error: Missing essential configuration values (project_name, homepage_url, domain_name) in config.yml.")
+        exit(1)
+
+    # Pass the full config dictionary to the Spider
+    Spider(project_name, homepage, domain_name, config)
+
+    print(f"Starting crawler for project: {project_name}")
+    try:
+        if engine == 'asyncio':
+            crawl_async(config)
+        else:
+            crawl(number_of_threads)
+    finally:
+        Spider.shutdown() # Compacts the frontier journal into queue.txt/crawled.txt
+    print("Main program finished.")
+
+
+# Guarded because parse worker processes (parse_processes) and benchmarks import this module
+if __name__ == '__main__':
+    run(load_config())
@@ -0,0 +1,188 @@
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Timed stages: fetch, decode, parse and extract per page, db_write per batch, summary per API call
+STAGES = ('fetch', 'decode', 'parse', 'extract', 'db_write', 'summary')
+COUNTERS = (
+    'status_2xx', 'status_3xx', 'status_4xx', 'status_5xx', 'fetch_errors', 'bytes_received',
+    'non_html_skipped', 'too_large', 'not_modified', 'robots_denied', 'dedup_hits', 'pages_stored', 'retries',
+)
+# Upper bounds in seconds of the Prometheus histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Stage:
+    __slots__ = ('count', 'total', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        # Non-cumulative; the last slot counts observations above BUCKETS[-1]
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+
+class _Timer:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """
+    Per-stage timings and counters shared by every crawl thread.
+
+    Updates take one short lock and never print; the periodic summary line
+    and the Prometheus endpoint read consistent snapshots.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._stages = {name: _Stage() for name in STAGES}
+        self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def observe(self, stage, seconds):
+        index = bisect_left(BUCKETS, seconds)
+        with self._lock:
+            timings = self._stages[stage]
+            timings.count += 1
+            timings.total += seconds
+            timings.buckets[index] += 1
+
+    def timer(self, stage):
+        """with metrics.timer('fetch'): ... records the block's duration."""
+        return _Timer(self, stage)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def count_status(self, status):
+        if 200 <= status < 600:
+            self.incr(f'status_{status // 100}xx')
+
+    def snapshot(self):
+        """(counters, {stage: (count, total seconds, buckets)}) at this instant."""
+        with self._lock:
+            stages = {name: (s.count, s.total, list(s.buckets)) for name, s in self._stages.items()}
+            return dict(self._counters), stages
+
+    def summary_line(self, current, previous=None, seconds=None, gauges=None):
+        """
+        One line for the console. With a previous snapshot, rates and average
+        stage times cover only the interval between the two.
+        """
+        counters, stages = current
+        if previous is None:
+            previous = (dict.fromkeys(counters, 0), {name: (0, 0.0, None) for name in stages})
+            seconds = time.monotonic() - self.started
+        delta = {name: counters[name] - previous[0][name] for name in counters}
+        pages = sum(delta[f'status_{n}xx'] for n in (2, 3, 4, 5)) + delta['fetch_errors']
+        rate = pages / seconds if seconds else 0.0
+        timings = []
+        for name, (count, total, _) in stages.items():
+            count -= previous[1][name][0]
+            total -= previous[1][name][1]
+            if count:
+                timings.append(f"{name} {total / count * 1e3:.1f}")
+        parts = [
+            f"{pages} pages ({rate:.1f}/s)",
+            ' '.join(f"{n}xx {delta[f'status_{n}xx']}" for n in (2, 3, 4, 5)) + f" err {delta['fetch_errors']} retry {delta['retries']}",
+            f"{delta['bytes_received'] / 2**20:.1f} MiB",
+            f"stored {delta['pages_stored']} dedup {delta['dedup_hits']} robots denied {delta['robots_denied']}",
+        ]
+        if timings:
+            parts.append('avg ms ' + ' '.join(timings))
+        if gauges:
+            parts.append(' '.join(f"{name} {value}" for name, value in gauges.items()))
+        return '[metrics] ' + ' | '.join(parts)
+
+    def prometheus_text(self, gauges=None):
+        """The Prometheus text exposition format (version 0.0.4)."""
+        counters, stages = self.snapshot()
+        lines = [
+            '# HELP crawler_stage_seconds Time spent per crawl stage.',
+            '# TYPE crawler_stage_seconds histogram',
+        ]
+        for name, (count, total, buckets) in stages.items():
+            cumulative = 0
+            for bound, observed in zip(BUCKETS, buckets):
+                cumulative += observed
+                lines.append(f'crawler_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'crawler_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+            lines.append(f'crawler_stage_seconds_sum{{stage="{name}"}} {total}')
+            lines.append(f'crawler_stage_seconds_count{{stage="{name}"}} {count}')
+        lines.append('# TYPE crawler_responses_total counter')
+        for n in (2, 3, 4, 5):
+            lines.append(f'crawler_responses_total{{class="{n}xx"}} {counters[f"status_{n}xx"]}')
+        for name, value in counters.items():
+            if not name.startswith('status_'):
+                lines.append(f'# TYPE crawler_{name}_total counter')
+                lines.append(f'crawler_{name}_total {value}')
+        for name, value in (gauges or {}).items():
+            lines.append(f'# TYPE crawler_{name} gauge')
+            lines.append(f'crawler_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsReporter(threading.Thread):
+    """Prints Metrics.summary_line() every interval seconds until close()."""
+
+    def __init__(self, metrics, interval, gauges=None):
+        super().__init__(name='MetricsReporter', daemon=True)
+        self.metrics = metrics
+        self.interval = interval
+        # Callable returning {name: value} for queue sizes and other point-in-time values
+        self.gauges = gauges
+        self._closed = threading.Event()
+
+    def run(self):
+        previous = self.metrics.snapshot()
+        last = time.monotonic()
+        while not self._closed.wait(self.interval):
+            current = self.metrics.snapshot()
+            now = time.monotonic()
+            print(self.metrics.summary_line(current, previous, now - last, self.gauges() if self.gauges else None))
+            previous, last = current, now
+
+    def close(self):
+        self._closed.set()
+        if self.is_alive():
+            self.join()
+
+
+def start_metrics_server(metrics, port, host='127.0.0.1', gauges=None):
+    """Serves metrics.prometheus_text() at http://host:port/metrics from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text(gauges() if gauges else None).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='MetricsServer', daemon=True).start()
+    return server
@@ -0,0 +1,375 @@
+import re
+from html.parser import HTMLParser
+from urllib import parse
+
+from exclusions import ExclusionMatcher
+
+
+# Elements whose class marks a publication date (date strategy 2)
+DATE_CLASSES = {'date', 'post-date', 'published', 'entry-date', 'article-date'}
+# <meta> tags that carry a publication date (date strategy 3)
+DATE_META_PROPERTIES = {'article:published_time', 'og:pubdate'}
+DATE_META_NAMES = {'date', 'pubdate', 'DC.date.issued', 'last_updated'}
+# Never part of the visible text
+NON_TEXT_TAGS = {'script', 'style', 'template', 'noscript'}
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+}
+# Elements whose end tag may be left out, and the start tags that close them when they do
+_BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'details', 'div', 'dl', 'fieldset', 'figcaption', 'figure',
+    'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'main', 'menu', 'nav', 'ol', 'p', 'pre',
+    'section', 'table', 'ul',
+}
+IMPLIED_END_TAGS = {
+    'li': {'li'},
+    'p': _BLOCK_TAGS,
+    'option': {'option', 'optgroup'},
+    'dt': {'dt', 'dd'},
+    'dd': {'dt', 'dd'},
+    'tr': {'tr', 'tbody', 'thead', 'tfoot'},
+    'td': {'td', 'th', 'tr', 'tbody', 'thead', 'tfoot'},
+    'th': {'td', 'th', 'tr', 'tbody', 'thead', 'tfoot'},
+}
+# A sibling start tag nested in one of these belongs to the inner list or table, not ours
+_SCOPE_TAGS = {'ul', 'ol', 'dl', 'table', 'select'}
+
+BACKENDS = ('selectolax', 'lxml', 'html.parser')
+# lxml refuses str input that declares its encoding, as XHTML pages often do
+_XML_DECLARATION = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+
+class ParsedPage:
+    """Everything the spider needs from one document, produced by a single parse."""
+
+    def __init__(self):
+        self.links = set()
+        self.title = None
+        self.text = ''
+        # Date candidates, in the order the date strategies consult them
+        self.time_date = None
+        self.class_dates = []
+        self.meta_dates = []
+        # Absolute URL from <link rel="canonical">, if the page declares one
+        self.canonical = None
+
+
+def available_backends():
+    """Returns the parser backends that can be used in this environment."""
+    backends = []
+    try:
+        import selectolax.parser  # noqa: F401
+        backends.append('selectolax')
+    except ImportError:
+        pass
+    try:
+        import lxml.html  # noqa: F401
+        backends.append('lxml')
+    except ImportError:
+        pass
+    backends.append('html.parser')
+    return backends
+
+
+def resolve_backend(name='auto'):
+    """Picks the fastest installed backend for 'auto', or checks a named one."""
+    installed = available_backends()
+    if not name or name == 'auto':
+        return installed[0]
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown parser backend '{name}'. Choose one of: auto, {', '.join(BACKENDS)}")
+    if name not in installed:
+        print(f"Warning: parser backend '{name}' is not installed. Falling back to 'html.parser'.")
+        return 'html.parser'
+    return name
+
+
+def parse_page(html_string, page_url, exclude_tags=(), exclude_classes=(), backend='html.parser', exclusions=None):
+    """
+    Parses a document once and returns its links, title, cleaned text and
+    date candidates. Links are collected from the whole document; text and
+    dates skip the subtrees matched by exclude_tags/exclude_classes or by a
+    precompiled ExclusionMatcher.
+    """
+    if exclusions is None:
+        # Callers parsing many pages should compile an ExclusionMatcher once and pass it in
+        exclusions = ExclusionMatcher(exclude_tags, exclude_classes)
+    if backend == 'selectolax':
+        return _parse_selectolax(html_string, page_url, exclusions)
+    if backend == 'lxml':
+        return _parse_lxml(html_string, page_url, exclusions)
+    parser = _PageParser(page_url, exclusions)
+    parser.feed(html_string)
+    parser.close()
+    return parser.page
+
+
+def _is_date_meta(attrs):
+    return attrs.get('property') in DATE_META_PROPERTIES or attrs.get('name') in DATE_META_NAMES
+
+
+def _is_canonical_link(attrs):
+    return 'canonical' in (attrs.get('rel') or '').lower().split() and bool(attrs.get('href'))
+
+
+def _join_text(chunks):
+    return ' '.join(chunk for chunk in (c.strip() for c in chunks) if chunk)
+
+
+class _PageParser(HTMLParser):
+    """Standard library backend: one event stream feeds every output."""
+
+    def __init__(self, page_url, exclusions):
+        super().__init__(convert_charrefs=True)
+        self.page_url = page_url
+        self.exclusions = exclusions
+        self.page = ParsedPage()
+        self.text_chunks = []
+        # [tag, open elements inside it] of the excluded or non-text element being skipped
+        self.skip = None
+        # Open elements whose text is being captured: [tag, depth, chunks, kind]
+        self.captures = []
+        self.in_title = False
+        self.title_chunks = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        # Links count everywhere, including excluded navigation and footers
+        if tag == 'a':
+            href = attrs.get('href')
+            if href:
+                self.page.links.add(parse.urljoin(self.page_url, href))
+        elif tag in VOID_TAGS:
+            self._void_tag(tag, attrs)
+            return
+
+        if self.skip is not None:
+            if not self._skip_closed_by(tag):
+                self.skip[1].append(tag)
+                return
+            # A sibling start tag implicitly ended the skipped element; this one is handled as usual
+            self.skip = None
+
+        for capture in self.captures:
+            if capture[0] == tag:
+                capture[1] += 1
+
+        if tag in NON_TEXT_TAGS or self.exclusions.matches(tag, attrs):
+            self.skip = [tag, []]
+            return
+
+        class_attr = attrs.get('class')
+        if tag == 'title' and self.page.title is None:
+            self.in_title = True
+        elif tag == 'time' and self.page.time_date is None:
+            if attrs.get('datetime'):
+                self.page.time_date = attrs['datetime']
+            else:
+                self.captures.append([tag, 1, [], 'time'])
+        if class_attr and DATE_CLASSES.intersection(class_attr.split()):
+            self.captures.append([tag, 1, [], 'class'])
+
+    def handle_startendtag(self, tag, attrs):
+        # Self-closing tags never open a subtree
+        if tag == 'a' or tag in VOID_TAGS:
+            attrs = dict(attrs)
+            if tag == 'a' and attrs.get('href'):
+                self.page.links.add(parse.urljoin(self.page_url, attrs['href']))
+            else:
+                self._void_tag(tag, attrs)
+
+    def _void_tag(self, tag, attrs):
+        if tag == 'meta':
+            if self.skip is None and _is_date_meta(attrs) and attrs.get('content'):
+                self.page.meta_dates.append(attrs['content'])
+        elif tag == 'link' and self.page.canonical is None and _is_canonical_link(attrs):
+            self.page.canonical = parse.urljoin(self.page_url, attrs['href'])
+
+    def _skip_closed_by(self, tag):
+        # Same rule the HTML tree builders apply to an open <li>, <p>, <td>... without its end tag
+        closers = IMPLIED_END_TAGS.get(self.skip[0])
+        if not closers or tag not in closers:
+            return False
+        return not any(open_tag in _SCOPE_TAGS for open_tag in self.skip[1])
+
+    def handle_endtag(self, tag):
+        if self.skip is not None:
+            tag_name, inner = self.skip
+            if tag in inner:
+                # Closes an element inside the skipped one, and whatever was left open within it
+                del inner[len(inner) - 1 - inner[::-1].index(tag):]
+                return
+            if tag == tag_name:
+                self.skip = None
+                return
+            if tag_name not in IMPLIED_END_TAGS:
+                return
+            # The parent closed, which ends an element that left out its end tag too
+            self.skip = None
+
+        if tag == 'title' and self.in_title:
+            self.in_title = False
+            self.page.title = ''.join(self.title_chunks).strip()
+
+        for capture in list(self.captures):
+            if capture[0] != tag:
+                continue
+            capture[1] -= 1
+            if capture[1] == 0:
+                self.captures.remove(capture)
+                self._finish_capture(capture)
+
+    def handle_data(self, data):
+        if self.skip is not None:
+            return
+        if self.in_title:
+            self.title_chunks.append(data)
+        self.text_chunks.append(data)
+        for capture in self.captures:
+            capture[2].append(data)
+
+    def _finish_capture(self, capture):
+        text = _join_text(capture[2])
+        if capture[3] == 'time':
+            if self.page.time_date is None:
+                self.page.time_date = text
+        elif text:
+            self.page.class_dates.append(text)
+
+    def close(self):
+        super().close()
+        # Unclosed capture elements still count
+        for capture in self.captures:
+            self._finish_capture(capture)
+        self.captures = []
+        if self.in_title:
+            self.page.title = ''.join(self.title_chunks).strip()
+        self.page.text = _join_text(self.text_chunks)
+
+    def error(self, message):
+        pass
+
+
+def _parse_lxml(html_string, page_url, exclusions):
+    import lxml.html
+
+    page = ParsedPage()
+    if not html_string.strip():
+        return page
+    root = lxml.html.fromstring(_XML_DECLARATION.sub('', html_string, count=1))
+
+    for element in root.iter('a'):
+        href = element.get('href')
+        if href:
+            page.links.add(parse.urljoin(page_url, href))
+
+    title = root.find('.//title')
+    if title is not None:
+        page.title = title.text_content().strip()
+
+    for element in root.iter('link'):
+        if _is_canonical_link(element.attrib):
+            page.canonical = parse.urljoin(page_url, element.get('href'))
+            break
+
+    chunks = []
+    stack = [root]
+    while stack:
+        element = stack.pop()
+        # A string marks the tail text of an element whose subtree was handled
+        if isinstance(element, str):
+            chunks.append(element)
+            continue
+        tag = element.tag if isinstance(element.tag, str) else None
+        excluded = tag is None or tag in NON_TEXT_TAGS or exclusions.matches(tag, element.attrib)
+        if element.tail and element is not root:
+            stack.append(element.tail)
+        if excluded:
+            continue
+
+        if tag == 'meta':
+            attrs = element.attrib
+            if _is_date_meta(attrs) and attrs.get('content'):
+                page.meta_dates.append(attrs['content'])
+        elif tag == 'time' and page.time_date is None:
+            page.time_date = element.get('datetime') or _join_text(element.itertext())
+        class_attr = element.get('class')
+        if class_attr and DATE_CLASSES.intersection(class_attr.split()):
+            text = _join_text(element.itertext())
+            if text:
+                page.class_dates.append(text)
+
+        if element.text:
+            chunks.append(element.text)
+        stack.extend(reversed(element))
+
+    page.text = _join_text(chunks)
+    return page
+
+
+def _parse_selectolax(html_string, page_url, exclusions):
+    from selectolax.parser import HTMLParser as FastHTMLParser
+
+    page = ParsedPage()
+    tree = FastHTMLParser(html_string)
+
+    for node in tree.css('a[href]'):
+        href = node.attributes.get('href')
+        if href:
+            page.links.add(parse.urljoin(page_url, href))
+
+    title = tree.css_first('title')
+    if title is not None:
+        page.title = title.text(strip=True)
+
+    for node in tree.css('link[rel][href]'):
+        if _is_canonical_link(node.attributes):
+            page.canonical = parse.urljoin(page_url, node.attributes['href'])
+            break
+
+    # One walk over what is not excluded finds the excluded subtrees and the date candidates;
+    # the subtrees are dropped before any text is read
+    doomed = []
+    time_node = None
+    class_nodes = []
+    root = tree.root
+    node = root
+    while node is not None:
+        tag = node.tag
+        attrs = node.attributes
+        if tag in NON_TEXT_TAGS or exclusions.matches(tag, attrs):
+            doomed.append(node)
+            # Never entered, so nothing inside an excluded subtree is looked at
+            child = None
+        else:
+            if tag == 'meta':
+                if _is_date_meta(attrs) and attrs.get('content'):
+                    page.meta_dates.append(attrs['content'])
+            elif tag == 'time' and time_node is None:
+                time_node = node
+            class_attr = attrs.get('class')
+            if class_attr and DATE_CLASSES.intersection(class_attr.split()):
+                class_nodes.append(node)
+            child = node.child
+        if child is not None:
+            node = child
+            continue
+        # Next node in document order: a sibling here or of the nearest ancestor that has one
+        while node.mem_id != root.mem_id and node.next is None:
+            node = node.parent
+        node = None if node.mem_id == root.mem_id else node.next
+    for node in doomed:
+        node.decompose()
+
+    if time_node is not None:
+        page.time_date = time_node.attributes.get('datetime') or time_node.text(separator=' ', strip=True)
+    for node in class_nodes:
+        text = node.text(separator=' ', strip=True)
+        if text:
+            page.class_dates.append(text)
+
+    if tree.root is not None:
+        page.text = tree.root.text(separator=' ', strip=True)
+    return page
+
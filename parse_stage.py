@@ -0,0 +1,81 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from date_extractor import DEFAULT_TEXT_WINDOW, extract_date
+from dedup import fingerprint_text
+from page_parser import parse_page
+
+
+class ParsedDocument:
+    """What the storage side needs from a page: a plain, picklable record."""
+
+    def __init__(self, links, canonical, title, text, date, date_strategy, fingerprint,
+                 parse_seconds=0.0, extract_seconds=0.0):
+        self.links = links
+        self.canonical = canonical
+        self.title = title
+        self.text = text
+        self.date = date
+        self.date_strategy = date_strategy
+        # dedup.fingerprint_text() result, None when duplicate detection is off
+        self.fingerprint = fingerprint
+        # Measured where the work ran, which may be a worker process
+        self.parse_seconds = parse_seconds
+        self.extract_seconds = extract_seconds
+
+
+def parse_document(page_url, html_string, options):
+    """
+    All CPU work for one page: parsing, text cleanup, date extraction and
+    the duplicate fingerprint. options holds exclusions (an ExclusionMatcher),
+    backend, date_text_window and dedup_min_words (None to skip fingerprinting).
+    """
+    start = time.perf_counter()
+    page = parse_page(html_string, page_url, backend=options['backend'], exclusions=options['exclusions'])
+    parsed = time.perf_counter()
+    post_date, strategy = extract_date(page, options.get('date_text_window', DEFAULT_TEXT_WINDOW))
+    fingerprint = None
+    if options['dedup_min_words'] is not None:
+        fingerprint = fingerprint_text(page.text, options['dedup_min_words'])
+    return ParsedDocument(page.links, page.canonical, page.title, page.text, post_date, strategy, fingerprint,
+                          parse_seconds=parsed - start, extract_seconds=time.perf_counter() - parsed)
+
+
+# Set once per worker process, so the options are not pickled with every page
+_worker_options = None
+
+
+def _init_worker(options):
+    global _worker_options
+    _worker_options = options
+
+
+def _parse_in_worker(page_url, html_string):
+    return parse_document(page_url, html_string, _worker_options)
+
+
+class ParsePool:
+    """
+    Runs parse_document in worker processes so parsing scales with CPU
+    cores instead of contending for the GIL with the fetching threads.
+
+    Workers are spawned rather than forked: the parent already runs the
+    database writer and other threads, whose locks a fork would copy.
+    """
+
+    def __init__(self, processes, options):
+        self.options = options
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(options,)
+        )
+
+    def parse(self, page_url, html_string):
+        """Blocks the calling thread (not the GIL) until a worker has parsed the page."""
+        return self._executor.submit(_parse_in_worker, page_url, html_string).result()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
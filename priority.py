@@ -0,0 +1,57 @@
+import importlib
+import math
+import re
+import time
+
+
+class UrlScorer:
+    """
+    Crawl priority of a queued URL; higher scores are fetched first.
+
+    The default score falls with link depth and rises with the sitemap
+    <priority> (0.0 - 1.0, 0.5 when absent) and with how recent the sitemap
+    <lastmod> is (halving every freshness_half_life_days). url_patterns maps
+    regexes to bonuses (negative to push matches back). A custom function,
+    given (url, depth, lastmod, priority, score), returns the final score.
+    """
+
+    def __init__(self, depth_weight=1.0, priority_weight=2.0, freshness_weight=3.0, freshness_half_life_days=7.0,
+                 url_patterns=None, function=None):
+        self.depth_weight = depth_weight
+        self.priority_weight = priority_weight
+        self.freshness_weight = freshness_weight
+        self.half_life = freshness_half_life_days * 86400
+        self.url_patterns = [(re.compile(pattern), bonus) for pattern, bonus in (url_patterns or {}).items()]
+        self.function = function
+
+    def score(self, url, depth, lastmod=None, priority=None):
+        """lastmod is a Unix timestamp, priority the sitemap value; both None for ordinary links."""
+        score = -self.depth_weight * depth
+        if priority is not None:
+            score += self.priority_weight * (priority - 0.5)
+        if lastmod is not None and self.half_life:
+            age = max(0.0, time.time() - lastmod)
+            score += self.freshness_weight * math.pow(0.5, age / self.half_life)
+        for pattern, bonus in self.url_patterns:
+            if pattern.search(url):
+                score += bonus
+        if self.function:
+            score = self.function(url, depth, lastmod, priority, score)
+        return score
+
+
+def scorer_from_config(config):
+    function = None
+    name = config.get('url_score_function')
+    if name:
+        # 'module:function', e.g. 'my_rules:score'
+        module_name, _, function_name = name.partition(':')
+        function = getattr(importlib.import_module(module_name), function_name)
+    return UrlScorer(
+        depth_weight=config.get('priority_depth_weight', 1.0),
+        priority_weight=config.get('priority_sitemap_weight', 2.0),
+        freshness_weight=config.get('priority_freshness_weight', 3.0),
+        freshness_half_life_days=config.get('priority_freshness_half_life_days', 7),
+        url_patterns=config.get('priority_url_patterns') or {},
+        function=function
+    )
@@ -0,0 +1,77 @@
+import hashlib
+import time
+from email.utils import formatdate
+
+
+UPDATE_VISIT_SQL = '''
+    UPDATE pages SET fetched_at = ?, next_visit_at = ?, change_interval = ?
+    WHERE url = ?
+'''
+
+HOUR = 3600.0
+
+
+def content_hash(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+class Revisit:
+    """What the previous visit of a URL left in the pages table."""
+
+    def __init__(self, etag, last_modified, content_hash, change_interval):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_hash = content_hash
+        self.change_interval = change_interval
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class RecrawlPolicy:
+    """
+    Adaptive revisit schedule. Each page keeps its own change_interval: it
+    halves when a visit finds new content and grows by half when the page
+    was unchanged, clamped to [min_interval, max_interval].
+    """
+
+    def __init__(self, min_hours=1, max_hours=24 * 30, initial_hours=24):
+        self.min_interval = min_hours * HOUR
+        self.max_interval = max_hours * HOUR
+        self.initial_interval = initial_hours * HOUR
+
+    def next_interval(self, previous, changed):
+        if not previous:
+            return self.initial_interval
+        if changed:
+            return max(self.min_interval, previous / 2)
+        return min(self.max_interval, previous * 1.5)
+
+    def visit_fields(self, headers, body, revisit, changed=True, now=None):
+        """Columns stored for a page fetched with new content."""
+        now = now or time.time()
+        interval = self.next_interval(revisit.change_interval if revisit else None, changed)
+        return {
+            'etag': headers.get('etag'),
+            # Fall back to our own fetch time so If-Modified-Since still works
+            'last_modified': headers.get('last-modified') or formatdate(now, usegmt=True),
+            'content_hash': content_hash(body),
+            'fetched_at': now,
+            'next_visit_at': now + interval,
+            'change_interval': interval,
+        }
+
+    def due_pages(self, conn, now=None):
+        """Yields (url, Revisit) for every stored page whose next visit is due."""
+        now = now or time.time()
+        cursor = conn.execute('''
+            SELECT url, etag, last_modified, content_hash, change_interval FROM pages
+            WHERE next_visit_at IS NULL OR next_visit_at <= ?
+        ''', (now,))
+        for url, etag, last_modified, stored_hash, change_interval in cursor:
+            yield url, Revisit(etag, last_modified, stored_hash, change_interval)
@@ -0,0 +1,266 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib import parse
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+
+# RFC 9309 asks crawlers to read at least 500 KiB of a robots.txt
+MAX_ROBOTS_BYTES = 512 * 1024
+# Decisions remembered across pages, mostly for disallowed links repeated in navigation
+DECISION_CACHE_SIZE = 100_000
+_END = None # Trie key marking the end of a rule path; real keys are single characters
+_SAFE = "/%:@!$&'()*+,;=~-._?"
+
+
+def _normalize(path):
+    # Same percent-encoding for rules and URLs, so /caf%C3%A9 and /café compare equal
+    return parse.quote(parse.unquote(path), safe=_SAFE + '*')
+
+
+class RuleMatcher:
+    """
+    One user-agent group's Allow/Disallow rules, compiled once.
+
+    Plain path prefixes go into a character trie walked once along the
+    path; rules with * or $ become regexes and are only tried when they
+    are longer than the best prefix found. As in RFC 9309 the longest
+    matching rule wins, and Allow wins a tie.
+    """
+
+    def __init__(self, rules):
+        self.trie = {}
+        self.patterns = [] # (length, allow, compiled regex)
+        for allow, path in rules:
+            if not path:
+                continue # "Disallow:" with no path allows everything
+            path = _normalize(path)
+            if '*' in path or path.endswith('$'):
+                anchored = path.endswith('$')
+                body = path[:-1] if anchored else path
+                regex = '.*'.join(re.escape(part) for part in body.split('*')) + ('$' if anchored else '')
+                self.patterns.append((len(path), allow, re.compile(regex)))
+            else:
+                node = self.trie
+                for char in path:
+                    node = node.setdefault(char, {})
+                node[_END] = node.get(_END, False) or allow
+        # Longest first, Allow before Disallow of the same length
+        self.patterns.sort(key=lambda pattern: (-pattern[0], not pattern[1]))
+
+    def allowed(self, path):
+        best_length = 0
+        best_allow = True
+        node = self.trie
+        for length, char in enumerate(path, 1):
+            node = node.get(char)
+            if node is None:
+                break
+            if _END in node:
+                best_length = length
+                best_allow = node[_END]
+        for length, allow, regex in self.patterns:
+            if length < best_length:
+                break
+            if (length > best_length or allow) and regex.match(path):
+                return allow
+        return best_allow
+
+
+class RobotsRules:
+    """A parsed robots.txt. Matchers are compiled per user-agent token on first use."""
+
+    def __init__(self, text=''):
+        # [agent tokens, [(allow, path)], crawl delay or None]
+        self.groups = []
+        self.sitemaps = []
+        self._matchers = {}
+        self._delays = {}
+        self._parse(text)
+
+    def _parse(self, text):
+        group = None
+        in_agents = False
+        for line in text.splitlines():
+            line = line.split('#', 1)[0].strip()
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            value = value.strip()
+            if name == 'user-agent':
+                # Consecutive User-agent lines share one group
+                if group is None or not in_agents:
+                    group = [[], [], None]
+                    self.groups.append(group)
+                group[0].append(value.lower())
+                in_agents = True
+                continue
+            if name == 'sitemap' and value:
+                self.sitemaps.append(value)
+                continue
+            if group is None or name not in ('allow', 'disallow', 'crawl-delay'):
+                continue
+            in_agents = False
+            if name == 'crawl-delay':
+                try:
+                    group[2] = float(value)
+                except ValueError:
+                    pass
+            else:
+                group[1].append((name == 'allow', value))
+
+    def _groups_for(self, agent):
+        # Groups naming the agent's product token, else the * groups; repeated groups are merged
+        named = [group for group in self.groups if agent in group[0]]
+        return named or [group for group in self.groups if '*' in group[0]]
+
+    def matcher(self, agent):
+        matcher = self._matchers.get(agent)
+        if matcher is None:
+            groups = self._groups_for(agent)
+            matcher = RuleMatcher([rule for group in groups for rule in group[1]])
+            self._delays[agent] = next((group[2] for group in groups if group[2] is not None), None)
+            self._matchers[agent] = matcher
+        return matcher
+
+    def crawl_delay(self, agent):
+        self.matcher(agent)
+        return self._delays[agent]
+
+
+class _HostEntry:
+
+    def __init__(self):
+        self.rules = None # RobotsRules once fetched
+        self.expires = 0.0
+        self.loaded = threading.Event()
+        self.fetching = False
+
+
+class RobotsCache:
+    """
+    robots.txt rules for every host the crawl touches, one entry per
+    lowercased netloc (port included, scheme not: http and https share the
+    rules fetched with the scheme of the first URL seen), fetched on first
+    use by a small thread pool and refetched after ttl seconds.
+
+    allowed() never blocks: for a host whose robots.txt is still being
+    fetched it returns None and the link goes into the frontier anyway.
+    wait_allowed(), called just before a page is fetched, waits for the
+    rules, so no page is ever downloaded against them. Expired rules are
+    used until their replacement arrives.
+
+    As before, a robots.txt that cannot be fetched allows everything; it is
+    retried after error_ttl seconds. A 4xx answer means there are no rules.
+
+    on_loaded(scheme, host, rules) is called once per host, on the fetching
+    thread, when its robots.txt first arrives (e.g. to read its Sitemap: lines).
+    """
+
+    def __init__(self, agent='*', request_headers=None, ttl=24 * 3600, error_ttl=600, fetch_threads=4, timeout=15,
+                 on_loaded=None):
+        self.agent = agent.lower()
+        # Callable returning the headers of a robots.txt request (user agent...)
+        self.request_headers = request_headers or dict
+        self.on_loaded = on_loaded
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.timeout = timeout
+        self.loaded = 0
+        self._entries = {}
+        self._decisions = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=fetch_threads, thread_name_prefix='Robots')
+
+    def allowed(self, url):
+        """True or False, or None while this host's rules are being fetched."""
+        decision = self._decisions.get(url)
+        if decision is not None:
+            return decision
+        parts = parse.urlsplit(url)
+        entry = self._entry(parts.scheme, parts.netloc.lower())
+        if entry.rules is None:
+            return None
+        decision = self._decide(entry.rules, parts)
+        if len(self._decisions) >= DECISION_CACHE_SIZE:
+            self._decisions.clear()
+        self._decisions[url] = decision
+        return decision
+
+    def wait_allowed(self, url, timeout=None):
+        """Like allowed(), but waits for the host's rules (allows if they take longer than timeout)."""
+        decision = self.allowed(url)
+        if decision is not None:
+            return decision
+        parts = parse.urlsplit(url)
+        entry = self._entry(parts.scheme, parts.netloc.lower())
+        entry.loaded.wait(self.timeout * 2 if timeout is None else timeout)
+        return self.allowed(url) is not False
+
+    def prefetch(self, url):
+        parts = parse.urlsplit(url)
+        self._entry(parts.scheme, parts.netloc.lower())
+
+    def crawl_delay(self, host):
+        """Crawl-delay for host (as in scheduler.host_of), None if it sets none or is not loaded yet."""
+        with self._lock:
+            entry = self._entries.get(host)
+        if entry is None or entry.rules is None:
+            return None
+        return entry.rules.crawl_delay(self.agent)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _decide(self, rules, parts):
+        path = parts.path or '/'
+        if path == '/robots.txt':
+            return True
+        if parts.query:
+            path += '?' + parts.query
+        return rules.matcher(self.agent).allowed(_normalize(path))
+
+    def _entry(self, scheme, host):
+        with self._lock:
+            entry = self._entries.get(host)
+            if entry is None:
+                entry = self._entries[host] = _HostEntry()
+            if not entry.fetching and time.time() >= entry.expires:
+                entry.fetching = True
+                self._pool.submit(self._fetch, scheme or 'http', host, entry)
+        return entry
+
+    def _fetch(self, scheme, host, entry):
+        robots_url = f"{scheme}://{host}/robots.txt"
+        ttl = self.ttl
+        try:
+            request = Request(robots_url, headers=self.request_headers())
+            with urlopen(request, timeout=self.timeout) as response:
+                text = response.read(MAX_ROBOTS_BYTES).decode('utf-8', errors='replace')
+            rules = RobotsRules(text)
+        except HTTPError as e:
+            if e.code >= 500:
+                print(f"robots.txt at {robots_url} answered {e.code}, allowing all for now")
+                ttl = self.error_ttl
+            rules = RobotsRules()
+        except Exception as e:
+            print(f"Could not load robots.txt from {robots_url}: {e}, allowing all for now")
+            rules = RobotsRules()
+            ttl = self.error_ttl
+        with self._lock:
+            first = entry.rules is None
+            if first:
+                self.loaded += 1
+            else:
+                # Decisions made under the previous rules no longer hold
+                self._decisions.clear()
+            entry.rules = rules
+            entry.expires = time.time() + ttl
+            entry.fetching = False
+        entry.loaded.set()
+        if first and self.on_loaded:
+            try:
+                self.on_loaded(scheme, host, rules)
+            except Exception as e:
+                print(f"robots.txt callback failed for {host}: {e}")
@@ -0,0 +1,247 @@
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from urllib import parse
+
+
+def host_of(url):
+    return parse.urlsplit(url).netloc.lower()
+
+
+class HostScheduler:
+    """
+    Hands out URLs only when their host may be fetched again.
+
+    URLs wait in one queue per host, highest score first (oldest first among
+    equal scores). get() hands out up to limit_for(host) URLs of a host at
+    once (one by default); a host with all its slots taken stays busy until
+    task_done(), and becomes ready again delay_for(host) seconds later.
+    Workers therefore never sleep on a delay: they get a URL from whichever
+    host is ready and only wait when no host is. retry() puts a URL handed
+    out back in its queue after a delay.
+
+    With max_in_memory set, URLs beyond that many are spilled to a SQLite
+    file at spill_path and read back, best scores first, once the in-memory
+    queues have drained to half of it.
+    """
+
+    def __init__(self, delay_for, max_in_memory=0, spill_path=None, limit_for=None):
+        self.delay_for = delay_for
+        self.limit_for = limit_for or (lambda host: 1)
+        self.max_in_memory = max_in_memory
+        self.spill_path = spill_path
+        # host -> heap of (-score, seq, url, depth)
+        self._queues = {}
+        # (ready_at, seq, host) for idle hosts that have queued URLs
+        self._ready = []
+        self._scheduled = set()
+        # host -> URLs handed out and not yet task_done()
+        self._active = {}
+        self._next_allowed = {}
+        # url -> (depth, score) of every URL handed out and not yet task_done()
+        self._in_flight = {}
+        # (due, seq, url, score, depth) of URLs waiting to be tried again
+        self._delayed = []
+        self._seq = 0
+        self._in_memory = 0
+        self._unfinished = 0
+        self._holds = 0
+        self._closed = False
+        self._spill = None
+        self._spill_buffer = []
+        self._spilled = 0
+        self._cond = threading.Condition()
+
+    def put(self, url, score=0.0, depth=0):
+        with self._cond:
+            if self._closed:
+                return
+            self._unfinished += 1
+            if self.max_in_memory and self._in_memory >= self.max_in_memory:
+                self._spill_buffer.append((-score, url, depth))
+                self._spilled += 1
+                if len(self._spill_buffer) >= 1000:
+                    self._flush_spill()
+                return
+            self._push(url, score, depth)
+            self._cond.notify()
+
+    def get(self):
+        """
+        Blocks until a URL's host is ready. Returns None once the crawl is
+        over: nothing is queued and no URL handed out is still in flight
+        (in-flight pages may still add links), or the scheduler was closed.
+        """
+        with self._cond:
+            while True:
+                url, wait = self._pop_ready()
+                if url is not None:
+                    return url
+                if self._closed or self._unfinished == 0:
+                    return None
+                self._cond.wait(wait)
+
+    def poll(self):
+        """
+        Non-blocking get() for event loops. Returns (url, None) when a host is
+        ready, otherwise (None, seconds until the next one is, or None if no
+        URL is queued at all).
+        """
+        with self._cond:
+            return self._pop_ready()
+
+    def depth(self, url):
+        """Link depth of a URL handed out by get() or poll(), until task_done()."""
+        with self._cond:
+            return self._in_flight.get(url, (0, 0.0))[0]
+
+    def retry(self, url, delay):
+        """
+        Queues a URL handed out by get() or poll() again, delay seconds from
+        now, with its score and depth. Call before its task_done().
+        """
+        with self._cond:
+            if self._closed or url not in self._in_flight:
+                return False
+            depth, score = self._in_flight[url]
+            self._unfinished += 1
+            self._seq += 1
+            heapq.heappush(self._delayed, (time.monotonic() + delay, self._seq, url, score, depth))
+            self._cond.notify()
+            return True
+
+    def task_done(self, url):
+        host = host_of(url)
+        delay = self.delay_for(host)
+        with self._cond:
+            self._in_flight.pop(url, None)
+            if self._active.get(host, 0) > 1:
+                self._active[host] -= 1
+            else:
+                self._active.pop(host, None)
+            self._next_allowed[host] = time.monotonic() + delay
+            if self._queues.get(host):
+                self._schedule(host)
+            else:
+                self._queues.pop(host, None)
+            self._unfinished -= 1
+            self._cond.notify_all()
+
+    def hold(self):
+        """
+        Counts as one unfinished URL until release(), so get() keeps waiting
+        even with nothing queued (e.g. while other partitions may send links).
+        """
+        with self._cond:
+            self._unfinished += 1
+            self._holds += 1
+
+    def release(self):
+        with self._cond:
+            self._unfinished -= 1
+            self._holds -= 1
+            self._cond.notify_all()
+
+    def close(self):
+        """Stops handing out URLs; whatever is still queued is left to the frontier files."""
+        with self._cond:
+            self._closed = True
+            if self._spill:
+                self._spill.close()
+                self._spill = None
+                os.remove(self.spill_path)
+            self._cond.notify_all()
+
+    def pending(self, exclude_holds=None):
+        """
+        URLs queued (spilled ones included) or in flight. Holds are left out,
+        all of them by default or only the first exclude_holds, so the caller
+        can leave out its own hold and still count everyone else's.
+        """
+        with self._cond:
+            if exclude_holds is None:
+                return self._unfinished - self._holds
+            return self._unfinished - min(exclude_holds, self._holds)
+
+    def done(self):
+        """True once nothing is queued, in flight or held, or after close(): get() would return None."""
+        with self._cond:
+            return self._closed or self._unfinished == 0
+
+    def _push(self, url, score, depth):
+        host = host_of(url)
+        self._seq += 1
+        heapq.heappush(self._queues.setdefault(host, []), (-score, self._seq, url, depth))
+        self._in_memory += 1
+        self._schedule(host)
+
+    def _schedule(self, host):
+        if host in self._scheduled or self._active.get(host, 0) >= self.limit_for(host):
+            return
+        ready_at = self._next_allowed.get(host, 0.0)
+        self._seq += 1
+        heapq.heappush(self._ready, (ready_at, self._seq, host))
+        self._scheduled.add(host)
+
+    def _pop_ready(self):
+        if self._closed:
+            return None, None
+        if self._spilled and self._in_memory <= self.max_in_memory // 2:
+            self._refill()
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, url, score, depth = heapq.heappop(self._delayed)
+            self._push(url, score, depth)
+        retry_wait = self._delayed[0][0] - now if self._delayed else None
+        while self._ready:
+            ready_at, _, host = self._ready[0]
+            wait = ready_at - now
+            if wait > 0:
+                return None, wait if retry_wait is None else min(wait, retry_wait)
+            heapq.heappop(self._ready)
+            # A slot that finished since this host was scheduled may have pushed it back
+            next_allowed = self._next_allowed.get(host, 0.0)
+            if next_allowed > now:
+                self._seq += 1
+                heapq.heappush(self._ready, (next_allowed, self._seq, host))
+                continue
+            self._scheduled.discard(host)
+            self._active[host] = self._active.get(host, 0) + 1
+            score, _, url, depth = heapq.heappop(self._queues[host])
+            self._in_memory -= 1
+            self._in_flight[url] = (depth, -score)
+            if self._queues[host]:
+                # Another slot of this host may be free
+                self._schedule(host)
+            return url, None
+        return None, retry_wait
+
+    def _flush_spill(self):
+        if self._spill is None:
+            # Only a cache of the queue: the frontier journal has every URL, so start empty
+            if os.path.exists(self.spill_path):
+                os.remove(self.spill_path)
+            self._spill = sqlite3.connect(self.spill_path, check_same_thread=False, isolation_level=None)
+            self._spill.execute('PRAGMA journal_mode=OFF')
+            self._spill.execute('PRAGMA synchronous=OFF')
+            self._spill.execute('CREATE TABLE spilled (id INTEGER PRIMARY KEY, rank REAL, url TEXT, depth INTEGER)')
+            self._spill.execute('CREATE INDEX spilled_rank ON spilled (rank, id)')
+        with self._spill:
+            self._spill.executemany('INSERT INTO spilled (rank, url, depth) VALUES (?, ?, ?)', self._spill_buffer)
+        self._spill_buffer = []
+
+    def _refill(self):
+        # The best spilled URLs, up to half the memory budget
+        if self._spill_buffer:
+            self._flush_spill()
+        rows = self._spill.execute(
+            'SELECT id, rank, url, depth FROM spilled ORDER BY rank, id LIMIT ?',
+            (max(1, self.max_in_memory // 2),)
+        ).fetchall()
+        with self._spill:
+            self._spill.executemany('DELETE FROM spilled WHERE id = ?', [(row[0],) for row in rows])
+        self._spilled -= len(rows)
+        for _, rank, url, depth in rows:
+            self._push(url, -rank, depth)
@@ -0,0 +1,82 @@
+import argparse
+import os
+import sys
+
+import yaml
+
+from database import connect_database
+
+
+# bm25 column weights: title, text, summary
+COLUMN_WEIGHTS = (5.0, 1.0, 2.0)
+
+SEARCH_SQL = f'''
+    SELECT p.url, p.title, p.date,
+           snippet(pages_fts, 1, '[', ']', ' ... ', 16) AS snippet,
+           bm25(pages_fts, {', '.join(str(w) for w in COLUMN_WEIGHTS)}) AS score
+    FROM pages_fts
+    JOIN pages p ON p.id = pages_fts.rowid
+    WHERE pages_fts MATCH ?
+    ORDER BY score
+    LIMIT ? OFFSET ?
+'''
+
+
+class SearchHit:
+    """One ranked match; lower scores are better, as with SQLite's bm25()."""
+
+    def __init__(self, url, title, date, snippet, score):
+        self.url = url
+        self.title = title
+        self.date = date
+        self.snippet = snippet
+        self.score = score
+
+
+def search(conn, query, limit=10, offset=0):
+    """
+    Runs an FTS5 query (words, "phrases", OR, NOT, prefix*, title:word)
+    over title, text and summary and returns SearchHits, best first.
+    """
+    return [SearchHit(*row) for row in conn.execute(SEARCH_SQL, (query, limit, offset))]
+
+
+def default_database():
+    # Same location the crawler writes to, taken from config.yml
+    with open('config.yml', 'r') as f:
+        config = yaml.safe_load(f)
+    project_name = config.get('project_name')
+    return os.path.join(project_name, config.get('database_filename') or f'{project_name}.db')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Search crawled pages by full-text index.')
+    parser.add_argument('query', help='FTS5 query, e.g. \'climate AND "sea level"\' or \'title:report\'')
+    parser.add_argument('--db', help='Database file (default: the one configured in config.yml)')
+    parser.add_argument('--limit', type=int, default=10, help='Number of hits to show')
+    args = parser.parse_args(argv)
+
+    db_file = args.db or default_database()
+    if not os.path.isfile(db_file):
+        print(f"Error: database '{db_file}' not found.")
+        return 1
+    conn = connect_database(db_file)
+    try:
+        hits = search(conn, args.query, args.limit)
+    except Exception as e:
+        print(f"Search failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+    for rank, hit in enumerate(hits, 1):
+        print(f"{rank}. {hit.title} ({hit.date})  score {-hit.score:.2f}")
+        print(f"   {hit.url}")
+        print(f"   {hit.snippet}")
+    if not hits:
+        print("No matches.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import gzip
+import io
+import sys
+import threading
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from date_extractor import parse_date_string
+
+
+# The sitemap protocol caps a file at 50 MB uncompressed and 50,000 URLs
+MAX_SITEMAP_BYTES = 50 * 2**20
+MAX_SITEMAP_URLS = 50_000
+# Sitemap index files nest at most this deep, and at most this many sitemaps are read per run
+MAX_INDEX_DEPTH = 3
+MAX_SITEMAPS = 1000
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class _LimitedReader(io.RawIOBase):
+    """File object over another one that raises once more than limit bytes were read."""
+
+    def __init__(self, raw, limit):
+        self.raw = raw
+        self.limit = limit
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        self.count += len(data)
+        if self.count > self.limit:
+            raise ValueError(f"sitemap larger than {self.limit} bytes")
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def parse_lastmod(value):
+    """W3C datetime from a sitemap (2024-05-01, 2024-05-01T10:00:00+02:00) to a Unix timestamp, or None."""
+    parsed = parse_date_string(value.strip()) if value else None
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_priority(value):
+    try:
+        return min(1.0, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+class SitemapReader:
+    """
+    Streams <url> entries out of sitemaps and sitemap indexes.
+
+    Files are parsed with iterparse while they download (gunzipped on the
+    fly for .gz files or gzip bodies), and each element is dropped once
+    read, so memory use does not grow with the size of the sitemap. Index
+    files are followed recursively; every sitemap is read once.
+    """
+
+    def __init__(self, request_headers=None, timeout=30, max_bytes=MAX_SITEMAP_BYTES, max_sitemaps=MAX_SITEMAPS):
+        self.request_headers = request_headers or dict
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_sitemaps = max_sitemaps
+        self.read = set()
+
+    def entries(self, sitemap_url, level=0):
+        """Yields (url, lastmod timestamp or None, priority or None)."""
+        if sitemap_url in self.read or len(self.read) >= self.max_sitemaps:
+            return
+        self.read.add(sitemap_url)
+        request = Request(sitemap_url, headers=self.request_headers())
+        with urlopen(request, timeout=self.timeout) as response:
+            stream = io.BufferedReader(response)
+            if sitemap_url.endswith('.gz') or stream.peek(2)[:2] == GZIP_MAGIC:
+                stream = gzip.GzipFile(fileobj=stream)
+            children = []
+            yield from self._parse(_LimitedReader(stream, self.max_bytes), children)
+        # Index entries are read after the index itself is closed, so only one download is open at a time
+        if level < MAX_INDEX_DEPTH:
+            for child in children:
+                try:
+                    yield from self.entries(child, level + 1)
+                except Exception as e:
+                    print(f"Could not read sitemap {child}: {e}", file=sys.stderr)
+
+    def _parse(self, stream, children):
+        root = None
+        fields = {}
+        urls = 0
+        for event, elem in ElementTree.iterparse(stream, events=('start', 'end')):
+            if root is None:
+                root = elem
+            if event == 'start':
+                continue
+            name = _local_name(elem.tag)
+            if name in ('loc', 'lastmod', 'priority'):
+                fields[name] = (elem.text or '').strip()
+            elif name == 'url':
+                if fields.get('loc'):
+                    yield fields['loc'], parse_lastmod(fields.get('lastmod')), parse_priority(fields.get('priority'))
+                    urls += 1
+                    if urls >= MAX_SITEMAP_URLS:
+                        return
+                fields = {}
+                root.clear()
+            elif name == 'sitemap':
+                if fields.get('loc'):
+                    children.append(fields['loc'])
+                fields = {}
+                root.clear()
+
+
+class SitemapFeeder:
+    """
+    Reads sitemaps on a background thread and hands their URLs to
+    enqueue(links, hints) in batches, hints mapping each link to its
+    (lastmod, priority). The scheduler is held while a sitemap is being
+    read, so the crawl does not end before its URLs are queued.
+    """
+
+    def __init__(self, reader, enqueue, scheduler, batch_size=500):
+        self.reader = reader
+        self.enqueue = enqueue
+        self.scheduler = scheduler
+        self.batch_size = batch_size
+        self.urls_found = 0
+        self._submitted = set()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='Sitemaps')
+
+    def submit(self, sitemap_url, quiet_missing=False):
+        """quiet_missing: a 404 is expected (a guessed /sitemap.xml) and not reported."""
+        with self._lock:
+            if sitemap_url in self._submitted or self._closed.is_set():
+                return
+            self._submitted.add(sitemap_url)
+        self.scheduler.hold()
+        self._pool.submit(self._feed, sitemap_url, quiet_missing)
+
+    def close(self):
+        self._closed.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _feed(self, sitemap_url, quiet_missing):
+        links, hints = [], {}
+        try:
+            for url, lastmod, priority in self.reader.entries(sitemap_url):
+                if self._closed.is_set():
+                    return
+                links.append(url)
+                hints[url] = (lastmod, priority)
+                if len(links) >= self.batch_size:
+                    self._flush(links, hints)
+                    links, hints = [], {}
+            self._flush(links, hints)
+        except HTTPError as e:
+            if not (quiet_missing and e.code == 404):
+                print(f"Could not read sitemap {sitemap_url}: {e}", file=sys.stderr)
+        except Exception as e:
+            print(f"Could not read sitemap {sitemap_url}: {e}", file=sys.stderr)
+        finally:
+            self.scheduler.release()
+
+    def _flush(self, links, hints):
+        if links:
+            self.urls_found += len(links)
+            self.enqueue(links, hints)
@@ -1,106 +1,33 @@
 from urllib.request import urlopen, Request
-from urllib.robotparser import RobotFileParser
-from link_finder import LinkFinder
+from urllib.error import HTTPError
+from page_parser import resolve_backend
+from parse_stage import ParsePool, parse_document
+from date_extractor import DEFAULT_TEXT_WINDOW
+from exclusions import ExclusionMatcher
 from domain import *
 from general import *
-from bs4 import BeautifulSoup
-from summerize import generate_summary
-from datetime import datetime
-import re
+from frontier import FrontierStore
+from visited import visited_factory
+from database import DatabaseWriter, connect_database
+from recrawl import RecrawlPolicy, UPDATE_VISIT_SQL, content_hash
+from dedup import DuplicateDetector, INSERT_ALIAS_SQL
+from canonical import canonicalizer_from_config
+from fetcher import ACCEPT_ENCODING, BodyTooLarge, decode_html, is_binary_url, is_html, read_body
+from summary_pipeline import SummaryPipeline, load_summarizer
+from summary_cache import SummaryCache
+from scheduler import HostScheduler, host_of
+from robots import RobotsCache
+from distributed import FrontierExchange, broker_from_config, partition_dir, partition_of
+from metrics import Metrics, MetricsReporter, start_metrics_server
+from priority import scorer_from_config
+from sitemaps import SitemapFeeder, SitemapReader
+from throttle import RETRY_STATUSES, is_transient, parse_retry_after, throttle_from_config
 import os
 import traceback
-import sqlite3
 import random
+import sys
+import threading
 import time
-import sys # For error handling in robots.txt fallback
-
-
-# --- Helper function for date parsing (no changes needed here) ---
-def parse_date_string(date_string):
-    """
-    Attempts to parse a date string into a datetime object.
-    """
-    formats = [
-        "%Y-%m-%dT%H:%M:%S%z",
-        "%Y-%m-%d",
-        "%B %d, %Y",
-        "%d %B %Y",
-        "%m/%d/%Y",
-        "%d/%m/%Y",
-        "%Y/%m/%d",
-        "%b %d, %Y",
-        "%A, %B %d, %Y",
-        "%B %d, %Y %H:%M:%S",
-        "%m/%d/%Y %H:%M:%S",
-    ]
-    for fmt in formats:
-        try:
-            if '%z' in fmt and ('+' not in date_string and '-' not in date_string[-6:]):
-                return datetime.strptime(date_string.strip(), fmt.replace('%z', ''))
-            return datetime.strptime(date_string.strip(), fmt)
-        except ValueError:
-            continue
-    return None
-
-# --- Updated Helper Functions for Database Operations ---
-# Now takes database_filename from config
-def create_database_table(project_name, database_filename):
-    db_file_path = os.path.join(project_name, database_filename)
-    conn = None
-    try:
-        conn = sqlite3.connect(db_file_path)
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS pages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                url TEXT UNIQUE,
-                title TEXT,
-                text TEXT,
-                date TEXT,
-                date_strategy TEXT,
-                summary TEXT
-            )
-        ''')
-        conn.commit()
-    except sqlite3.Error as e:
-        print(f"Database error during table creation: {e}")
-        traceback.print_exc()
-    finally:
-        if conn:
-            conn.close()
-
-# Now takes database_filename and summary_mode_enabled from config
-def insert_page_data(project_name, database_filename, data, summary_mode_enabled):
-    db_file_path = os.path.join(project_name, database_filename)
-    conn = None
-    try:
-        conn = sqlite3.connect(db_file_path)
-        c = conn.cursor()
-
-        # Handle 'None' for summary if summary_mode_enabled is False
-        summary_data = data.get('summary') if summary_mode_enabled else None
-
-        c.execute('''
-            INSERT OR IGNORE INTO pages (url, title, text, date, date_strategy, summary)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            data['url'],
-            data['title'],
-            data['text'],
-            data['date'],
-            data['date_strategy'],
-            summary_data
-        ))
-        conn.commit()
-    except sqlite3.Error as e:
-        if "UNIQUE constraint failed: pages.url" in str(e):
-            pass
-        else:
-            print(f"Database error during data insertion for {data['url']}: {e}")
-            traceback.print_exc()
-    finally:
-        if conn:
-            conn.close()
 
 
 class Spider:
@@ -108,191 +35,529 @@ class Spider:
     project_name = ''
     base_url = ''
     domain_name = ''
+    domains = set() # Registrable domains of the homepage and seed_urls; links elsewhere are ignored
+    seed_urls = []
     queue_file = ''
     crawled_file = ''
-    queue = set()
     crawled = set()
     db_file = ''
-    robot_parser = None
+    db_writer = None
+    summary_pipeline = None
+    frontier = None
+    scheduler = None
+    parser_backend = 'html.parser'
+    recrawl_policy = None
+    dedup = None
+    canonicalizer = None
+    parse_pool = None # ParsePool when parse_processes > 0, otherwise pages are parsed in the fetching thread
+    parse_options = {}
+    revisits = {} # url -> recrawl.Revisit for stored pages due for a conditional refetch
+    revisit_lock = threading.Lock()
+    robots = None # robots.RobotsCache
+    metrics = None
+    metrics_reporter = None
+    metrics_server = None
+    partition_index = 0
+    partition_count = 1 # More than 1: distributed mode, this process only crawls the hosts of its partition
+    exchange = None # distributed.FrontierExchange in distributed mode
+    log_pages = False # Per-page progress lines and tracebacks, only with log_level: debug
+    summarizer = None # Module or object with the summerizer.py functions; the summarizer_backend when None
+    scorer = None # priority.UrlScorer ranking queued URLs
+    sitemaps = None # sitemaps.SitemapFeeder when use_sitemaps is on
+    max_pages = 0 # Pages fetched before this run stops; 0 = no limit
+    pages_fetched = 0
+    budget_lock = threading.Lock()
+    throttle = None # throttle.HostThrottle: per-host concurrency and backoff from how each server answers
+    retries = {} # url -> failed attempts of URLs queued again after a transient error
+    retry_lock = threading.Lock()
     config = {} # This will store the loaded config dictionary
 
     def __init__(self, project_name, base_url, domain_name, config):
+        Spider.partition_count = config.get('partition_count', 1)
+        Spider.partition_index = config.get('partition_index', 0)
+        if Spider.partition_count > 1:
+            # Frontier files and database of this partition only, merged by distributed.py
+            project_name = partition_dir(project_name, Spider.partition_index)
         Spider.project_name = project_name
         Spider.base_url = base_url
         Spider.domain_name = domain_name
+        Spider.seed_urls = list(config.get('seed_urls') or [])
         Spider.queue_file = Spider.project_name + '/queue.txt'
         Spider.crawled_file = Spider.project_name + '/crawled.txt'
         # Get database_filename from config, with a fallback
-        Spider.db_file = os.path.join(Spider.project_name, config.get('database_filename', f'{project_name}.db'))
+        Spider.db_file = os.path.join(Spider.project_name, config.get('database_filename') or f'{project_name}.db')
         Spider.config = config # Store the entire config dictionary
+        Spider.canonicalizer = canonicalizer_from_config(config)
+        if Spider.canonicalizer:
+            Spider.base_url = Spider.canonicalizer.canonicalize(base_url)
+            Spider.seed_urls = [Spider.canonicalizer.canonicalize(url) for url in Spider.seed_urls]
+        # Subdomains (blog.example.com) belong to their domain and get their own robots.txt
+        Spider.domains = {domain_name} | {get_domain_name(url) for url in Spider.seed_urls}
         self.boot()
-        self.crawl_page('First spider', Spider.base_url)
 
     @staticmethod
     def boot():
         create_project_dir(Spider.project_name)
-        create_data_files(Spider.project_name, Spider.base_url)
-        # Pass database_filename from config to the helper function
-        create_database_table(Spider.project_name, Spider.config.get('database_filename', f'{Spider.project_name}.db'))
-
-        Spider.robot_parser = RobotFileParser()
-        robots_url = get_domain_name(Spider.base_url) + '/robots.txt'
+        # Only the partition owning the homepage's host starts from it
+        create_data_files(Spider.project_name, Spider.base_url if Spider.owns(Spider.base_url) else '')
+        Spider.metrics = Metrics()
+        Spider.log_pages = str(Spider.config.get('log_level', 'info')).lower() == 'debug'
+        # A single writer thread owns the database connection, workers only enqueue rows
+        Spider.db_writer = DatabaseWriter(
+            Spider.db_file,
+            batch_size=Spider.config.get('db_batch_size', 500),
+            flush_interval=Spider.config.get('db_flush_seconds', 1.0),
+            compress_text=Spider.config.get('compress_text', False),
+            full_text_index=Spider.config.get('full_text_index', True),
+            metrics=Spider.metrics
+        )
+        Spider.db_writer.start()
+        if Spider.config.get('dedup', True):
+            Spider.start_dedup()
+        if Spider.config.get('summary_mode', False):
+            Spider.start_summary_pipeline()
+        # lxml or selectolax when installed, the standard library otherwise
+        Spider.parser_backend = resolve_backend(Spider.config.get('parser_backend', 'auto'))
+        Spider.parse_options = {
+            # Compiled once here instead of on every page
+            'exclusions': ExclusionMatcher(
+                Spider.config.get('exclude_tags') or [],
+                Spider.config.get('exclude_classes') or [],
+                Spider.config.get('exclude_selectors') or []
+            ),
+            'backend': Spider.parser_backend,
+            'dedup_min_words': Spider.dedup.min_words if Spider.dedup else None,
+            'date_text_window': Spider.config.get('date_text_window', DEFAULT_TEXT_WINDOW),
+        }
+        if Spider.config.get('parse_processes', 0):
+            Spider.parse_pool = ParsePool(Spider.config['parse_processes'], Spider.parse_options)
+
+        Spider.scorer = scorer_from_config(Spider.config)
+        Spider.max_pages = Spider.config.get('max_pages', 0)
+        if Spider.max_pages and Spider.partition_count > 1:
+            Spider.max_pages = max(1, Spider.max_pages // Spider.partition_count)
+        Spider.pages_fetched = 0
+        Spider.throttle = throttle_from_config(Spider.config)
+        Spider.retries = {}
+
+        # Replay the frontier journal on top of the queue/crawled snapshots
+        Spider.frontier = FrontierStore(
+            Spider.project_name,
+            compact_every=Spider.config.get('frontier_compact_every', 1000),
+            fsync=Spider.config.get('frontier_fsync', False),
+            visited_factory=visited_factory(Spider.config)
+        )
+        Spider.crawled = Spider.frontier.load()
+        # Workers take URLs from here, best score first per host; it decides when each host may be fetched again
+        Spider.scheduler = HostScheduler(
+            Spider.crawl_delay,
+            max_in_memory=Spider.config.get('frontier_memory_urls', 0),
+            spill_path=os.path.join(Spider.project_name, 'frontier_spill.db'),
+            limit_for=Spider.host_concurrency
+        )
+        for url, depth, score in Spider.frontier.pending():
+            Spider.scheduler.put(url, score, depth)
+
+        Spider.recrawl_policy = RecrawlPolicy(
+            min_hours=Spider.config.get('recrawl_min_interval_hours', 1),
+            max_hours=Spider.config.get('recrawl_max_interval_hours', 24 * 30),
+            initial_hours=Spider.config.get('recrawl_initial_interval_hours', 24)
+        )
+        if Spider.config.get('recrawl_mode', False):
+            Spider.schedule_revisits()
+        if Spider.partition_count > 1:
+            Spider.start_exchange()
+        # After the exchange, so URLs from sitemaps on other partitions' hosts are forwarded
+        if Spider.config.get('use_sitemaps', True):
+            Spider.sitemaps = SitemapFeeder(
+                SitemapReader(request_headers=Spider.robots_request_headers),
+                Spider.enqueue_sitemap_links,
+                Spider.scheduler
+            )
+        # Each host's robots.txt is fetched in the background the first time one of its links shows up
+        Spider.robots = RobotsCache(
+            agent=Spider.config.get('robots_user_agent', '*'),
+            request_headers=Spider.robots_request_headers,
+            ttl=Spider.config.get('robots_ttl_hours', 24) * 3600,
+            fetch_threads=Spider.config.get('robots_fetch_threads', 4),
+            on_loaded=Spider.robots_loaded
+        )
+        for url in [Spider.base_url] + Spider.seed_urls:
+            Spider.robots.prefetch(url)
+        # Extra starting points; the ones already queued or crawled are skipped
+        Spider.add_links_to_queue(Spider.seed_urls)
+        if Spider.sitemaps:
+            for url in Spider.config.get('sitemap_urls') or []:
+                Spider.sitemaps.submit(url)
+        Spider.start_metrics()
 
-        # Infer scheme from base_url or default to http
-        if not (robots_url.startswith('http://') or robots_url.startswith('https://')):
-            if Spider.base_url.startswith('https://'):
-                robots_url = "https://" + get_domain_name(Spider.base_url) + '/robots.txt'
-            else:
-                robots_url = "http://" + get_domain_name(Spider.base_url) + '/robots.txt'
+    @staticmethod
+    def start_dedup():
+        Spider.dedup = DuplicateDetector(
+            max_distance=Spider.config.get('dedup_max_distance', 3),
+            min_words=Spider.config.get('dedup_min_words', 20)
+        )
+        conn = connect_database(Spider.db_file)
+        try:
+            Spider.dedup.load(conn)
+        finally:
+            conn.close()
 
-        Spider.robot_parser.set_url(robots_url)
+    @staticmethod
+    def schedule_revisits():
+        # Stored pages whose next visit is due are fetched again with conditional headers
+        conn = connect_database(Spider.db_file)
         try:
-            # Use USER_AGENTS from config for robots.txt request
-            user_agents_list = Spider.config.get('user_agents', [])
-            if not user_agents_list: # Fallback if user_agents are not defined in config
-                print("Warning: 'user_agents' not found in config.yml. Using a default user-agent for robots.txt.")
-                user_agents_list = ["Mozilla/5.0 (compatible; MyCrawler/1.0)"]
-
-            req = Request(robots_url, headers={'User-Agent': random.choice(user_agents_list)})
-            response = urlopen(req)
-            Spider.robot_parser.parse(response.read().decode("utf-8").splitlines())
-            print(f"Successfully loaded robots.txt from: {robots_url}")
-        except Exception as e:
-            print(f"Could not load or parse robots.txt from {robots_url}: {e}", file=sys.stderr) # Print to stderr
-            # If robots.txt fails, the parser will assume everything is allowed by default.
-            # You might want to log this heavily or stop if strict adherence is required.
-            Spider.robot_parser = None # Indicate that parser failed to load
+            for url, revisit in Spider.recrawl_policy.due_pages(conn):
+                with Spider.revisit_lock:
+                    Spider.revisits[url] = revisit
+                Spider.scheduler.put(url)
+        finally:
+            conn.close()
+        print(f"Recrawl mode: {len(Spider.revisits)} stored pages are due for a revisit.")
 
+    @staticmethod
+    def start_exchange():
+        Spider.exchange = FrontierExchange(
+            broker_from_config(Spider.config),
+            Spider.partition_index,
+            Spider.partition_count,
+            Spider.scheduler,
+            Spider.enqueue_owned,
+            poll_interval=Spider.config.get('broker_poll_seconds', 0.5)
+        )
+        Spider.exchange.start()
+        print(f"Distributed mode: partition {Spider.partition_index + 1} of {Spider.partition_count}")
+
+    # True if url's host belongs to this process (always, outside distributed mode)
+    @staticmethod
+    def owns(url):
+        return Spider.partition_count <= 1 or partition_of(url, Spider.partition_count) == Spider.partition_index
 
-        Spider.queue = file_to_set(Spider.queue_file)
-        Spider.crawled = file_to_set(Spider.crawled_file)
+    # (url, depth, score) entries forwarded by other partitions: already filtered and scored by the sender
+    @staticmethod
+    def enqueue_owned(entries):
+        for url, depth, score in Spider.frontier.add_links(entries):
+            Spider.scheduler.put(url, score, depth)
+
+    # A host of the crawl got its robots.txt: read the sitemaps it lists, or /sitemap.xml if none
+    @staticmethod
+    def robots_loaded(scheme, host, rules):
+        url = f"{scheme}://{host}/"
+        if not Spider.sitemaps or get_domain_name(url) not in Spider.domains or not Spider.owns(url):
+            return
+        for sitemap_url in rules.sitemaps:
+            Spider.sitemaps.submit(sitemap_url)
+        if not rules.sitemaps:
+            Spider.sitemaps.submit(url + 'sitemap.xml', quiet_missing=True)
+
+    # Sitemap pages count as one link away from the homepage, ranked by their lastmod/priority
+    @staticmethod
+    def enqueue_sitemap_links(links, hints):
+        Spider.add_links_to_queue(links, depth=1, hints=hints)
+
+    @staticmethod
+    def start_metrics():
+        interval = Spider.config.get('metrics_interval_seconds', 30)
+        if interval:
+            Spider.metrics_reporter = MetricsReporter(Spider.metrics, interval, Spider.metric_gauges)
+            Spider.metrics_reporter.start()
+        port = Spider.config.get('metrics_port', 0)
+        if port:
+            try:
+                Spider.metrics_server = start_metrics_server(Spider.metrics, port, gauges=Spider.metric_gauges)
+                print(f"Prometheus metrics at http://127.0.0.1:{port}/metrics")
+            except OSError as e:
+                print(f"Could not start the metrics endpoint on port {port}: {e}", file=sys.stderr)
+
+    # Point-in-time values for the summary line and the metrics endpoint
+    @staticmethod
+    def metric_gauges():
+        gauges = {
+            'frontier_pending': Spider.scheduler.pending(),
+            'crawled': len(Spider.crawled),
+            'db_rows_written': Spider.db_writer.rows_written,
+            'db_pages_written': Spider.db_writer.pages_written,
+            'db_rows_lost': Spider.db_writer.rows_lost,
+            'robots_hosts': Spider.robots.loaded,
+            'retries_waiting': len(Spider.retries),
+            'host_concurrency_avg': round(Spider.throttle.stats()[1], 2),
+        }
+        if Spider.sitemaps:
+            gauges['sitemap_urls'] = Spider.sitemaps.urls_found
+        if Spider.summary_pipeline:
+            gauges['summaries_done'] = Spider.summary_pipeline.summarized
+        return gauges
 
     @staticmethod
     def crawl_page(thread_name, page_url):
-        if page_url not in Spider.crawled:
-            print(thread_name + ' now crawling ' + page_url)
-            print('Queue ' + str(len(Spider.queue)) + ' | Crawled  ' + str(len(Spider.crawled)))
-            Spider.add_links_to_queue(Spider.gather_links(page_url))
-            Spider.queue.remove(page_url)
-            Spider.crawled.add(page_url)
-            Spider.update_files()
+        if page_url not in Spider.crawled or page_url in Spider.revisits:
+            if not Spider.robots.wait_allowed(page_url):
+                Spider.robots_skip(page_url)
+                return
+            if not Spider.take_budget():
+                return
+            if Spider.log_pages:
+                print(thread_name + ' now crawling ' + page_url)
+                print('Queue ' + str(Spider.frontier.queued) + ' | Crawled  ' + str(len(Spider.crawled)))
+            links = Spider.gather_links(page_url)
+            if links is None:
+                # Queued again after a transient error; not crawled yet
+                return
+            Spider.add_links_to_queue(links, Spider.scheduler.depth(page_url) + 1)
+            Spider.frontier.mark_crawled(page_url)
+
+    # Counts one fetch against max_pages; False once the budget is spent (the URL stays queued for the next run)
+    @staticmethod
+    def take_budget():
+        if not Spider.max_pages:
+            return True
+        with Spider.budget_lock:
+            if Spider.pages_fetched >= Spider.max_pages:
+                return False
+            Spider.pages_fetched += 1
+            if Spider.pages_fetched < Spider.max_pages:
+                return True
+        print(f"Page budget of {Spider.max_pages} reached, finishing the pages in flight.")
+        Spider.scheduler.close()
+        return True
+
+    # A queued URL that turned out to be disallowed once its host's robots.txt arrived
+    @staticmethod
+    def robots_skip(page_url):
+        Spider.metrics.incr('robots_denied')
+        with Spider.revisit_lock:
+            Spider.revisits.pop(page_url, None)
+        Spider.frontier.mark_crawled(page_url)
 
     @staticmethod
-    def gather_links(page_url):
-        html_string = ''
-        try:
+    def start_summary_pipeline():
+        summerizer = Spider.summarizer
+        if summerizer is None:
+            # Imported here so runs without summary_mode (or with a local backend) never load the Gemini client
+            summerizer = load_summarizer(Spider.config.get('summarizer_backend') or 'gemini')
+        summerizer.setup_summarizer(Spider.config)
+        calls_per_minute, calls_per_day = summerizer.get_rate_limits()
+        if Spider.partition_count > 1:
+            # Every partition summarizes, so each gets its share of the API limits
+            calls_per_minute = calls_per_minute / Spider.partition_count
+            if calls_per_day:
+                calls_per_day = max(1, calls_per_day // Spider.partition_count)
+        cache = None
+        if Spider.config.get('summary_cache', True):
+            # Identical text summarized by the same model is served from the database
+            cache = SummaryCache(
+                Spider.db_file,
+                summerizer.get_model_name(),
+                max_bytes=int(Spider.config.get('summary_cache_max_mb', 256) * 2**20)
+            )
+        Spider.summary_pipeline = SummaryPipeline(
+            Spider.db_file,
+            Spider.db_writer,
+            summerizer.generate_summary,
+            calls_per_minute=calls_per_minute,
+            calls_per_day=calls_per_day,
+            workers=Spider.config.get('summary_workers', 2),
+            cache=cache,
+            metrics=Spider.metrics
+        )
+        Spider.summary_pipeline.start()
+
+    @staticmethod
+    def crawl_delay(host):
+        # The host's robots.txt Crawl-delay wins over the random delay from config
+        delay = Spider.robots.crawl_delay(host)
+        if delay is None:
             # Get min/max delay from config
             min_delay = Spider.config.get('min_delay_seconds', 1)
             max_delay = Spider.config.get('max_delay_seconds', 3)
-            time.sleep(random.uniform(min_delay, max_delay))
-
-            # Get USER_AGENTS list from config
-            user_agents_list = Spider.config.get('user_agents', [])
-            if not user_agents_list: # Fallback if user_agents are not defined in config
-                print("Warning: 'user_agents' not found in config.yml for requests. Using a default.")
-                user_agents_list = ["Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"] # Default fallback
-
-            headers = {
-                'User-Agent': random.choice(user_agents_list), # Use agent from config
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Cache-Control': 'max-age=0',
-            }
+            delay = random.uniform(min_delay, max_delay)
+        # A host that answered 429/503 or failed waits out its backoff (or Retry-After)
+        return max(delay, Spider.throttle.paused(host))
 
-            req = Request(page_url, headers=headers)
-            response = urlopen(req)
+    # Requests a host may have in flight: one under a robots.txt Crawl-delay, else what its answers allow
+    @staticmethod
+    def host_concurrency(host):
+        # Robots is set up after the scheduler is filled from the frontier
+        if Spider.robots and Spider.robots.crawl_delay(host) is not None:
+            return 1
+        return Spider.throttle.limit(host)
+
+    # A fetch answered (status set) or failed on the network (status None). True if the
+    # URL was queued again for a later try, False if the failure is final.
+    @staticmethod
+    def fetch_failed(page_url, seconds, status=None, retry_after=None):
+        retry_after = parse_retry_after(retry_after)
+        Spider.throttle.record(host_of(page_url), seconds, status, retry_after)
+        with Spider.retry_lock:
+            attempt = Spider.retries.get(page_url, 0)
+            if (status is not None and status not in RETRY_STATUSES) or attempt >= Spider.throttle.max_retries:
+                Spider.retries.pop(page_url, None)
+                return False
+            Spider.retries[page_url] = attempt + 1
+        if not Spider.scheduler.retry(page_url, Spider.throttle.retry_delay(attempt, retry_after)):
+            # The crawl is stopping; the URL stays queued in the frontier for the next run
+            return True
+        Spider.metrics.incr('retries')
+        return True
+
+    @staticmethod
+    def fetch_succeeded(page_url, seconds, status):
+        Spider.throttle.record(host_of(page_url), seconds, status)
+        if Spider.retries:
+            with Spider.retry_lock:
+                Spider.retries.pop(page_url, None)
 
-            if 'text/html' in response.getheader('Content-Type'):
-                html_bytes = response.read()
-                html_string = html_bytes.decode("utf-8")
-            finder = LinkFinder(Spider.base_url, page_url)
-            finder.feed(html_string)
-            Spider.extract_and_store_data(page_url, html_string)
+    @staticmethod
+    def robots_request_headers():
+        # No Accept-Encoding: robots.txt is read as is
+        return {'User-Agent': Spider.request_headers()['User-Agent']}
 
+    @staticmethod
+    def request_headers():
+        # Get USER_AGENTS list from config
+        user_agents_list = Spider.config.get('user_agents', [])
+        if not user_agents_list: # Fallback if user_agents are not defined in config
+            print("Warning: 'user_agents' not found in config.yml for requests. Using a default.")
+            user_agents_list = ["Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"] # Default fallback
+
+        return {
+            'User-Agent': random.choice(user_agents_list), # Use agent from config
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Accept-Encoding': ACCEPT_ENCODING, # Decoded by fetcher.BodyReader
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1',
+            'Cache-Control': 'max-age=0',
+        }
+
+    # If-None-Match / If-Modified-Since for pages being revisited
+    @staticmethod
+    def conditional_headers(page_url):
+        revisit = Spider.revisits.get(page_url)
+        return revisit.conditional_headers() if revisit else {}
+
+    # Links found on the page, or None if it failed transiently and was queued to be tried again
+    @staticmethod
+    def gather_links(page_url):
+        started = time.perf_counter()
+        try:
+            # Politeness delays are enforced by Spider.scheduler before the URL is handed out
+            headers = Spider.request_headers()
+            headers.update(Spider.conditional_headers(page_url))
+            with Spider.metrics.timer('fetch'):
+                status, response_headers, html_bytes = Spider.fetch(page_url, headers)
+            Spider.fetch_succeeded(page_url, time.perf_counter() - started, status)
+            return Spider.handle_response(page_url, status, response_headers, html_bytes)
+
+        except BodyTooLarge as e:
+            Spider.metrics.incr('too_large')
+            print(f"Skipping {page_url}: {e}")
+            return set()
+        except HTTPError as e:
+            retry_after = e.headers.get('Retry-After') if e.headers else None
+            if Spider.fetch_failed(page_url, time.perf_counter() - started, e.code, retry_after):
+                return None
+            print(f"Error gathering links from {page_url}: {str(e)}")
+            return set()
         except Exception as e:
+            Spider.metrics.incr('fetch_errors')
+            if is_transient(e) and Spider.fetch_failed(page_url, time.perf_counter() - started):
+                return None
             print(f"Error gathering links from {page_url}: {str(e)}")
-            traceback.print_exc()
+            if Spider.log_pages:
+                traceback.print_exc()
+            return set()
+
+    # Thread engine download: (status, lowercase headers, body or None for a response that is not HTML)
+    @staticmethod
+    def fetch(page_url, headers):
+        try:
+            response = urlopen(Request(page_url, headers=headers),
+                               timeout=Spider.config.get('request_timeout_seconds', 30))
+        except HTTPError as e:
+            Spider.metrics.count_status(e.code)
+            if e.code != 304:
+                raise
+            return 304, {}, b''
+
+        Spider.metrics.count_status(response.status)
+        response_headers = {name.lower(): value for name, value in response.getheaders()}
+        with response:
+            # Anything but HTML is dropped after the headers, before its body is downloaded
+            if not is_html(response_headers.get('content-type')):
+                return response.status, response_headers, None
+            return response.status, response_headers, read_body(response, Spider.max_page_bytes())
+
+    @staticmethod
+    def max_page_bytes():
+        return int(Spider.config.get('max_page_size_mb', 10) * 2**20) or None
+
+    # Shared by every fetch engine once the response is in memory; headers use lowercase names,
+    # body is the decompressed body or None for a response that was not HTML
+    @staticmethod
+    def handle_response(page_url, status, headers, body):
+        with Spider.revisit_lock:
+            revisit = Spider.revisits.pop(page_url, None)
+        if body is None:
+            Spider.metrics.incr('non_html_skipped')
             return set()
-        return finder.page_links()
+        Spider.metrics.incr('bytes_received', len(body))
+
+        # Not modified: skip parsing, extraction and summarization, just push the next visit out
+        if revisit and (status == 304 or content_hash(body) == revisit.content_hash):
+            Spider.metrics.incr('not_modified')
+            now = time.time()
+            interval = Spider.recrawl_policy.next_interval(revisit.change_interval, changed=False)
+            Spider.db_writer.execute(UPDATE_VISIT_SQL, (now, now + interval, interval, page_url))
+            return set()
+
+        visit = Spider.recrawl_policy.visit_fields(headers, body, revisit)
+        with Spider.metrics.timer('decode'):
+            html_string = decode_html(body, headers.get('content-type')) if body else ''
+        return Spider.process_page(page_url, html_string, visit)
 
     @staticmethod
-    def extract_and_store_data(page_url, html_string):
+    def process_page(page_url, html_string, visit=None):
+        # Parsing, date extraction and fingerprinting happen in one go, in a worker process if configured
+        if Spider.parse_pool:
+            doc = Spider.parse_pool.parse(page_url, html_string)
+        else:
+            doc = parse_document(page_url, html_string, Spider.parse_options)
+        Spider.metrics.observe('parse', doc.parse_seconds)
+        Spider.metrics.observe('extract', doc.extract_seconds)
+        store_url = Spider.declared_canonical(page_url, doc)
+        if store_url is None:
+            return doc.links
+        Spider.store_document(store_url, doc, visit)
+        return doc.links
+
+    # Honors <link rel="canonical">: the page is stored under the URL it declares,
+    # which is marked crawled so it is not fetched again. None if it is already stored.
+    @staticmethod
+    def declared_canonical(page_url, doc):
+        if not Spider.canonicalizer or not doc.canonical or not Spider.config.get('canonical_respect_link_rel', True):
+            return page_url
+        declared = Spider.canonicalizer.canonicalize(doc.canonical)
+        if declared == page_url or get_domain_name(declared) not in Spider.domains:
+            return page_url
+        Spider.db_writer.execute(INSERT_ALIAS_SQL, (page_url, declared, 'canonical', None, time.time()))
+        if not Spider.frontier.mark_crawled(declared):
+            return None
+        return declared
+
+    @staticmethod
+    def store_document(page_url, doc, visit=None):
         try:
-            soup = BeautifulSoup(html_string, 'html.parser')
-
-            # Get EXCLUDE_TAGS from config
-            exclude_tags = Spider.config.get('exclude_tags', [])
-            for tag in exclude_tags:
-                for element in soup.find_all(tag):
-                    element.decompose()
-
-            # Get EXCLUDE_CLASSES from config
-            exclude_classes = Spider.config.get('exclude_classes', [])
-            for class_name in exclude_classes:
-                # Use lambda for class_ attribute to handle multiple classes
-                for element in soup.find_all(class_=lambda x: x and class_name in x.split()):
-                    element.decompose()
-
-            title = soup.title.string if soup.title else 'No Title'
-            text = soup.get_text(separator=' ', strip=True)
-
-            post_date = None
-            strategy = "No Strategy"
-
-            # --- Date Extraction Logic (remains unchanged) ---
-            time_tag = soup.find('time')
-            if time_tag:
-                date_str = time_tag.get('datetime')
-                if date_str:
-                    post_date = date_str
-                else:
-                    post_date = time_tag.get_text(strip=True)
-                strategy = 1
-
-            if not post_date:
-                date_elements = soup.find_all(class_=['date', 'post-date', 'published', 'entry-date', 'article-date'])
-                for elem in date_elements:
-                    found_date_text = elem.get_text(strip=True)
-                    parsed_dt = parse_date_string(found_date_text)
-                    if parsed_dt:
-                        post_date = parsed_dt.isoformat()
-                        strategy = 2
-                        break
-
-            if not post_date:
-                meta_date_tags = soup.find_all('meta', attrs={
-                    'property': ['article:published_time', 'og:pubdate'],
-                    'name': ['date', 'pubdate', 'DC.date.issued', 'last_updated']
-                })
-                for tag in meta_date_tags:
-                    date_str = tag.get('content')
-                    if date_str:
-                        parsed_dt = parse_date_string(date_str)
-                        if parsed_dt:
-                            post_date = parsed_dt.isoformat()
-                            strategy = 3
-                            break
-
-            if not post_date:
-                date_patterns = [
-                    r'\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{1,2},\s+\d{4}\b',
-                    r'\b\d{1,2}/\d{1,2}/\d{2,4}\b',
-                    r'\b\d{4}-\d{2}-\d{2}\b',
-                    r'\b\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4}\b',
-                    r'\b(?:Published|Posted|Last updated):\s*(\d{1,2}/\d{1,2}/\d{2,4}|\d{4}-\d{2}-\d{2}|(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{1,2},\s+\d{4})\b'
-                ]
-                for pattern in date_patterns:
-                    match = re.search(pattern, text, re.IGNORECASE)
-                    if match:
-                        found_date_text = match.group(1) if len(match.groups()) > 0 else match.group(0)
-                        parsed_dt = parse_date_string(found_date_text)
-                        if parsed_dt:
-                            post_date = parsed_dt.isoformat()
-                            strategy = 4
-                            break
-            # --- End Date Extraction Logic ---
+            # Mirrors and near-copies are recorded as aliases instead of being stored and summarized again
+            dedup_fields = {}
+            if Spider.dedup:
+                alias, dedup_fields = Spider.dedup.check(page_url, doc.fingerprint)
+                if alias:
+                    canonical_url, kind, distance = alias
+                    Spider.db_writer.execute(INSERT_ALIAS_SQL, (page_url, canonical_url, kind, distance, time.time()))
+                    Spider.metrics.incr('dedup_hits')
+                    return None
 
             # Prepare data for SQL insertion
             # Get Summery_Mode (summary_mode) from config
@@ -300,46 +565,116 @@ class Spider:
 
             data_to_store = {
                 "url": page_url,
-                "title": title,
-                "text": text,
-                "date": post_date if post_date else "NO Date",
-                "date_strategy": str(strategy),
-                "summary": generate_summary(text) if summary_mode_enabled else None
+                "title": doc.title if doc.title is not None else 'No Title',
+                "text": doc.text,
+                "date": doc.date if doc.date else "NO Date",
+                "date_strategy": str(doc.date_strategy),
+                "summary": None,
+                # Summaries are filled in later by Spider.summary_pipeline
+                "summary_status": 'pending' if summary_mode_enabled else None
             }
+            # ETag, Last-Modified, content hash and revisit schedule for incremental recrawls
+            data_to_store.update(visit or {})
+            data_to_store.update(dedup_fields)
 
-            # Pass database_filename and summary_mode_enabled to insert_page_data
-            insert_page_data(
-                Spider.project_name,
-                Spider.config.get('database_filename', f'{Spider.project_name}.db'),
-                data_to_store,
-                summary_mode_enabled
-            )
+            # Queued for the writer thread, committed with the next batch
+            Spider.db_writer.insert_page(data_to_store)
+            Spider.metrics.incr('pages_stored')
+            if summary_mode_enabled:
+                Spider.summary_pipeline.submit(page_url, doc.text)
 
         except Exception as e:
             print(f"Error extracting or storing data from {page_url}: {str(e)}")
             traceback.print_exc()
             return None
 
+    # depth: link depth of the new URLs; hints: {url: (lastmod, priority)} for URLs from a sitemap
     @staticmethod
-    def add_links_to_queue(links):
+    def add_links_to_queue(links, depth=0, hints=None):
+        new_links = []
+        # Canonical URL -> spellings it was linked under, for the fetches-saved count
+        variants = {}
+        # Canonical URLs already turned down by the checks below
+        rejected = set()
         for url in links:
-            if (url in Spider.queue) or (url in Spider.crawled):
-                continue
-            if Spider.domain_name != get_domain_name(url):
-                continue
-
-            if Spider.robot_parser:
-                # Get USER_AGENTS from config for robots.txt can_fetch check
-                user_agents_list = Spider.config.get('user_agents', [])
-                if not user_agents_list: # Fallback if user_agents are not defined in config
-                    user_agents_list = ["Mozilla/5.0 (compatible; MyCrawler/1.0)"] # Default fallback
-
-                if not Spider.robot_parser.can_fetch(random.choice(user_agents_list), url):
+            raw_url = url
+            if Spider.canonicalizer:
+                url = Spider.canonicalizer.canonicalize(raw_url)
+                if url in variants:
+                    variants[url].append(raw_url)
                     continue
-
-            Spider.queue.add(url)
+                if url in rejected:
+                    continue
+            if not Spider.should_queue(url):
+                rejected.add(url)
+                continue
+            if Spider.canonicalizer:
+                variants[url] = [raw_url]
+
+            lastmod, priority = hints.get(raw_url, (None, None)) if hints else (None, None)
+            new_links.append((url, depth, Spider.scorer.score(url, depth, lastmod, priority)))
+        if Spider.exchange:
+            # Hosts of other partitions are crawled, and kept polite, by their owner
+            Spider.exchange.forward([entry for entry in new_links if not Spider.owns(entry[0])])
+            new_links = [entry for entry in new_links if Spider.owns(entry[0])]
+        # Appends the new links to the frontier journal and hands them straight to the workers
+        added = []
+        for url, depth, score in Spider.frontier.add_links(new_links):
+            Spider.scheduler.put(url, score, depth)
+            added.append(url)
+        if Spider.canonicalizer:
+            # Only URLs that will actually be fetched here can save a fetch
+            Spider.canonicalizer.record_saved({url: variants[url] for url in added}, added)
+        return added
+
+    # Whether a new link passes the checks made before it is queued
+    @staticmethod
+    def should_queue(url):
+        # Queued or crawled already
+        if url in Spider.frontier.seen:
+            return False
+        if get_domain_name(url) not in Spider.domains:
+            return False
+        # Images, archives, documents... are never fetched
+        if is_binary_url(url):
+            return False
+        # None while the host's robots.txt is loading: crawl_page checks again before fetching
+        if Spider.robots.allowed(url) is False:
+            Spider.metrics.incr('robots_denied')
+            return False
+        return True
 
     @staticmethod
     def update_files():
-        set_to_file(Spider.queue, Spider.queue_file)
-        set_to_file(Spider.crawled, Spider.crawled_file)
+        # Folds the frontier journal into queue.txt and crawled.txt
+        Spider.frontier.compact()
+
+    @staticmethod
+    def shutdown():
+        if Spider.metrics_reporter:
+            Spider.metrics_reporter.close()
+        if Spider.exchange:
+            Spider.exchange.close()
+            Spider.exchange.broker.close()
+            print(f"Partition {Spider.partition_index + 1}/{Spider.partition_count}: "
+                  f"{Spider.exchange.sent} links forwarded, {Spider.exchange.received} received")
+        if Spider.parse_pool:
+            Spider.parse_pool.close()
+        if Spider.sitemaps:
+            Spider.sitemaps.close()
+        Spider.robots.close()
+        # Removes the scheduler's spill file; queued URLs are in the frontier files
+        Spider.scheduler.close()
+        if Spider.summary_pipeline:
+            # Pending summaries stay in the database for the next run unless told to wait
+            Spider.summary_pipeline.close(drain=Spider.config.get('summary_drain_on_exit', False))
+        if Spider.canonicalizer:
+            print(f"URL canonicalization: {Spider.canonicalizer.rewritten} links rewritten, "
+                  f"{Spider.canonicalizer.saved} duplicate fetches avoided")
+        if Spider.dedup:
+            print(f"Duplicate pages recorded as aliases: {Spider.dedup.duplicates}")
+        Spider.db_writer.close() # Commits any rows still waiting in the writer queue
+        Spider.frontier.close()
+        print(Spider.metrics.summary_line(Spider.metrics.snapshot()))
+        if Spider.metrics_server:
+            Spider.metrics_server.shutdown()
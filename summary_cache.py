@@ -0,0 +1,98 @@
+import hashlib
+import threading
+import time
+
+from database import connect_database
+
+
+def cache_key(text, model):
+    """Hash of the model name and the text with case and whitespace normalized."""
+    normalized = ' '.join(text.split()).casefold()
+    return hashlib.sha256(f'{model}\0{normalized}'.encode('utf-8')).hexdigest()
+
+
+class SummaryCache:
+    """
+    Content-addressed summaries stored in the project database.
+
+    Pages whose normalized text was already summarized by the same model get
+    the stored summary instead of a new API call. Once the cached summaries
+    exceed max_bytes the least recently used ones are evicted down to 90%.
+    """
+
+    def __init__(self, db_file_path, model, max_bytes=256 * 2**20):
+        self.model = model
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = connect_database(db_file_path)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS summary_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                summary TEXT,
+                size INTEGER,
+                created REAL,
+                last_used REAL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS summary_cache_last_used ON summary_cache (last_used)')
+        self._conn.commit()
+        self._size = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM summary_cache').fetchone()[0]
+
+    def get(self, text):
+        key = cache_key(text, self.model)
+        with self._lock:
+            row = self._conn.execute('SELECT summary FROM summary_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._conn:
+                self._conn.execute('UPDATE summary_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+            return row[0]
+
+    def put(self, text, summary):
+        key = cache_key(text, self.model)
+        size = len(summary.encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                old = self._conn.execute('SELECT size FROM summary_cache WHERE key = ?', (key,)).fetchone()
+                self._conn.execute('''
+                    INSERT OR REPLACE INTO summary_cache (key, model, summary, size, created, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (key, self.model, summary, size, now, now))
+                self._size += size - (old[0] if old else 0)
+                if self.max_bytes and self._size > self.max_bytes:
+                    self._evict()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            entries = self._conn.execute('SELECT COUNT(*) FROM summary_cache').fetchone()[0]
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': entries,
+                'bytes': self._size,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # Drop least recently used entries until the cache is back under 90% of max_bytes
+    def _evict(self):
+        target = self.max_bytes * 0.9
+        cursor = self._conn.execute('SELECT key, size FROM summary_cache ORDER BY last_used')
+        doomed = []
+        for key, size in cursor:
+            if self._size <= target:
+                break
+            doomed.append((key,))
+            self._size -= size
+        cursor.close()
+        self._conn.executemany('DELETE FROM summary_cache WHERE key = ?', doomed)
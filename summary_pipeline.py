@@ -0,0 +1,295 @@
+import importlib
+import queue
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from database import connect_database
+from summary_cache import cache_key
+
+
+UPDATE_SUMMARY_SQL = "UPDATE pages SET summary = ?, summary_status = ? WHERE url = ?"
+UPSERT_QUOTA_SQL = '''
+    INSERT INTO summary_quota (day, used) VALUES (?, ?)
+    ON CONFLICT(day) DO UPDATE SET used = excluded.used
+'''
+# Idle workers look for pending rows in the database this often, doubling up to the maximum
+# while they find none; a queue overflow makes them look right away
+RECHECK_SECONDS = 1.0
+MAX_RECHECK_SECONDS = 60.0
+# summarizer_backend names; anything else is imported as a module path
+SUMMARIZER_BACKENDS = {
+    'gemini': 'summerizer',
+    'extractive': 'extractive_summarizer',
+}
+
+
+def load_summarizer(name='gemini'):
+    """
+    Imports a summarizer backend only when summary_mode needs one. A backend
+    is a module (or object) with setup_summarizer(config), get_rate_limits(),
+    get_model_name() and generate_summary(text). 'module:attribute' names
+    an object inside a module.
+    """
+    module_name, _, attribute = SUMMARIZER_BACKENDS.get(name, name).partition(':')
+    backend = importlib.import_module(module_name)
+    return getattr(backend, attribute) if attribute else backend
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, at most `capacity` saved up."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop_event=None):
+        """Takes a token, waiting if needed. Returns False if stop_event fires first."""
+        if self.rate <= 0:
+            return True
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if stop_event is not None:
+                if stop_event.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class DailyQuota:
+    """
+    Calls allowed per UTC day, persisted in the summary_quota table so a
+    restart does not hand out the same day's budget twice.
+    """
+
+    def __init__(self, limit, conn, db_writer):
+        self.limit = limit
+        self.db_writer = db_writer
+        self._lock = threading.Lock()
+        self._day = _utc_day()
+        row = conn.execute("SELECT used FROM summary_quota WHERE day = ?", (self._day,)).fetchone()
+        self._used = row[0] if row else 0
+
+    def acquire(self, stop_event):
+        """Takes one call from today's budget, waiting for the next day if it is spent."""
+        while True:
+            with self._lock:
+                day = _utc_day()
+                if day != self._day:
+                    self._day = day
+                    self._used = 0
+                if not self.limit:
+                    # Nothing to enforce, so nothing to persist either
+                    return True
+                if self._used < self.limit:
+                    self._used += 1
+                    self.db_writer.execute(UPSERT_QUOTA_SQL, (self._day, self._used))
+                    return True
+            wait = _seconds_until_next_utc_day()
+            print(f"Daily summary quota of {self.limit} reached. Waiting {wait:.0f} seconds for the next day.", file=sys.stderr)
+            if stop_event.wait(wait):
+                return False
+
+    def used(self):
+        with self._lock:
+            return self._used
+
+
+class SummaryPipeline:
+    """
+    Background summarization stage.
+
+    Pages are stored right away with summary_status 'pending'. Summarizer
+    worker threads take them from an in-memory queue, wait on the per-minute
+    token bucket and the persistent daily quota, and write the summary back
+    through the database writer. Crawl threads never wait on the API. When
+    the in-memory queue is full, or after a restart, pending rows are read
+    back from the database instead; otherwise idle workers only check it
+    with an increasing delay.
+    """
+
+    def __init__(self, db_file_path, db_writer, summarize, calls_per_minute=15, calls_per_day=0,
+                 workers=2, queue_size=1000, cache=None, metrics=None):
+        self.db_writer = db_writer
+        self.summarize = summarize
+        # Optional SummaryCache consulted before any quota is spent
+        self.cache = cache
+        # Optional metrics.Metrics; each summarizer call is one 'summary' observation
+        self.metrics = metrics
+        self.workers = workers
+        self.summarized = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._in_progress = set()
+        # URLs summarized recently, so a row read back before its update lands is skipped
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        # Cache keys being summarized right now; a worker holding the same text waits for the result
+        self._active_keys = set()
+        self._key_released = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._threads = []
+        self._conn = connect_database(db_file_path)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS summary_quota (day TEXT PRIMARY KEY, used INTEGER)')
+        self._conn.commit()
+        self.bucket = TokenBucket(calls_per_minute / 60.0 if calls_per_minute else 0)
+        self.quota = DailyQuota(calls_per_day, self._conn, db_writer)
+        # True while pending rows may be in the database only: left by an earlier run or an overflow
+        self._backlog = self._conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM pages WHERE summary_status = 'pending')").fetchone()[0] == 1
+        self._recheck_delay = RECHECK_SECONDS
+        self._recheck_at = time.monotonic() + self._recheck_delay
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f'Summarizer-{i + 1}', daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, url, text):
+        """Never blocks: if the queue is full the row stays pending in the database."""
+        try:
+            self._queue.put_nowait((url, text))
+        except queue.Full:
+            self._backlog = True
+
+    def pending(self):
+        with self._lock:
+            row = self._conn.execute("SELECT COUNT(*) FROM pages WHERE summary_status = 'pending'").fetchone()
+        return row[0]
+
+    def close(self, drain=False):
+        """
+        Stops the workers. With drain=True it first waits until every pending
+        page is summarized, which can take a long time under a tight quota;
+        otherwise unfinished pages stay pending for the next run.
+        """
+        if drain:
+            self.db_writer.flush()
+            while self.pending() and any(t.is_alive() for t in self._threads):
+                time.sleep(1)
+                self.db_writer.flush()
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+        self._conn.close()
+        if self.cache:
+            stats = self.cache.stats()
+            print(f"Summary cache: {stats['hits']} hits / {stats['hits'] + stats['misses']} lookups "
+                  f"({stats['hit_rate']:.1%}), {stats['entries']} entries, {stats['bytes'] / 2**20:.1f} MiB")
+            self.cache.close()
+
+    def _next_job(self):
+        try:
+            return self._queue.get(timeout=1)
+        except queue.Empty:
+            pass
+        with self._lock:
+            now = time.monotonic()
+            if not self._backlog and now < self._recheck_at:
+                return None
+            self._backlog = False
+            self._recheck_at = now + self._recheck_delay
+            self._recheck_delay = min(self._recheck_delay * 2, MAX_RECHECK_SECONDS)
+        # Nothing in memory: pick up rows that overflowed the queue or survived a restart
+        self.db_writer.flush()
+        with self._lock:
+            if self._queue.empty():
+                limit = self._queue.maxsize or 1000
+                rows = self._conn.execute(
+                    "SELECT url, page_text(text) FROM pages WHERE summary_status = 'pending' ORDER BY id LIMIT ?",
+                    (limit,)).fetchall()
+                if rows:
+                    self._recheck_delay = RECHECK_SECONDS
+                if len(rows) == limit:
+                    # There may be more than one queue's worth left
+                    self._backlog = True
+                for url, text in rows:
+                    if url in self._in_progress or url in self._recent:
+                        continue
+                    try:
+                        self._queue.put_nowait((url, text))
+                    except queue.Full:
+                        self._backlog = True
+                        break
+        return None
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self._next_job()
+            if job is None:
+                continue
+            url, text = job
+            with self._lock:
+                if url in self._in_progress or url in self._recent:
+                    continue
+                self._in_progress.add(url)
+            key = self._claim_key(text)
+            try:
+                summary = self.cache.get(text) if self.cache else None
+                if summary is not None:
+                    self.db_writer.execute(UPDATE_SUMMARY_SQL, (summary, 'done', url))
+                    self.summarized += 1
+                    continue
+                if not self.quota.acquire(self._stop) or not self.bucket.acquire(self._stop):
+                    return
+                start = time.perf_counter()
+                summary = self.summarize(text)
+                if self.metrics:
+                    self.metrics.observe('summary', time.perf_counter() - start)
+                status = 'error' if summary.startswith('Summary Error') else 'done'
+                self.db_writer.execute(UPDATE_SUMMARY_SQL, (summary, status, url))
+                if status == 'done' and self.cache:
+                    self.cache.put(text, summary)
+                if status == 'done':
+                    self.summarized += 1
+                else:
+                    self.failed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Error summarizing {url}: {e}", file=sys.stderr)
+                traceback.print_exc()
+                self.db_writer.execute(UPDATE_SUMMARY_SQL, (f"Summary Error: {e}", 'error', url))
+            finally:
+                # Keep the URL marked until its update is queued, so a refill
+                # from the database does not hand it out a second time
+                with self._lock:
+                    self._active_keys.discard(key)
+                    self._key_released.notify_all()
+                    self._in_progress.discard(url)
+                    self._recent[url] = None
+                    if len(self._recent) > 10000:
+                        self._recent.popitem(last=False)
+
+    def _claim_key(self, text):
+        if not self.cache:
+            return None
+        key = cache_key(text, self.cache.model)
+        with self._lock:
+            while key in self._active_keys and not self._stop.is_set():
+                self._key_released.wait(1)
+            self._active_keys.add(key)
+        return key
+
+
+def _utc_day():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+def _seconds_until_next_utc_day():
+    now = datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (tomorrow - now).total_seconds()
@@ -1,5 +1,4 @@
 from dotenv import load_dotenv
-import time
 import google.generativeai as genai
 import os
 import sys # For printing errors to stderr
@@ -7,24 +6,18 @@ import sys # For printing errors to stderr
 # Load environment variables from .env file
 load_dotenv()
 
-# Module-level variables for API client and rate limiting.
-# These are initialized once by setup_summarizer().
+# Module-level variables for the API client and its limits.
+# These are initialized once by setup_summarizer(). Rate limiting itself is done
+# by the thread-safe limiters in summary_pipeline.py, not here.
 _gemini_model = None
 _selected_model_name = ""
 _rate_limit_rpm = 0
 _rate_limit_period = 0 # This represents requests per day in your config
-_seconds_per_request_min = 0.0
-_seconds_per_day = 24 * 60 * 60 # Constant for daily rate limit calculations
-
-# Variables to track API calls for rate limiting across multiple calls within a run
-_last_request_time = 0.0
-_daily_request_count = 0
-_daily_reset_timestamp = time.time() # Resets on each script run
 
 
 def setup_summarizer(config: dict):
     
-    global _gemini_model, _selected_model_name, _rate_limit_rpm, _rate_limit_period, _seconds_per_request_min
+    global _gemini_model, _selected_model_name, _rate_limit_rpm, _rate_limit_period
 
     # Retrieve API settings from the config dictionary
     api_settings = config.get('api_settings', {})
@@ -55,51 +48,27 @@ def setup_summarizer(config: dict):
     _rate_limit_rpm = model_config.get('calls_per_minute', 15)
     _rate_limit_period = model_config.get('period_milliseconds', 14400) # Assuming this is intended for daily calls
 
-    # Calculate minimum time between requests to respect RPM
-    _seconds_per_request_min = 60 / _rate_limit_rpm if _rate_limit_rpm > 0 else 0
+
+def get_rate_limits():
+    """Returns (calls per minute, calls per day) for the selected model."""
+    return _rate_limit_rpm, _rate_limit_period
+
+
+def get_model_name():
+    return _selected_model_name
 
 
 def generate_summary(input_text: str) -> str:
     """
     Generates a concise summary of the provided text using the configured Gemini model.
-    It incorporates rate limiting to respect API usage policies.
+    Callers are responsible for rate limiting (see summary_pipeline.SummaryPipeline);
+    this function never sleeps and keeps no per-call state, so it is thread-safe.
     """
     # Ensure the summarizer has been initialized
     if _gemini_model is None:
         print("Error: Summarizer has not been initialized. Call setup_summarizer() first.", file=sys.stderr)
         return "Summary Error: Summarizer not configured."
 
-    global _last_request_time, _daily_request_count, _daily_reset_timestamp
-
-    current_time = time.time()
-
-    # Handle daily rate limit reset
-    if current_time - _daily_reset_timestamp >= _seconds_per_day:
-        _daily_request_count = 0
-        _daily_reset_timestamp = current_time
-
-    # Enforce daily rate limit
-    if _daily_request_count >= _rate_limit_period:
-        wait_duration = _seconds_per_day - (current_time - _daily_reset_timestamp)
-        print(f"Daily API limit reached for model '{_selected_model_name}'. Waiting {wait_duration:.2f} seconds until next daily window.", file=sys.stderr)
-        time.sleep(wait_duration)
-        _daily_request_count = 0
-        _daily_reset_timestamp = time.time() # Reset timestamp after waiting
-
-    # Re-evaluate current time after potential daily limit sleep
-    current_time = time.time()
-    elapsed_time = current_time - _last_request_time
-
-    # Enforce per-minute rate limit
-    if elapsed_time < _seconds_per_request_min:
-        sleep_needed = _seconds_per_request_min - elapsed_time
-        print(f"Per-minute API limit for '{_selected_model_name}'. Waiting {sleep_needed:.2f} seconds.", file=sys.stderr)
-        time.sleep(sleep_needed)
-
-    # Update state for next API call
-    _last_request_time = time.time()
-    _daily_request_count += 1
-
     prompt = f"Summarize the following text in a concise paragraph:\n\n{input_text}"
     try:
         response = _gemini_model.generate_content(prompt)
@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from date_extractor import extract_date, find_text_date
+from page_parser import parse_page
+
+
+def test_earliest_text_date_wins_over_pattern_order():
+    # The old extractor tried its five patterns in turn, so a named-month date anywhere
+    # in the text beat an ISO date before it; now the first date in the text wins
+    text = 'Updated 2021-06-01 by the editors. First published March 3, 2020.'
+    assert find_text_date(text).date().isoformat() == '2021-06-01'
+
+
+def test_labeled_date_does_not_beat_an_earlier_date():
+    text = 'Event on 12/05/2022 in the main hall. Posted: 2022-11-30'
+    assert find_text_date(text).date().isoformat() == '2022-12-05'
+
+
+def test_strategy_4_uses_the_earliest_date():
+    page = parse_page('<html><body><p>Updated 2021-06-01.</p><p>Originally March 3, 2020.</p></body></html>',
+                      'https://example.com/')
+    date, strategy = extract_date(page)
+    assert (date[:10], strategy) == ('2021-06-01', 4)
+
+
+def test_empty_time_falls_through():
+    page = parse_page('<html><body><time></time><span class="date">March 3, 2020</span></body></html>',
+                      'https://example.com/')
+    assert extract_date(page) == ('2020-03-03T00:00:00', 2)
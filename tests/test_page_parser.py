@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from page_parser import available_backends, parse_page
+
+# Excluded elements that leave out their end tag, which the tree builders close implicitly
+IMPLIED_END_PAGES = [
+    ('<ul><li class="menu">Nav<li>Other</ul><p>Main article text here</p>x', 'Other Main article text here x'),
+    ('<ul><li class="menu">Nav<ul><li>a<li>b</ul>more nav<li>Other</ul><p>Main</p>', 'Other Main'),
+    ('<p class="menu">Skipped<div>Kept</div><p>Also kept', 'Kept Also kept'),
+    ('<table><tr><td class="menu">Nav<td>Cell</table>After', 'Cell After'),
+    ('<dl><dt class="menu">Term<dd>Definition</dl>', 'Definition'),
+    ('<div><p class="menu">Nav</div>After', 'After'),
+]
+
+
+@pytest.mark.parametrize('backend', available_backends())
+@pytest.mark.parametrize('html, expected', IMPLIED_END_PAGES)
+def test_excluded_element_without_end_tag(backend, html, expected):
+    page = parse_page(html, 'https://example.com/', exclude_classes=['menu'], backend=backend)
+    assert page.text == expected
+
+
+def test_backends_agree_on_implied_end_tags():
+    html = IMPLIED_END_PAGES[0][0]
+    texts = {backend: parse_page(html, 'https://example.com/', exclude_classes=['menu'], backend=backend).text
+             for backend in available_backends()}
+    assert len(set(texts.values())) == 1, texts
@@ -0,0 +1,185 @@
+import asyncio
+import http.client
+import random
+import socket
+import ssl
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.error import HTTPError, URLError
+
+
+# Answers that mean "too many requests": the host is paused and its concurrency cut
+THROTTLE_STATUSES = frozenset((429, 503))
+# Answers worth another try later; any other error status (404, 403, 410...) is final
+RETRY_STATUSES = frozenset((408, 425, 429, 500, 502, 503, 504))
+# Weight of the newest response time in the per-host latency average
+LATENCY_ALPHA = 0.2
+# Seconds a host stays below the limit it was last cut at before that limit is tried again
+PROBE_INTERVAL_SECONDS = 30.0
+
+
+def parse_retry_after(value, now=None):
+    """Retry-After header (seconds or an HTTP date) to seconds from now, or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+def is_transient(error):
+    """True for network failures that may well succeed on another try (timeouts, resets, DNS timeouts)."""
+    if isinstance(error, HTTPError):
+        return False
+    # urlopen wraps DNS and TLS failures in a URLError; the asyncio engine sees them bare
+    for cause in (error, error.reason if isinstance(error, URLError) else None):
+        if isinstance(cause, ssl.SSLCertVerificationError):
+            return False
+        # A name that does not resolve stays that way; only a temporary resolver failure is retried
+        if isinstance(cause, socket.gaierror) and cause.errno != socket.EAI_AGAIN:
+            return False
+    # OSError covers URLError, socket errors and connection resets; EOFError a truncated body
+    return isinstance(error, (OSError, EOFError, asyncio.TimeoutError, http.client.HTTPException))
+
+
+class _HostState:
+    __slots__ = ('limit', 'ceiling', 'latency', 'baseline', 'failures', 'paused_until', 'last_decrease')
+
+    def __init__(self, limit):
+        self.limit = limit
+        # Whole limit the host was last cut at; 0 until the first cut
+        self.ceiling = 0
+        self.latency = None
+        self.baseline = None
+        self.failures = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+
+
+class HostThrottle:
+    """
+    Per-host concurrency set from how each server answers (AIMD).
+
+    A host starts at initial requests in flight. Every answer that comes
+    back about as fast as the host's best average latency adds 1/limit
+    (one more slot once a whole window went well), up to max_concurrency.
+    A 429 or 503, a network failure, or a latency past latency_tolerance
+    times the best one halves it (decrease), at most once per round trip.
+    After a 429/503 or failure, the limit it was cut at is not reached
+    again for a while.
+    429/503 and failures also pause the host, for Retry-After seconds when
+    the server sends one, otherwise for an exponential backoff.
+    """
+
+    def __init__(self, max_concurrency=4, initial=1, latency_tolerance=2.0, decrease=0.5, max_retries=3,
+                 backoff_seconds=2.0, max_backoff_seconds=300.0, max_retry_after_seconds=3600.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.initial = max(1, min(initial, self.max_concurrency))
+        self.latency_tolerance = latency_tolerance
+        self.decrease = decrease
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.max_retry_after_seconds = max_retry_after_seconds
+        self.throttled = 0
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def limit(self, host):
+        """Requests the host may have in flight at once."""
+        with self._lock:
+            state = self._hosts.get(host)
+            return int(state.limit) if state else self.initial
+
+    def paused(self, host):
+        """Seconds until the host may be fetched again after a 429/503 or failure, 0 if not paused."""
+        with self._lock:
+            state = self._hosts.get(host)
+            return max(0.0, state.paused_until - time.monotonic()) if state else 0.0
+
+    def record(self, host, seconds, status=None, retry_after=None):
+        """
+        One finished request: seconds it took, the HTTP status (None for a
+        network failure) and the Retry-After delay the server asked for.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = _HostState(self.initial)
+            if status is None or status in THROTTLE_STATUSES:
+                self.throttled += 1
+                state.failures += 1
+                self._decrease(state, now, overloaded=True)
+                pause = self.backoff(state.failures - 1)
+                if retry_after is not None:
+                    pause = min(max(pause, retry_after), self.max_retry_after_seconds)
+                state.paused_until = max(state.paused_until, now + pause)
+                return
+            state.failures = 0
+            if seconds is None or status >= 400:
+                return
+            state.latency = seconds if state.latency is None else \
+                LATENCY_ALPHA * seconds + (1 - LATENCY_ALPHA) * state.latency
+            if state.baseline is None or state.limit < 2:
+                # With one request at a time the pace is the server's own, not a queue we caused
+                state.baseline = state.latency
+            else:
+                state.baseline = min(state.baseline, state.latency)
+            if state.latency > state.baseline * self.latency_tolerance:
+                # Getting slower: the server is queueing our requests
+                self._decrease(state, now)
+            else:
+                limit = min(self.max_concurrency, state.limit + 1 / state.limit)
+                if int(limit) >= state.ceiling > 0 and now - state.last_decrease < PROBE_INTERVAL_SECONDS:
+                    # Just under the limit that overloaded the host; probe it again later
+                    limit = min(limit, state.ceiling - 0.01)
+                state.limit = max(state.limit, limit)
+
+    def backoff(self, attempt):
+        """Exponential backoff for the given retry (0 = first), jittered over its upper half."""
+        cap = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt)
+        return random.uniform(cap / 2, cap)
+
+    def retry_delay(self, attempt, retry_after=None):
+        delay = self.backoff(attempt)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_retry_after_seconds))
+        return delay
+
+    def _decrease(self, state, now, overloaded=False):
+        # One cut per round trip, so a burst of answers to the same window counts once
+        if now - state.last_decrease < max(1.0, state.latency or 0.0):
+            return
+        state.last_decrease = now
+        if overloaded:
+            # The server said so outright; slower answers alone are too noisy to remember
+            state.ceiling = int(state.limit)
+        state.limit = max(1.0, state.limit * self.decrease)
+
+    def stats(self):
+        """(hosts seen, average concurrency limit)."""
+        with self._lock:
+            if not self._hosts:
+                return 0, float(self.initial)
+            return len(self._hosts), sum(int(s.limit) for s in self._hosts.values()) / len(self._hosts)
+
+
+def throttle_from_config(config):
+    return HostThrottle(
+        max_concurrency=config.get('max_host_concurrency', 4),
+        initial=config.get('initial_host_concurrency', 1),
+        latency_tolerance=config.get('latency_tolerance', 2.0),
+        max_retries=config.get('max_retries', 3),
+        backoff_seconds=config.get('retry_backoff_seconds', 2.0),
+        max_backoff_seconds=config.get('max_retry_backoff_seconds', 300),
+        max_retry_after_seconds=config.get('max_retry_after_seconds', 3600)
+    )